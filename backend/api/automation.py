@@ -9,8 +9,16 @@ import time
 from datetime import datetime
 from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, Header, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+
+from api.services import (
+    LOG_POLL_INTERVAL_SECONDS,
+    DiagnosticsMetricsCache,
+    ExportIndex,
+    StateSummaryCache,
+    get_log_tailer,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -30,6 +38,25 @@ AUTOMATION_STOP_PROTECTION = os.getenv("AUTOMATION_STOP_PROTECTION", "0") == "1"
 AUTOMATION_BOT_TOKEN = os.getenv("AUTOMATION_BOT_TOKEN", "")
 AUTOMATION_BOT_ALLOW_UNAUTH = os.getenv("AUTOMATION_BOT_ALLOW_UNAUTH", "0") == "1"
 
+# Logs: um leitor com offset + buffer em memória para todos os clientes
+LOG_LONG_POLL_MAX_SECONDS = float(os.getenv("LOG_LONG_POLL_MAX_SECONDS", "25"))
+LOG_SSE_KEEPALIVE_SECONDS = float(os.getenv("LOG_SSE_KEEPALIVE_SECONDS", "15"))
+log_tailer = get_log_tailer(LOG_FILE)
+
+# /status: resumo do estado em cache (por mtime) e índice de exports por pasta
+STATUS_EXPORTS_LIMIT = int(os.getenv("STATUS_EXPORTS_LIMIT", "20"))
+state_summary = StateSummaryCache(STATE_FILE)
+export_index = ExportIndex(EXPORTS_DIR)
+_last_state_summary: Dict[str, Any] = {}
+
+# /metrics: agregados do JSONL de diagnóstico gravado pelo run_automation.py
+# (mesmo caminho/variável de ambiente; fica na raiz do projeto, não em backend/)
+DIAGNOSTICS_LOG = os.getenv(
+    "AUTOMATION_DIAGNOSTICS_LOG",
+    os.path.join(os.path.dirname(BASE_DIR), "logs", "automation_diagnostics.jsonl"),
+)
+diagnostics_metrics_cache = DiagnosticsMetricsCache(DIAGNOSTICS_LOG)
+
 DEFAULT_START_PARAMS: Dict[str, Any] = {
     "devtools_url": "http://127.0.0.1:9222",
     "batch_size": 10,
@@ -337,6 +364,7 @@ def _start_automation_process(
         try:
             with open(LOG_FILE, "w", encoding="utf-8") as f:
                 f.write("")
+            log_tailer.reset()
         except Exception:
             pass
 
@@ -345,6 +373,7 @@ def _start_automation_process(
         try:
             if os.path.exists(STATE_FILE):
                 os.remove(STATE_FILE)
+            state_summary.invalidate()
         except Exception as e:
             logger.error(f"Erro apagando estado: {e}")
 
@@ -415,28 +444,17 @@ def _load_profiles() -> Dict[str, Dict[str, Any]]:
 
 
 def _build_status_payload() -> Dict[str, Any]:
-    global automation_process
+    global automation_process, _last_state_summary
     is_running = _process_is_running(automation_process)
 
-    state = {}
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, "r", encoding="utf-8") as f:
-                state = json.load(f)
-        except Exception:
-            pass
+    # Custa um stat enquanto o arquivo não muda (antes: json.load do estado inteiro)
+    state = state_summary.get()
+    if state is not _last_state_summary:
+        # Estado gravado de novo (lote capturado/exportado): confere os exports já
+        _last_state_summary = state
+        export_index.invalidate()
 
-    exports = []
-    if os.path.exists(EXPORTS_DIR):
-        try:
-            for root, _dirs, files in os.walk(EXPORTS_DIR):
-                for file in files:
-                    if file.endswith(".xlsx"):
-                        rel_path = os.path.relpath(os.path.join(root, file), EXPORTS_DIR)
-                        exports.append(rel_path.replace("\\", "/"))
-            exports.sort(reverse=True)
-        except Exception as e:
-            logger.error(f"Erro processando exports: {e}")
+    exports = export_index.page(1, STATUS_EXPORTS_LIMIT)
 
     runtime = dict(automation_runtime)
     if is_running and _process_is_running(automation_process):
@@ -447,7 +465,8 @@ def _build_status_payload() -> Dict[str, Any]:
     return {
         "is_running": is_running,
         "state": state,
-        "exports": exports,
+        "exports": exports["items"],
+        "exports_total": exports["total"],
         "runtime": runtime,
     }
 
@@ -967,9 +986,11 @@ async def clear_automation_data():
     try:
         if os.path.exists(STATE_FILE):
             os.remove(STATE_FILE)
+        state_summary.invalidate()
 
         with open(LOG_FILE, "w", encoding="utf-8") as f:
             f.write("")
+        log_tailer.reset()
 
         return {"status": "cleared", "message": "Cache e logs limpos com sucesso!"}
     except Exception as e:
@@ -982,21 +1003,95 @@ async def get_status():
     return _build_status_payload()
 
 
+@router.get("/state")
+async def get_full_state():
+    """Estado completo (arquivo como está, sem parse); /status traz só o resumo."""
+    if not os.path.exists(STATE_FILE):
+        raise HTTPException(status_code=404, detail="Nenhum estado salvo.")
+    return FileResponse(path=STATE_FILE, media_type="application/json")
+
+
+@router.get("/exports")
+async def get_exports(page: int = 1, per_page: int = 50):
+    """Arquivos exportados (.xlsx), mais recentes primeiro, paginados."""
+    return export_index.page(page, min(per_page, 500))
+
+
+@router.get("/metrics")
+async def get_metrics(since_hours: Optional[float] = None, top: int = 20):
+    """
+    Produtos/hora, taxa de UPC por fornecedor e domínio, tempo perdido
+    (captcha, settle, falhas, memória) e p50/p95/p99 por estágio, a partir do
+    log de diagnóstico (inclusive os .jsonl.gz rotacionados). Sem `since_hours`
+    usa o agregado incremental em cache; com janela, faz um passe novo.
+    """
+    since_ts = time.time() - since_hours * 3600 if since_hours and since_hours > 0 else None
+    try:
+        return await asyncio.to_thread(diagnostics_metrics_cache.report, since_ts, max(0, min(top, 500)))
+    except Exception as e:
+        logger.error(f"Erro calculando métricas de diagnóstico: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _logs_payload(result: Dict[str, Any]) -> Dict[str, Any]:
+    # "logs" como texto único, formato que o painel já usava
+    return {"logs": "\n".join(result["lines"]), **result}
+
+
 @router.get("/logs")
-async def get_logs(lines: int = 150):
-    if not os.path.exists(LOG_FILE):
-        return {"logs": "Nenhum log encontrado. Pressione START para iniciar."}
+async def get_logs(lines: int = 150, since: Optional[str] = None, wait: float = 0):
+    """
+    Últimas `lines` linhas, ou só as novas depois do cursor `since` (campo
+    `next` da resposta anterior). Com `wait` > 0 segura a resposta até
+    chegarem linhas novas ou o tempo acabar (long-polling).
+
+    Lido do buffer do LogTailer: nenhum processo é criado por requisição.
+    """
+    if not os.path.exists(LOG_FILE) and not since:
+        return {"logs": "Nenhum log encontrado. Pressione START para iniciar.", "lines": [], "next": None, "reset": True, "gap": False}
 
     try:
-        proc = subprocess.Popen(
-            ["tail", "-n", str(lines), LOG_FILE],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        out, _ = proc.communicate()
-        return {"logs": out.decode("utf-8", errors="replace")}
+        deadline = time.monotonic() + min(max(wait, 0.0), LOG_LONG_POLL_MAX_SECONDS)
+        while since and not log_tailer.has_new(since) and time.monotonic() < deadline:
+            await asyncio.sleep(LOG_POLL_INTERVAL_SECONDS)
+        return _logs_payload(log_tailer.read(since=since, limit=lines))
     except Exception as e:
-        return {"logs": f"Erro lendo logs: {e}"}
+        return {"logs": f"Erro lendo logs: {e}", "lines": [], "next": since, "reset": False, "gap": False}
+
+
+@router.get("/logs/stream")
+async def stream_logs(request: Request, lines: int = 150, since: Optional[str] = None):
+    """
+    Server-Sent Events com as linhas novas do log. Cada evento traz `id` =
+    cursor, então a reconexão automática do EventSource (Last-Event-ID)
+    continua de onde parou. Sem cursor, o primeiro evento traz as últimas
+    `lines` linhas com reset=true.
+    """
+    cursor = since or request.headers.get("last-event-id") or None
+
+    async def _events():
+        nonlocal cursor
+        last_sent = time.monotonic()
+        first = True
+        while not await request.is_disconnected():
+            if first or log_tailer.has_new(cursor):
+                result = log_tailer.read(since=cursor, limit=lines)
+                cursor = result["next"]
+                if result["lines"] or result["reset"]:
+                    yield f"id: {cursor}\ndata: {json.dumps(result, ensure_ascii=False)}\n\n"
+                    last_sent = time.monotonic()
+                first = False
+            elif time.monotonic() - last_sent >= LOG_SSE_KEEPALIVE_SECONDS:
+                # Comentário SSE: mantém a conexão viva atrás de proxies
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(LOG_POLL_INTERVAL_SECONDS)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/download/{filename:path}")
@@ -1,31 +1,107 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-import pandas as pd
-import io
-import re
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import logging
+import time
 import numpy as np
+from typing import Optional
+
+from api.services import (
+    PRODUCT_FILTERS,
+    ProductFilters,
+    ProductTable,
+    ProductTableCache,
+    parse_chain,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-def para_numero(series):
-    s = series.astype(str)
-    return (s.str.replace(r"\(.*?\)", "", regex=True)
-             .str.replace(r"[^0-9.\-eE]", "", regex=True)
-             .replace({"": np.nan, "-": np.nan})
-             .astype(float))
+# CSVs de produtos tipados, pelo hash do conteúdo (mesmo arquivo = sem reparse)
+product_tables = ProductTableCache()
+
+RESULT_FORMATS = ("json", "ndjson", "csv")
+
+
+async def _load_upload(file: UploadFile):
+    t0 = time.perf_counter()
+    table, cached = await run_in_threadpool(product_tables.load, file.file)
+    logger.info(
+        f"Produtos {table.upload_id[:12]}: {len(table)} linhas "
+        f"({'cache' if cached else 'lido e tipado'} em {time.perf_counter() - t0:.2f}s)"
+    )
+    return table, cached
+
+
+def _result_response(
+    table: ProductTable,
+    chain: Optional[str],
+    filters: ProductFilters,
+    page: int,
+    per_page: int,
+    format: str,
+):
+    if format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format deve ser um de: {', '.join(RESULT_FORMATS)}.")
+    if page < 1 or per_page < 1:
+        raise HTTPException(status_code=400, detail="page e per_page devem ser >= 1.")
+    try:
+        names = parse_chain(chain)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    positions = table.filter_positions(names, filters)
+    total = len(positions)
+
+    if format == "ndjson":
+        # Conjunto filtrado inteiro, uma linha JSON por produto
+        return StreamingResponse(
+            table.iter_ndjson(positions),
+            media_type="application/x-ndjson",
+            headers={"X-Total-Count": str(total), "X-Upload-Id": table.upload_id},
+        )
+    if format == "csv":
+        return StreamingResponse(
+            table.iter_csv(positions),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=produtos_filtrados.csv"},
+        )
+
+    start = (page - 1) * per_page
+    return {
+        "upload_id": table.upload_id,
+        "total": len(table),
+        "total_processados": total,
+        "page": page,
+        "per_page": per_page,
+        "total_pages": (total + per_page - 1) // per_page,
+        "filtros": list(names),
+        "colunas_detectadas": table.columns,
+        "data": table.records(positions[start:start + per_page]),
+    }
+
+
+@router.get("/filters")
+async def get_filters():
+    """Filtros disponíveis para `chain` e a cadeia padrão."""
+    return {
+        "available": {name: step.role for name, step in PRODUCT_FILTERS.items()},
+        "default": list(parse_chain(None)),
+    }
+
 
 @router.post("/upload-csv")
 async def upload_products_csv(file: UploadFile = File(...)):
     try:
-        content = await file.read()
-        df = pd.read_csv(io.BytesIO(content))
-        
-        # Contar registros
-        total = len(df)
-        
+        # Já deixa a tabela tipada em cache para o process seguinte
+        table, _cached = await _load_upload(file)
+
         return {
-            "total": total,
-            "colunas": list(df.columns),
-            "preview": df.head(20).to_dict(orient="records")
+            "upload_id": table.upload_id,
+            "total": len(table),
+            "colunas": list(table.df.columns),
+            "preview": table.records(np.arange(min(20, len(table))))
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -33,27 +109,49 @@ async def upload_products_csv(file: UploadFile = File(...)):
 @router.post("/process-csv")
 async def process_products(
     file: UploadFile = File(...),
-    min_price: float = 10.0,
-    max_price: float = 50.0,
-    max_reviews: int = 130
+    min_price: Optional[float] = 10.0,
+    max_price: Optional[float] = 50.0,
+    max_reviews: Optional[int] = 130,
+    min_rating: Optional[float] = None,
+    chain: Optional[str] = None,
+    page: int = 1,
+    per_page: int = 100,
+    format: str = "json"
 ):
+    """
+    Processa o CSV com a cadeia de filtros (`chain`, ex.: "fba,not_amazon,price,reviews").
+    json pagina o conjunto filtrado inteiro; ndjson/csv devolvem tudo em
+    streaming. O `upload_id` da resposta permite refiltrar em /process/{upload_id}
+    sem reenviar nem reprocessar o arquivo.
+    """
     try:
-        content = await file.read()
-        df = pd.read_csv(io.BytesIO(content))
-        
-        # Filtros básicos
-        if "isFBA" in df.columns:
-            df = df[df["isFBA"] == True]
-        
-        if "amazon_sold" in df.columns:
-            df = df[df["amazon_sold"] != True]
-        
-        if "avaliacoes" in df.columns:
-            df = df[para_numero(df["avaliacoes"]) < max_reviews]
-        
-        return {
-            "total_processados": len(df),
-            "data": df.head(100).to_dict(orient="records")
-        }
+        table, _cached = await _load_upload(file)
+        filters = ProductFilters(min_price, max_price, max_reviews, min_rating)
+        return await run_in_threadpool(_result_response, table, chain, filters, page, per_page, format)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/process/{upload_id}")
+async def process_cached_products(
+    upload_id: str,
+    min_price: Optional[float] = 10.0,
+    max_price: Optional[float] = 50.0,
+    max_reviews: Optional[int] = 130,
+    min_rating: Optional[float] = None,
+    chain: Optional[str] = None,
+    page: int = 1,
+    per_page: int = 100,
+    format: str = "json"
+):
+    table = product_tables.get(upload_id)
+    if table is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado no cache. Envie o CSV novamente.")
+    try:
+        filters = ProductFilters(min_price, max_price, max_reviews, min_rating)
+        return await run_in_threadpool(_result_response, table, chain, filters, page, per_page, format)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,126 +1,299 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import pandas as pd
 import io
+import logging
+import os
 import re
+import threading
+import time
+import uuid
 import numpy as np
-from typing import Optional, List
+from collections import OrderedDict
+from typing import Any, Dict, Optional, List, Tuple
+
+from api.services import (
+    CATEGORIAS_CANONICAS,
+    DatasetRegistry,
+    FBA_COLUMN,
+    SELLER_UPLOAD_ALL_COLUMNS,
+    SORT_ROLES,
+    SellerDataset,
+    detect_columns,
+    gtin14,
+    hash_join,
+    ingest_columns,
+    iter_csv_chunks,
+    list_capture_files,
+    load_captures,
+    read_csv_header,
+    schema_hash,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-CATEGORIAS_CANONICAS = [
-    "Arts, Crafts & Sewing",
-    "Office Products",
-    "Toys & Games",
-    "Sports & Outdoors",
-    "Automotive (Acessórios)",
-    "Pet Supplies",
-    "Tools & Home Improvement",
-    "Home & Kitchen",
-]
-
-CAT_KEYWORDS = {
-    "Arts, Crafts & Sewing": [
-        r"\barts?\b", r"\bcrafts?\b", r"\bsewing\b",
-    ],
-    "Office Products": [r"\boffice(\s+products?)?\b", r"\bstationery\b"],
-    "Toys & Games": [r"\btoys?\b", r"\bgames?\b"],
-    "Sports & Outdoors": [r"\bsports?\b", r"\boutdoors?\b"],
-    "Automotive (Acessórios)": [r"\bautomotive\b", r"\bauto\s*parts\b"],
-    "Pet Supplies": [r"\bpet\s+supplies\b", r"\bpet\b"],
-    "Tools & Home Improvement": [r"\btools?\b", r"\bhome\s+improv"],
-    "Home & Kitchen": [r"\bhome\b", r"\bkitchen\b"],
-}
-
-def match_categoria(valor: str, alvo: str) -> bool:
-    if not isinstance(valor, str):
-        return False
-    val = valor.strip().casefold()
-    if ">" in val:
-        val = val.split(">", 1)[0].strip()
-    for pat in CAT_KEYWORDS.get(alvo, []):
-        if re.search(pat, val, flags=re.I):
-            return True
-    return False
-
 @router.get("/categorias")
 async def get_categorias():
     return {"categorias": CATEGORIAS_CANONICAS}
 
-# Armazenar DataFrames em memória (cache simples)
-uploaded_data_cache = {}
+# Datasets tipados por id de upload (LRU com orçamento de memória e spill em disco)
+dataset_registry = DatasetRegistry()
+# Alias para o upload mais recente (compatibilidade com quem usa o id fixo antigo)
+LATEST_ALIAS = "current_data"
 
-@router.post("/upload-csv")
-async def upload_sellers_csv(
-    files: List[UploadFile] = File(...)
-):
+# Linhas por fatia na escrita do CSV embaralhado de /download-filtered.
+DOWNLOAD_SLICE_ROWS = int(os.getenv("SELLER_DOWNLOAD_SLICE_ROWS", "50000"))
+
+# Progresso de cada leitura por upload_id (GET /upload-progress/{upload_id}).
+# O id vem do cliente (?upload_id=) ou é gerado; em /upload-csv vira o cache_id.
+UPLOAD_PROGRESS_ENTRIES = int(os.getenv("SELLER_UPLOAD_PROGRESS_ENTRIES", "64"))
+UPLOAD_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+upload_progress: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+upload_progress_lock = threading.Lock()
+
+
+AMAZON_DP_URL = "https://www.amazon.com/dp/"
+GOOGLE_SEARCH_URL = "https://www.google.com/search?q="
+GOOGLE_SEARCH_SUFFIX = "&gl=us&hl=es"
+
+
+def _output_columns(columns) -> List[str]:
+    """Colunas usadas na saída (projeção antes do iloc, para não copiar o resto)."""
+    roles = ("image", "title", "upc", "asin", "price", "seller")
+    return list(dict.fromkeys(columns[role] for role in roles if columns.get(role)))
+
+
+def _object_column(frame: pd.DataFrame, col: Optional[str]) -> pd.Series:
+    """Coluna como objetos Python (NaN -> None); coluna ausente vira tudo None."""
+    if not col:
+        return pd.Series([None] * len(frame), index=frame.index, dtype=object)
+    series = frame[col]
+    return series.astype(object).where(series.notna(), None)
+
+
+def _count_column(frame: pd.DataFrame, col: Optional[str]) -> pd.Series:
+    """BSR/contagem (float32 na memória) como inteiro anulável na saída."""
+    if not col:
+        return pd.Series(pd.NA, index=frame.index, dtype="Int64")
+    return frame[col].astype("float64").round().astype("Int64")
+
+
+def _price_column(frame: pd.DataFrame, col: Optional[str]) -> pd.Series:
+    """Preço em float64 arredondado a 2 casas (NaN quando faltante)."""
+    if not col:
+        return pd.Series(np.nan, index=frame.index, dtype="float64")
+    return frame[col].astype("float64").round(2)
+
+
+def _link_column(values: pd.Series, prefix: str, suffix: str = "") -> pd.Series:
+    """prefix + valor + suffix onde houver valor (não nulo e não vazio), senão None."""
+    present = values.notna() & (values.astype(str) != "")
+    links = pd.Series(None, index=values.index, dtype=object)
+    if present.any():
+        links[present] = prefix + values[present].astype(str) + suffix
+    return links
+
+
+def _file_size(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
     try:
-        all_dfs = []
+        position = file.file.tell()
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(position)
+        return size
+    except (OSError, ValueError):
+        return 0
+
+
+def _new_upload_id(upload_id: Optional[str]) -> str:
+    """Valida o upload_id do cliente (ou gera um); 409 se já está em uso."""
+    if upload_id is None:
+        upload_id = uuid.uuid4().hex[:12]
+    elif not UPLOAD_ID_RE.match(upload_id):
+        raise HTTPException(status_code=400, detail="upload_id deve ter até 64 letras, números, '-' ou '_'.")
+    with upload_progress_lock:
+        current = upload_progress.get(upload_id)
+        if (current is not None and current.get("status") == "reading") or upload_id in dataset_registry:
+            raise HTTPException(status_code=409, detail=f"upload_id {upload_id} já está em uso.")
+        # Reserva o id já aqui: dois POSTs com o mesmo id não passam juntos pela checagem.
+        upload_progress[upload_id] = {"upload_id": upload_id, "status": "reading", "started_at": time.time()}
+    return upload_id
+
+
+def _start_progress(upload_id: str, operation: str, files: List[UploadFile]) -> Tuple[Dict[str, Any], List[int]]:
+    sizes = [_file_size(file) for file in files]
+    progress = {
+        "upload_id": upload_id,
+        "status": "reading",
+        "operation": operation,
+        "files_total": len(files),
+        "files_done": 0,
+        "file": None,
+        "bytes_total": sum(sizes),
+        "bytes_read": 0,
+        "rows_read": 0,
+        "rows_kept": 0,
+        "started_at": time.time(),
+    }
+    with upload_progress_lock:
+        upload_progress[upload_id] = progress
+        upload_progress.move_to_end(upload_id)
+        # Mantém os mais recentes; leituras em andamento nunca saem.
+        for old_id in list(upload_progress):
+            if len(upload_progress) <= UPLOAD_PROGRESS_ENTRIES:
+                break
+            if upload_progress[old_id].get("status") != "reading":
+                del upload_progress[old_id]
+    return progress, sizes
 
-        # Ler todos os arquivos CSV
-        for file in files:
-            content = await file.read()
-            df = pd.read_csv(io.BytesIO(content), low_memory=False)
-            all_dfs.append(df)
 
-        # Concatenar todos os DataFrames
-        df = pd.concat(all_dfs, ignore_index=True)
+def _iter_upload_chunks(files: List[UploadFile], upload_id: str, operation: str, keep_all_columns: bool):
+    """
+    Chunks de todos os arquivos, sem carregar nenhum inteiro na memória: o
+    UploadFile já está em arquivo temporário e é lido direto dali.
+    Retorna (papéis das colunas, hash do esquema, gerador de chunks); os
+    papéis saem do cache por hash quando o cabeçalho já foi visto.
+    """
+    progress, sizes = _start_progress(upload_id, operation, files)
+    headers = [read_csv_header(file.file) for file in files]
+    header_union = list(dict.fromkeys(col for header in headers for col in header))
+    schema = schema_hash(header_union)
+    columns = detect_columns(header_union)
+    keep = None if keep_all_columns else set(ingest_columns(header_union, columns))
+    only_fba = FBA_COLUMN in header_union
+
+    def _chunks():
+        bytes_done = 0
+        for file, header, size in zip(files, headers, sizes):
+            progress["file"] = file.filename
+            usecols = None if keep is None else [col for col in header if col in keep]
+
+            def _on_chunk(read, kept, position):
+                progress["rows_read"] += read
+                progress["rows_kept"] += kept
+                progress["bytes_read"] = bytes_done + min(position, size or position)
+                logger.info(
+                    f"Lendo {file.filename}: {progress['rows_read']} linhas lidas, "
+                    f"{progress['rows_kept']} com FBA "
+                    f"({progress['bytes_read'] / 2**20:.0f} de {progress['bytes_total'] / 2**20:.0f} MB)"
+                )
+
+            yield from iter_csv_chunks(file.file, usecols=usecols, only_fba=only_fba, progress=_on_chunk)
+            bytes_done += size
+            progress["files_done"] += 1
+            progress["bytes_read"] = bytes_done
+
+    return columns, schema, _chunks()
+
+
+def _ingest_uploads(files: List[UploadFile], upload_id: str) -> SellerDataset:
+    columns, schema, chunks = _iter_upload_chunks(files, upload_id, "upload-csv", SELLER_UPLOAD_ALL_COLUMNS)
+    # Tipagem por chunk (preço/BSR/FBA numéricos) e embaralhamento por permutação
+    return SellerDataset.from_chunks(chunks, columns, shuffle=True, schema=schema)
+
+
+def _finish_progress(upload_id: str, status: str, **fields) -> None:
+    with upload_progress_lock:
+        progress = upload_progress.get(upload_id)
+        if progress is not None:
+            progress.update({"status": status, "finished_at": time.time(), **fields})
+
+
+@router.get("/upload-progress/{upload_id}")
+async def get_upload_progress(upload_id: str):
+    with upload_progress_lock:
+        progress = upload_progress.get(upload_id)
+        if progress is None:
+            raise HTTPException(status_code=404, detail="Upload não encontrado.")
+        return dict(progress)
 
-        # Filtrar apenas FBA
-        if "Uses FBA" in df.columns:
-            df = df[df["Uses FBA"] == True]
 
-        if df.empty:
+@router.post("/upload-csv")
+async def upload_sellers_csv(
+    files: List[UploadFile] = File(...),
+    upload_id: Optional[str] = None,
+):
+    """
+    `upload_id` (opcional, gerado pelo cliente) permite acompanhar a leitura em
+    /upload-progress/{upload_id} enquanto o POST roda; ele vira o cache_id.
+    """
+    upload_id = _new_upload_id(upload_id)
+    try:
+        # Leitura em chunks numa thread: o event loop continua respondendo /upload-progress
+        try:
+            dataset = await run_in_threadpool(_ingest_uploads, files, upload_id)
+        except Exception as e:
+            _finish_progress(upload_id, "error", error=str(e))
+            raise
+        _finish_progress(upload_id, "done", rows=len(dataset))
+
+        if len(dataset) == 0:
             raise HTTPException(status_code=400, detail="Nenhum seller com FBA encontrado")
 
-        # Embaralhar os dados
-        df = df.sample(frac=1).reset_index(drop=True)
-
-        # Substituir NaN, inf e -inf por None (null no JSON)
-        df = df.replace([np.nan, np.inf, -np.inf], None)
-
-        # Identificar colunas importantes
-        image_col = None
-        title_col = None
-        upc_col = None
-        asin_col = None
-
-        for col in df.columns:
-            col_lower = col.lower()
-            if 'image' in col_lower and not image_col:
-                image_col = col
-            elif any(x in col_lower for x in ['title', 'product name']) and 'parent' not in col_lower and not title_col:
-                title_col = col
-            elif 'upc' in col_lower and not upc_col:
-                upc_col = col
-            elif 'asin' in col_lower and 'parent' not in col_lower and not asin_col:
-                asin_col = col
-
-        # Armazenar no cache com ID simples
-        cache_id = "current_data"
-        uploaded_data_cache[cache_id] = {
-            "df": df,
-            "columns": {
-                "image": image_col,
-                "title": title_col,
-                "upc": upc_col,
-                "asin": asin_col
-            }
-        }
+        # O id do upload é o id do dataset (registro pode despejar outros datasets para disco)
+        cache_id = await run_in_threadpool(dataset_registry.register, dataset, LATEST_ALIAS, upload_id)
+        columns = dataset.columns
 
         return {
-            "total": len(df),
+            "total": len(dataset),
             "cache_id": cache_id,
+            "upload_id": upload_id,
+            "schema": dataset.schema,
             "columns": {
-                "image": image_col,
-                "title": title_col,
-                "upc": upc_col,
-                "asin": asin_col
+                "image": columns["image"],
+                "title": columns["title"],
+                "upc": columns["upc"],
+                "asin": columns["asin"]
             }
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def _get_dataset(cache_id: str, detail: str) -> SellerDataset:
+    # Recarregar do disco pode demorar: fora do event loop
+    dataset = await run_in_threadpool(dataset_registry.get, cache_id)
+    if dataset is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return dataset
+
+
+def _check_sort(dataset: SellerDataset, sort_by: Optional[str], sort_dir: str) -> bool:
+    """Valida a ordenação pedida; retorna True para decrescente."""
+    if sort_dir not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="sort_dir deve ser 'asc' ou 'desc'.")
+    if sort_by:
+        if sort_by not in SORT_ROLES:
+            raise HTTPException(status_code=400, detail=f"sort_by deve ser um de: {', '.join(SORT_ROLES)}.")
+        if not dataset.columns.get(sort_by):
+            raise HTTPException(status_code=400, detail=f"Coluna para ordenar por '{sort_by}' não encontrada no CSV.")
+    return sort_dir == "desc"
+
+
+def _check_categoria(categoria: Optional[str]) -> None:
+    if categoria and categoria not in CATEGORIAS_CANONICAS:
+        raise HTTPException(status_code=400, detail=f"Categoria desconhecida: {categoria}")
+
+
+@router.get("/datasets")
+async def get_datasets_stats():
+    """Datasets carregados/em disco, memória usada e orçamento."""
+    return dataset_registry.stats()
+
+
+@router.delete("/datasets/{cache_id}")
+async def delete_dataset(cache_id: str):
+    if not await run_in_threadpool(dataset_registry.delete, cache_id):
+        raise HTTPException(status_code=404, detail="Dataset não encontrado.")
+    return {"deleted": cache_id}
+
+
 @router.get("/get-products/{cache_id}")
 async def get_products(
     cache_id: str,
@@ -133,265 +306,60 @@ async def get_products(
     max_bsr: Optional[int] = None,
     max_fba_sellers: Optional[int] = None,
     exclude_amazon: bool = False,
-    only_with_upc: bool = False
+    only_with_upc: bool = False,
+    categoria: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_dir: str = "asc"
 ):
     try:
-        if cache_id not in uploaded_data_cache:
-            raise HTTPException(status_code=404, detail="Dados não encontrados. Faça upload novamente.")
-
-        cached = uploaded_data_cache[cache_id]
-        df = cached["df"].copy()
-        columns = cached["columns"]
+        dataset = await _get_dataset(cache_id, "Dados não encontrados. Faça upload novamente.")
+        columns = dataset.columns
+        descending = _check_sort(dataset, sort_by, sort_dir)
+        _check_categoria(categoria)
 
         # Log dos filtros recebidos
-        print(f"Filtros recebidos - seller: {seller}, min_price: {min_price}, max_price: {max_price}, min_bsr: {min_bsr}, max_bsr: {max_bsr}, max_fba_sellers: {max_fba_sellers}, exclude_amazon: {exclude_amazon}, only_with_upc: {only_with_upc}")
-        print(f"Total de produtos antes dos filtros: {len(df)}")
-
-        # Aplicar filtros
-        if seller and seller.strip():
-            # Procurar coluna de seller
-            seller_col = None
-            for col in df.columns:
-                if 'seller' in col.lower():
-                    seller_col = col
-                    break
-
-            if seller_col:
-                print(f"Coluna de seller encontrada: {seller_col}")
-                before_count = len(df)
-                df = df[df[seller_col].astype(str).str.contains(seller, case=False, na=False)]
-                print(f"Produtos após filtro de seller: {len(df)} (eram {before_count})")
-            else:
-                print("Coluna de seller não encontrada!")
-
-        # Filtro de preço
-        if min_price is not None or max_price is not None:
-            # Procurar coluna de preço (evitando colunas de mudança de preço)
-            price_col = None
-            for col in df.columns:
-                col_lower = col.lower()
-                # Procurar por "price" mas excluir colunas de mudança, buy box, etc
-                if 'price' in col_lower and not any(x in col_lower for x in ['change', 'last', 'buy', 'variation', 'drop']):
-                    price_col = col
-                    break
-
-            if price_col:
-                print(f"Coluna de preço encontrada: {price_col}")
-                # Converter para numérico
-                df[price_col] = pd.to_numeric(df[price_col], errors='coerce')
-
-                # Mostrar alguns valores de exemplo
-                sample_prices = df[price_col].dropna().head(10).tolist()
-                print(f"Exemplos de preços na coluna: {sample_prices}")
-                print(f"Min: {df[price_col].min()}, Max: {df[price_col].max()}")
-
-                before_count = len(df)
-
-                if min_price is not None:
-                    df = df[df[price_col] >= min_price]
-                    print(f"Produtos após filtro min_price ({min_price}): {len(df)}")
-
-                if max_price is not None:
-                    df = df[df[price_col] <= max_price]
-                    print(f"Produtos após filtro max_price ({max_price}): {len(df)}")
-            else:
-                print("Coluna de preço não encontrada!")
-                # Listar todas as colunas que contêm "price"
-                price_cols = [col for col in df.columns if 'price' in col.lower()]
-                print(f"Colunas disponíveis com 'price': {price_cols}")
-
-        # Filtro de BSR (Best Seller Rank) - quanto menor, melhor vende
-        if min_bsr is not None or max_bsr is not None:
-            # Procurar coluna de BSR/Sales Rank
-            bsr_col = None
-            for col in df.columns:
-                col_lower = col.lower()
-                if any(x in col_lower for x in ['bsr', 'sales rank', 'salesrank', 'best seller', 'bestseller', 'rank']):
-                    # Excluir colunas de mudança de rank
-                    if not any(x in col_lower for x in ['change', 'drop', 'growth', 'last']):
-                        bsr_col = col
-                        break
-
-            if bsr_col:
-                print(f"Coluna de BSR encontrada: {bsr_col}")
-                # Converter para numérico
-                df[bsr_col] = pd.to_numeric(df[bsr_col], errors='coerce')
-
-                # Mostrar alguns valores de exemplo
-                sample_bsr = df[bsr_col].dropna().head(10).tolist()
-                print(f"Exemplos de BSR na coluna: {sample_bsr}")
-                print(f"Min BSR no dataset: {df[bsr_col].min()}, Max BSR no dataset: {df[bsr_col].max()}")
-
-                before_count = len(df)
-
-                # Aplicar filtro de BSR mínimo e máximo (remover NaN também)
-                if min_bsr is not None and max_bsr is not None:
-                    df = df[df[bsr_col].notna() & (df[bsr_col] >= min_bsr) & (df[bsr_col] <= max_bsr)]
-                    print(f"Produtos após filtro BSR ({min_bsr} - {max_bsr}): {len(df)} (eram {before_count})")
-                elif min_bsr is not None:
-                    df = df[df[bsr_col].notna() & (df[bsr_col] >= min_bsr)]
-                    print(f"Produtos após filtro min_bsr ({min_bsr}): {len(df)} (eram {before_count})")
-                elif max_bsr is not None:
-                    df = df[df[bsr_col].notna() & (df[bsr_col] <= max_bsr)]
-                    print(f"Produtos após filtro max_bsr ({max_bsr}): {len(df)} (eram {before_count})")
-            else:
-                print("Coluna de BSR não encontrada!")
-                # Listar todas as colunas que contêm "rank" ou "bsr"
-                bsr_cols = [col for col in df.columns if any(x in col.lower() for x in ['rank', 'bsr', 'sales'])]
-                print(f"Colunas disponíveis com 'rank/bsr/sales': {bsr_cols}")
-
-        # Filtro de número de FBA sellers (pouca concorrência)
-        if max_fba_sellers is not None:
-            # Procurar coluna de número de FBA sellers
-            fba_count_col = None
-            for col in df.columns:
-                col_lower = col.lower()
-                # Buscar por várias variações possíveis
-                if 'fba' in col_lower and any(x in col_lower for x in ['seller', 'count', 'number', '#']):
-                    # Excluir colunas que são percentuais ou outras métricas
-                    if not any(x in col_lower for x in ['%', 'percent', 'ratio', 'share']):
-                        fba_count_col = col
-                        break
-
-            if fba_count_col:
-                print(f"Coluna de contagem FBA encontrada: {fba_count_col}")
-                # Converter para numérico
-                df[fba_count_col] = pd.to_numeric(df[fba_count_col], errors='coerce')
-
-                # Mostrar alguns valores de exemplo
-                sample_fba = df[fba_count_col].dropna().head(10).tolist()
-                print(f"Exemplos de contagem FBA: {sample_fba}")
-                print(f"Min FBA: {df[fba_count_col].min()}, Max FBA: {df[fba_count_col].max()}")
-
-                before_count = len(df)
-                # Filtrar apenas produtos com poucos FBA sellers (remover NaN também)
-                df = df[df[fba_count_col].notna() & (df[fba_count_col] <= max_fba_sellers)]
-                print(f"Produtos após filtro FBA count (max {max_fba_sellers}): {len(df)} (eram {before_count})")
-            else:
-                print("Coluna de contagem FBA não encontrada!")
-                # Listar TODAS as colunas disponíveis para debug
-                print(f"TODAS AS COLUNAS: {list(df.columns)}")
-                # Listar colunas que contêm "fba"
-                fba_cols = [col for col in df.columns if 'fba' in col.lower()]
-                print(f"Colunas disponíveis com 'fba': {fba_cols}")
-
-        # Filtro para excluir produtos vendidos pela Amazon
-        if exclude_amazon:
-            before_count = len(df)
-
-            # Procurar coluna de seller (principal)
-            seller_col = None
-            for col in df.columns:
-                if 'seller' in col.lower():
-                    seller_col = col
-                    break
-
-            # Procurar colunas relacionadas ao vendedor principal ou Buy Box
-            buybox_col = None
-            for col in df.columns:
-                col_lower = col.lower()
-                if any(x in col_lower for x in ['buy box', 'buybox', 'featured merchant', 'primary seller']):
-                    buybox_col = col
-                    break
-
-            # Criar máscara para filtrar Amazon
-            mask = pd.Series([True] * len(df), index=df.index)
-
-            # Filtrar pela coluna Seller
-            if seller_col:
-                print(f"Coluna de Seller encontrada: {seller_col}")
-                seller_mask = ~df[seller_col].astype(str).str.contains('amazon', case=False, na=False)
-                mask = mask & seller_mask
-            else:
-                print("Coluna de Seller não encontrada!")
-
-            # Filtrar pela coluna Buy Box (se existir)
-            if buybox_col:
-                print(f"Coluna de Buy Box encontrada: {buybox_col}")
-                buybox_mask = ~df[buybox_col].astype(str).str.contains('amazon', case=False, na=False)
-                mask = mask & buybox_mask
-            else:
-                print("Coluna de Buy Box não encontrada!")
-                # Listar colunas relacionadas
-                buybox_cols = [col for col in df.columns if any(x in col.lower() for x in ['buy', 'box', 'merchant', 'featured'])]
-                print(f"Colunas disponíveis relacionadas a Buy Box: {buybox_cols}")
-
-            # Aplicar o filtro
-            df = df[mask]
-            print(f"Produtos após excluir Amazon: {len(df)} (eram {before_count})")
-
-        # Filtro para produtos com UPC apenas
-        if only_with_upc:
-            upc_col = columns["upc"]
-            if upc_col:
-                before_count = len(df)
-                df = df[df[upc_col].notna() & (df[upc_col].astype(str).str.strip() != "")]
-                print(f"Produtos após filtro UPC (apenas com UPC): {len(df)} (eram {before_count})")
-            else:
-                print("Coluna de UPC não encontrada!")
+        logger.debug(f"Filtros recebidos - seller: {seller}, min_price: {min_price}, max_price: {max_price}, min_bsr: {min_bsr}, max_bsr: {max_bsr}, max_fba_sellers: {max_fba_sellers}, exclude_amazon: {exclude_amazon}, only_with_upc: {only_with_upc}")
+
+        filters = dict(
+            seller=seller,
+            min_price=min_price,
+            max_price=max_price,
+            min_bsr=min_bsr,
+            max_bsr=max_bsr,
+            max_fba_sellers=max_fba_sellers,
+            exclude_amazon=exclude_amazon,
+            only_with_upc=only_with_upc,
+            categoria=categoria,
+        )
+        # Posições que passam nos filtros (cacheadas por filtro: as próximas páginas só fatiam)
+        positions = dataset.filter_positions(**filters)
 
         # Calcular paginação após filtros
-        total = len(df)
+        total = len(positions)
         start_idx = (page - 1) * per_page
         end_idx = start_idx + per_page
 
-        print(f"Total de produtos após todos os filtros: {total}")
-        print(f"Página {page}, retornando produtos {start_idx} a {end_idx}")
-
-        # Pegar slice do DataFrame
-        df_page = df.iloc[start_idx:end_idx]
-
-        # Identificar coluna de preço e seller para retornar nos dados
-        price_col = None
-        seller_col = None
-        for col in df.columns:
-            col_lower = col.lower()
-            # Mesma lógica de busca de preço
-            if 'price' in col_lower and not any(x in col_lower for x in ['change', 'last', 'buy', 'variation', 'drop']) and not price_col:
-                price_col = col
-            if 'seller' in col_lower and not seller_col:
-                seller_col = col
-
-        # Criar dados formatados
-        products = []
-        for _, row in df_page.iterrows():
-            # Obter valores das colunas de forma segura
-            image_val = row[columns["image"]] if columns["image"] else None
-            title_val = row[columns["title"]] if columns["title"] else None
-            upc_val = row[columns["upc"]] if columns["upc"] else None
-            asin_val = row[columns["asin"]] if columns["asin"] else None
-
-            # Obter preço
-            price_val = None
-            if price_col:
-                try:
-                    price_raw = row[price_col]
-                    if pd.notna(price_raw):
-                        price_val = float(price_raw)
-                except (ValueError, KeyError):
-                    pass
-
-            # Obter seller
-            seller_val = None
-            if seller_col:
-                try:
-                    seller_val = row[seller_col]
-                except KeyError:
-                    pass
-
-            # Criar link direto para Amazon
-            amazon_link = f"https://www.amazon.com/dp/{asin_val}" if asin_val else None
-
-            product = {
-                "image": image_val,
-                "title": title_val,
-                "upc": upc_val,
-                "asin": asin_val,
-                "price": price_val,
-                "seller": seller_val,
-                "amazon_link": amazon_link,  # Link direto para o produto
-            }
-            products.append(product)
+        logger.debug(f"Total de produtos após todos os filtros: {total} (de {len(dataset)})")
+
+        if sort_by:
+            # Primeiras páginas via top-K; páginas fundas usam a ordenação completa cacheada
+            positions = dataset.sorted_positions(sort_by, descending, limit=end_idx, **filters)
+
+        # Só as linhas da página são materializadas
+        df_page = dataset.df[_output_columns(columns)].iloc[positions[start_idx:end_idx]]
+        # Montagem por coluna (sem iterrows)
+        asins = _object_column(df_page, columns["asin"])
+        prices = _price_column(df_page, columns["price"])
+        page_frame = pd.DataFrame({
+            "image": _object_column(df_page, columns["image"]),
+            "title": _object_column(df_page, columns["title"]),
+            "upc": _object_column(df_page, columns["upc"]),
+            "asin": asins,
+            "price": prices.astype(object).where(prices.notna(), None),
+            "seller": _object_column(df_page, columns["seller"]),
+            "amazon_link": _link_column(asins, AMAZON_DP_URL),  # Link direto para o produto
+        })
+        products = page_frame.to_dict("records")
 
         return {
             "total": total,
@@ -400,33 +368,81 @@ async def get_products(
             "total_pages": (total + per_page - 1) // per_page,
             "data": products
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/get-sellers-list/{cache_id}")
-async def get_sellers_list(cache_id: str):
+@router.get("/facets/{cache_id}")
+async def get_facets(
+    cache_id: str,
+    seller: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_bsr: Optional[int] = None,
+    max_bsr: Optional[int] = None,
+    max_fba_sellers: Optional[int] = None,
+    exclude_amazon: bool = False,
+    only_with_upc: bool = False,
+    categoria: Optional[str] = None
+):
+    """
+    Contagem de produtos por categoria canônica para os filtros atuais. O
+    próprio filtro de categoria não entra na contagem (senão as outras
+    categorias zerariam); `categoria` só é ecoado como selecionado.
+    """
     try:
-        if cache_id not in uploaded_data_cache:
-            raise HTTPException(status_code=404, detail="Dados não encontrados.")
+        dataset = await _get_dataset(cache_id, "Dados não encontrados. Faça upload novamente.")
+        _check_categoria(categoria)
+        positions = dataset.filter_positions(
+            seller=seller,
+            min_price=min_price,
+            max_price=max_price,
+            min_bsr=min_bsr,
+            max_bsr=max_bsr,
+            max_fba_sellers=max_fba_sellers,
+            exclude_amazon=exclude_amazon,
+            only_with_upc=only_with_upc,
+        )
+        facets = dataset.category_facets(positions)
+        if facets is None:
+            return {"column": None, "total": len(positions), "selected": categoria, "categorias": [], "sem_categoria": len(positions)}
 
-        cached = uploaded_data_cache[cache_id]
-        df = cached["df"]
+        return {
+            "column": dataset.columns.get("category"),
+            "total": len(positions),
+            "selected": categoria,
+            "categorias": [
+                {"categoria": name, "count": count}
+                for name, count in facets["counts"].items()
+            ],
+            "sem_categoria": facets["unclassified"],
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Procurar coluna de seller
-        seller_col = None
-        for col in df.columns:
-            if 'seller' in col.lower():
-                seller_col = col
-                break
+@router.get("/get-sellers-list/{cache_id}")
+async def get_sellers_list(cache_id: str):
+    try:
+        dataset = await _get_dataset(cache_id, "Dados não encontrados.")
+        seller_col = dataset.columns["seller"]
 
         if not seller_col:
             return {"sellers": []}
 
-        # Obter sellers únicos
-        sellers = df[seller_col].dropna().unique().tolist()
+        # Obter sellers únicos (categorias já são os valores distintos)
+        series = dataset.df[seller_col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            sellers = series.cat.remove_unused_categories().cat.categories.tolist()
+        else:
+            sellers = series.dropna().unique().tolist()
         sellers = sorted([str(s) for s in sellers if s])
 
         return {"sellers": sellers}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -440,218 +456,264 @@ async def download_filtered_csv(
     max_bsr: Optional[int] = None,
     max_fba_sellers: Optional[int] = None,
     exclude_amazon: bool = False,
-    only_with_upc: bool = False
+    only_with_upc: bool = False,
+    categoria: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_dir: str = "asc"
 ):
     """
     Baixa CSV dos produtos filtrados com links da Amazon, Google UPC e Google Título
+    (na mesma ordenação da listagem, se sort_by for informado)
     """
     try:
-        if cache_id not in uploaded_data_cache:
-            raise HTTPException(status_code=404, detail="Dados não encontrados. Faça upload novamente.")
-
-        cached = uploaded_data_cache[cache_id]
-        df = cached["df"].copy()
-        columns = cached["columns"]
-
-        print(f"Download CSV - Filtros recebidos - seller: {seller}, min_price: {min_price}, max_price: {max_price}, min_bsr: {min_bsr}, max_bsr: {max_bsr}, max_fba_sellers: {max_fba_sellers}, exclude_amazon: {exclude_amazon}, only_with_upc: {only_with_upc}")
-        print(f"Total de produtos antes dos filtros: {len(df)}")
-
-        # Aplicar os mesmos filtros do endpoint get-products
-        if seller and seller.strip():
-            seller_col = None
-            for col in df.columns:
-                if 'seller' in col.lower():
-                    seller_col = col
-                    break
-            if seller_col:
-                df = df[df[seller_col].astype(str).str.contains(seller, case=False, na=False)]
-
-        if min_price is not None or max_price is not None:
-            price_col = None
-            for col in df.columns:
-                col_lower = col.lower()
-                if 'price' in col_lower and not any(x in col_lower for x in ['change', 'last', 'buy', 'variation', 'drop']):
-                    price_col = col
-                    break
-            if price_col:
-                df[price_col] = pd.to_numeric(df[price_col], errors='coerce')
-                if min_price is not None:
-                    df = df[df[price_col] >= min_price]
-                if max_price is not None:
-                    df = df[df[price_col] <= max_price]
-
-        if min_bsr is not None or max_bsr is not None:
-            bsr_col = None
-            for col in df.columns:
-                col_lower = col.lower()
-                if any(x in col_lower for x in ['bsr', 'sales rank', 'salesrank', 'best seller', 'bestseller', 'rank']):
-                    if not any(x in col_lower for x in ['change', 'drop', 'growth', 'last']):
-                        bsr_col = col
-                        break
-            if bsr_col:
-                df[bsr_col] = pd.to_numeric(df[bsr_col], errors='coerce')
-                if min_bsr is not None and max_bsr is not None:
-                    df = df[df[bsr_col].notna() & (df[bsr_col] >= min_bsr) & (df[bsr_col] <= max_bsr)]
-                elif min_bsr is not None:
-                    df = df[df[bsr_col].notna() & (df[bsr_col] >= min_bsr)]
-                elif max_bsr is not None:
-                    df = df[df[bsr_col].notna() & (df[bsr_col] <= max_bsr)]
-
-        if max_fba_sellers is not None:
-            fba_count_col = None
-            for col in df.columns:
-                col_lower = col.lower()
-                if 'fba' in col_lower and any(x in col_lower for x in ['seller', 'count', 'number', '#']):
-                    if not any(x in col_lower for x in ['%', 'percent', 'ratio', 'share']):
-                        fba_count_col = col
-                        break
-            if fba_count_col:
-                df[fba_count_col] = pd.to_numeric(df[fba_count_col], errors='coerce')
-                df = df[df[fba_count_col].notna() & (df[fba_count_col] <= max_fba_sellers)]
-
-        if exclude_amazon:
-            before_count = len(df)
-            seller_col = None
-            for col in df.columns:
-                if 'seller' in col.lower():
-                    seller_col = col
-                    break
-            buybox_col = None
-            for col in df.columns:
-                col_lower = col.lower()
-                if any(x in col_lower for x in ['buy box', 'buybox', 'featured merchant', 'primary seller']):
-                    buybox_col = col
-                    break
-            mask = pd.Series([True] * len(df), index=df.index)
-            if seller_col:
-                seller_mask = ~df[seller_col].astype(str).str.contains('amazon', case=False, na=False)
-                mask = mask & seller_mask
-            if buybox_col:
-                buybox_mask = ~df[buybox_col].astype(str).str.contains('amazon', case=False, na=False)
-                mask = mask & buybox_mask
-            df = df[mask]
-            print(f"Produtos após excluir Amazon: {len(df)} (eram {before_count})")
-
-        # Filtro para produtos com UPC apenas
-        if only_with_upc:
-            upc_col = columns["upc"]
-            if upc_col:
-                before_count = len(df)
-                df = df[df[upc_col].notna() & (df[upc_col].astype(str).str.strip() != "")]
-                print(f"Produtos após filtro UPC (apenas com UPC): {len(df)} (eram {before_count})")
-            else:
-                print("Coluna de UPC não encontrada!")
-
-        print(f"Total de produtos após todos os filtros para CSV: {len(df)}")
-
-        # Identificar colunas importantes
-        price_col = None
-        seller_col = None
-        for col in df.columns:
-            col_lower = col.lower()
-            if 'price' in col_lower and not any(x in col_lower for x in ['change', 'last', 'buy', 'variation', 'drop']) and not price_col:
-                price_col = col
-            if 'seller' in col_lower and not seller_col:
-                seller_col = col
-
-        # Criar DataFrame com os dados exportados
-        export_data = []
-        for _, row in df.iterrows():
-            # Obter valores das colunas de forma segura
-            title_val = row[columns["title"]] if columns["title"] else ""
-            upc_val = row[columns["upc"]] if columns["upc"] else ""
-            asin_val = row[columns["asin"]] if columns["asin"] else ""
-
-            # Obter preço
-            price_val = ""
-            if price_col:
-                try:
-                    price_raw = row[price_col]
-                    if pd.notna(price_raw):
-                        price_val = float(price_raw)
-                except (ValueError, KeyError):
-                    pass
-
-            # Obter seller
-            seller_val = ""
-            if seller_col:
-                try:
-                    seller_val = row[seller_col]
-                except KeyError:
-                    pass
-
-            # Criar links
-            amazon_link = f"https://www.amazon.com/dp/{asin_val}" if asin_val else ""
-            google_titulo_link = f"https://www.google.com/search?q={title_val}&gl=us&hl=es" if title_val else ""
-            google_upc_link = f"https://www.google.com/search?q={upc_val}&gl=us&hl=es" if upc_val else ""
-
-            export_data.append({
-                "Título": title_val,
-                "ASIN": asin_val,
-                "UPC": upc_val,
-                "Preço": price_val,
-                "Seller": seller_val,
-                "Link Amazon": amazon_link,
-                "Link Google (Título)": google_titulo_link,
-                "Link Google (UPC)": google_upc_link
-            })
-
-        # Criar DataFrame de exportação
-        df_export = pd.DataFrame(export_data)
-
-        # Substituir NaN, inf e -inf por None antes de exportar
-        df_export = df_export.replace([np.nan, np.inf, -np.inf], "")
-
-        # Exportar
+        dataset = await _get_dataset(cache_id, "Dados não encontrados. Faça upload novamente.")
+        columns = dataset.columns
+        descending = _check_sort(dataset, sort_by, sort_dir)
+        _check_categoria(categoria)
+
+        logger.debug(f"Download CSV - Filtros recebidos - seller: {seller}, min_price: {min_price}, max_price: {max_price}, min_bsr: {min_bsr}, max_bsr: {max_bsr}, max_fba_sellers: {max_fba_sellers}, exclude_amazon: {exclude_amazon}, only_with_upc: {only_with_upc}")
+
+        # Aplicar os mesmos filtros (e ordenação) do endpoint get-products
+        filters = dict(
+            seller=seller,
+            min_price=min_price,
+            max_price=max_price,
+            min_bsr=min_bsr,
+            max_bsr=max_bsr,
+            max_fba_sellers=max_fba_sellers,
+            exclude_amazon=exclude_amazon,
+            only_with_upc=only_with_upc,
+            categoria=categoria,
+        )
+        if sort_by:
+            positions = dataset.sorted_positions(sort_by, descending, **filters)
+        else:
+            positions = dataset.filter_positions(**filters)
+        df = dataset.df[_output_columns(columns)].iloc[positions]
+
+        logger.info(f"Total de produtos após todos os filtros para CSV: {len(df)} (de {len(dataset)})")
+
+        # Criar DataFrame de exportação direto das colunas (sem iterrows)
+        titles = _object_column(df, columns["title"])
+        upcs = _object_column(df, columns["upc"])
+        asins = _object_column(df, columns["asin"])
+        df_export = pd.DataFrame({
+            "Título": titles,
+            "ASIN": asins,
+            "UPC": upcs,
+            "Preço": _price_column(df, columns["price"]),
+            "Seller": _object_column(df, columns["seller"]),
+            "Link Amazon": _link_column(asins, AMAZON_DP_URL),
+            "Link Google (Título)": _link_column(titles, GOOGLE_SEARCH_URL, GOOGLE_SEARCH_SUFFIX),
+            "Link Google (UPC)": _link_column(upcs, GOOGLE_SEARCH_URL, GOOGLE_SEARCH_SUFFIX),
+        })
+
+        # Exportar (corpo único: StreamingResponse sobre BytesIO mandava uma linha por chunk)
         output = io.BytesIO()
         df_export.to_csv(output, index=False, encoding='utf-8-sig')
-        output.seek(0)
 
-        from starlette.responses import StreamingResponse
-        return StreamingResponse(
-            io.BytesIO(output.getvalue()),
+        return Response(
+            content=output.getvalue(),
             media_type="text/csv",
             headers={"Content-Disposition": "attachment; filename=produtos_filtrados.csv"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def _ingest_raw(files: List[UploadFile], upload_id: str):
+    """Todas as colunas, sem tipagem (o CSV de saída reproduz os valores como vieram)."""
+    _columns, _schema, chunks = _iter_upload_chunks(files, upload_id, "download-filtered", keep_all_columns=True)
+    frames = list(chunks)
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    del frames
+    return df, np.random.permutation(len(df))
+
+
+def _iter_csv_slices(df: pd.DataFrame, order: np.ndarray):
+    """CSV em fatias na ordem de `order` (sem df.sample copiando tudo)."""
+    if len(order) == 0:
+        yield df.iloc[0:0].to_csv(index=False).encode("utf-8")
+        return
+    for start in range(0, len(order), DOWNLOAD_SLICE_ROWS):
+        part = df.iloc[order[start:start + DOWNLOAD_SLICE_ROWS]]
+        # NaN já sai vazio no to_csv; inf/-inf também devem sair vazios
+        part = part.replace([np.inf, -np.inf], np.nan)
+        yield part.to_csv(index=False, header=start == 0).encode("utf-8")
+
+
 @router.post("/download-filtered")
 async def download_filtered(
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    upload_id: Optional[str] = None,
 ):
+    upload_id = _new_upload_id(upload_id)
     try:
-        all_dfs = []
+        # Ler os CSVs em chunks filtrando apenas FBA, e embaralhar por permutação
+        try:
+            df, order = await run_in_threadpool(_ingest_raw, files, upload_id)
+        except Exception as e:
+            _finish_progress(upload_id, "error", error=str(e))
+            raise
+        _finish_progress(upload_id, "done", rows=len(df))
+
+        # Exportar em fatias (gerador síncrono roda no threadpool do Starlette)
+        return StreamingResponse(
+            _iter_csv_slices(df, order),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=sellers_filtrado.csv", "X-Upload-Id": upload_id}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Ler todos os arquivos CSV
-        for file in files:
-            content = await file.read()
-            df = pd.read_csv(io.BytesIO(content), low_memory=False)
-            all_dfs.append(df)
 
-        # Concatenar todos os DataFrames
-        df = pd.concat(all_dfs, ignore_index=True)
+@router.get("/capture-files")
+async def get_capture_files():
+    """Capturas de fornecedor (Produtos_*.xlsx) disponíveis para /join-captures."""
+    return {"files": await run_in_threadpool(list_capture_files)}
 
-        # Filtrar apenas FBA
-        if "Uses FBA" in df.columns:
-            df = df[df["Uses FBA"] == True]
 
-        # Embaralhar os dados
-        df = df.sample(frac=1).reset_index(drop=True)
+JOIN_FORMATS = ("csv", "parquet", "json")
 
-        # Substituir NaN, inf e -inf por None antes de exportar
-        df = df.replace([np.nan, np.inf, -np.inf], None)
 
-        # Exportar
-        output = io.BytesIO()
-        df.to_csv(output, index=False)
-        output.seek(0)
+def _join_frame(dataset: SellerDataset, positions: np.ndarray, files: List[str], min_margin: Optional[float]):
+    """
+    Capturas x sellers pelo GTIN normalizado (UPC-12/EAN-13/GTIN-14 com zeros
+    à esquerda são a mesma chave). Os dois lados já estão indexados: a
+    junção é um merge por hash sobre (posição, chave) e só as linhas que
+    casaram são materializadas.
+    """
+    captures, capture_rows, capture_keys = load_captures(files)
+    index = dataset.gtin_index()
+    if index is None:
+        raise ValueError("Coluna de UPC não encontrada no CSV dos sellers.")
+    seller_rows, seller_keys = index
+
+    # Só entram os sellers que passam nos filtros
+    selected = np.zeros(len(dataset), dtype=bool)
+    selected[positions] = True
+    keep = selected[seller_rows]
+    joined = hash_join(capture_rows, capture_keys, seller_rows[keep], seller_keys[keep])
+
+    columns = dataset.columns
+    matched = captures.iloc[joined["left"].to_numpy()].reset_index(drop=True)
+    roles = ("title", "upc", "asin", "price", "bsr", "fba_count", "seller")
+    seller_cols = list(dict.fromkeys(columns[role] for role in roles if columns.get(role)))
+    offers = dataset.df[seller_cols].iloc[joined["right"].to_numpy()].reset_index(drop=True)
+
+    asins = _object_column(offers, columns["asin"])
+    prices = _price_column(offers, columns["price"])
+    costs = matched["Custo"].astype("float64")
+    margin = (prices - costs).round(2)
+    margin_pct = (margin / prices.where(prices > 0) * 100).round(1)
+    frame = pd.DataFrame({
+        "GTIN": gtin14(joined["key"].to_numpy()),
+        "Produto": matched["Produto"],
+        "UPC Fornecedor": matched["UPC"],
+        "URL Fornecedor": matched["URL Fornecedor"],
+        "Custo": costs,
+        "ASIN": asins,
+        "Título Amazon": _object_column(offers, columns["title"]),
+        "UPC Amazon": _object_column(offers, columns["upc"]),
+        "Preço Amazon": prices,
+        "BSR": _count_column(offers, columns["bsr"]),
+        "Sellers FBA": _count_column(offers, columns["fba_count"]),
+        "Seller": _object_column(offers, columns["seller"]),
+        "Margem": margin,
+        "Margem %": margin_pct,
+        "Link Amazon": _link_column(asins, AMAZON_DP_URL),
+        "Arquivo": matched["Arquivo"],
+    })
+    # Mesmo item capturado x mesmo ASIN aparece uma vez (uploads com linhas repetidas)
+    frame = frame[~pd.DataFrame({"row": joined["left"].to_numpy(), "asin": asins}).duplicated().to_numpy()]
+    if min_margin is not None:
+        frame = frame[frame["Margem"] >= min_margin]
+    # Maior margem primeiro (sem custo vai para o fim), depois melhor BSR
+    frame = frame.sort_values(["Margem", "BSR"], ascending=[False, True], na_position="last", kind="stable")
+
+    summary = {
+        "captures": len(captures),
+        "captures_with_gtin": int(len(np.unique(capture_rows))),
+        "matched_captures": int(joined["left"].nunique()),
+        "with_cost": bool(costs.notna().any()),
+    }
+    return frame.reset_index(drop=True), summary
+
+
+@router.get("/join-captures/{cache_id}")
+async def join_captures(
+    cache_id: str,
+    files: Optional[List[str]] = Query(None),
+    format: str = "csv",
+    limit: int = 200,
+    min_margin: Optional[float] = None,
+    seller: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_bsr: Optional[int] = None,
+    max_bsr: Optional[int] = None,
+    max_fba_sellers: Optional[int] = None,
+    exclude_amazon: bool = False,
+    categoria: Optional[str] = None
+):
+    """
+    Cruza capturas de fornecedor (Produtos_*.xlsx em exports; todas se
+    `files` não vier) com o dataset de sellers pelo GTIN. Margem = preço
+    Amazon - custo, quando a captura tem coluna de custo.
 
-        from starlette.responses import StreamingResponse
+    format=csv|parquet devolve o resultado inteiro; json devolve o resumo e
+    as primeiras `limit` linhas.
+    """
+    try:
+        if format not in JOIN_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format deve ser um de: {', '.join(JOIN_FORMATS)}.")
+        _check_categoria(categoria)
+        dataset = await _get_dataset(cache_id, "Dados não encontrados. Faça upload novamente.")
+        if not files:
+            files = await run_in_threadpool(list_capture_files)
+        if not files:
+            raise HTTPException(status_code=404, detail="Nenhuma captura (Produtos_*.xlsx) encontrada em exports.")
+
+        positions = dataset.filter_positions(
+            seller=seller,
+            min_price=min_price,
+            max_price=max_price,
+            min_bsr=min_bsr,
+            max_bsr=max_bsr,
+            max_fba_sellers=max_fba_sellers,
+            exclude_amazon=exclude_amazon,
+            only_with_upc=True,
+            categoria=categoria,
+        )
+        t0 = time.perf_counter()
+        try:
+            frame, summary = await run_in_threadpool(_join_frame, dataset, positions, files, min_margin)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        logger.info(
+            f"Junção por GTIN: {len(files)} captura(s), {summary['captures']} itens x {len(positions)} sellers "
+            f"-> {len(frame)} linhas em {time.perf_counter() - t0:.2f}s"
+        )
+
+        if format == "json":
+            head = frame.head(max(limit, 0))
+            head = head.astype(object).where(head.notna(), None)
+            return {**summary, "files": files, "total": len(frame), "data": head.to_dict("records")}
+        if format == "parquet":
+            output = io.BytesIO()
+            await run_in_threadpool(frame.to_parquet, output, index=False)
+            return Response(
+                content=output.getvalue(),
+                media_type="application/vnd.apache.parquet",
+                headers={"Content-Disposition": "attachment; filename=capturas_x_sellers.parquet"}
+            )
         return StreamingResponse(
-            io.BytesIO(output.getvalue()),
+            _iter_csv_slices(frame, np.arange(len(frame))),
             media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=sellers_filtrado.csv"}
+            headers={"Content-Disposition": "attachment; filename=capturas_x_sellers.csv"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,13 +1,101 @@
+from .category_classifier import (
+    CAT_KEYWORDS,
+    CATEGORIAS_CANONICAS,
+    CategoryClassifier,
+    get_category_classifier,
+)
+from .dataset_registry import DatasetRegistry
+from .diagnostics_metrics import (
+    DiagnosticsMetrics,
+    DiagnosticsMetricsCache,
+    LogHistogram,
+    diagnostics_metrics,
+)
 from .extraction_service import (
     cache_key,
     extract_page_fast,
     normalize_upc,
     same_domain_probe,
 )
+from .gtin_join import (
+    gtin14,
+    gtin_keys,
+    hash_join,
+    list_capture_files,
+    load_captures,
+)
+from .log_tail import (
+    LOG_POLL_INTERVAL_SECONDS,
+    LogTailer,
+    get_log_tailer,
+)
+from .product_store import (
+    PRODUCT_FILTERS,
+    ProductFilters,
+    ProductTable,
+    ProductTableCache,
+    parse_bool,
+    parse_chain,
+    parse_number,
+)
+from .seller_store import (
+    FBA_COLUMN,
+    SELLER_UPLOAD_ALL_COLUMNS,
+    SORT_ROLES,
+    ColumnRoles,
+    SellerDataset,
+    detect_columns,
+    ingest_columns,
+    iter_csv_chunks,
+    read_csv_header,
+    schema_hash,
+)
+from .status_cache import (
+    ExportIndex,
+    StateSummaryCache,
+    summarize_state,
+)
 
 __all__ = [
+    "CATEGORIAS_CANONICAS",
+    "CAT_KEYWORDS",
+    "CategoryClassifier",
+    "ColumnRoles",
+    "DatasetRegistry",
+    "DiagnosticsMetrics",
+    "DiagnosticsMetricsCache",
+    "ExportIndex",
+    "FBA_COLUMN",
+    "LOG_POLL_INTERVAL_SECONDS",
+    "LogHistogram",
+    "LogTailer",
+    "PRODUCT_FILTERS",
+    "ProductFilters",
+    "ProductTable",
+    "ProductTableCache",
+    "SELLER_UPLOAD_ALL_COLUMNS",
+    "SORT_ROLES",
+    "StateSummaryCache",
+    "SellerDataset",
     "cache_key",
+    "detect_columns",
+    "diagnostics_metrics",
     "extract_page_fast",
+    "get_category_classifier",
+    "get_log_tailer",
+    "gtin14",
+    "gtin_keys",
+    "hash_join",
+    "ingest_columns",
+    "iter_csv_chunks",
+    "list_capture_files",
+    "load_captures",
     "normalize_upc",
+    "parse_bool",
+    "parse_chain",
+    "parse_number",
+    "read_csv_header",
     "same_domain_probe",
+    "schema_hash",
+    "summarize_state",
 ]
@@ -0,0 +1,108 @@
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+CATEGORIAS_CANONICAS = [
+    "Arts, Crafts & Sewing",
+    "Office Products",
+    "Toys & Games",
+    "Sports & Outdoors",
+    "Automotive (Acessórios)",
+    "Pet Supplies",
+    "Tools & Home Improvement",
+    "Home & Kitchen",
+]
+
+CAT_KEYWORDS = {
+    "Arts, Crafts & Sewing": [
+        r"\barts?\b", r"\bcrafts?\b", r"\bsewing\b",
+    ],
+    "Office Products": [r"\boffice(\s+products?)?\b", r"\bstationery\b"],
+    "Toys & Games": [r"\btoys?\b", r"\bgames?\b"],
+    "Sports & Outdoors": [r"\bsports?\b", r"\boutdoors?\b"],
+    "Automotive (Acessórios)": [r"\bautomotive\b", r"\bauto\s*parts\b"],
+    "Pet Supplies": [r"\bpet\s+supplies\b", r"\bpet\b"],
+    "Tools & Home Improvement": [r"\btools?\b", r"\bhome\s+improv"],
+    "Home & Kitchen": [r"\bhome\b", r"\bkitchen\b"],
+}
+
+# Valores de categoria já classificados (memo entre datasets).
+CATEGORY_MEMO_MAX_ENTRIES = 100_000
+
+
+def _root(value: str) -> str:
+    """Mesma normalização de antes: casefold e só a raiz de "A > B > C"."""
+    val = value.strip().casefold()
+    if ">" in val:
+        val = val.split(">", 1)[0].strip()
+    return val
+
+
+class CategoryClassifier:
+    """
+    Classifica valores de categoria nas categorias canônicas com um único
+    regex compilado: um lookahead opcional com grupo nomeado por categoria,
+    então um match diz todas as categorias que o valor atende (um valor pode
+    cair em mais de uma, ex.: "Tools & Home Improvement" também casa \\bhome\\b).
+
+    Trabalha sobre valores únicos; o resultado por valor fica memoizado.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]] = CAT_KEYWORDS, categories: Optional[List[str]] = None):
+        self.categories = list(categories or keywords)
+        self._groups = [f"c{idx}" for idx in range(len(self.categories))]
+        parts = []
+        for group, category in zip(self._groups, self.categories):
+            patterns = keywords.get(category, [])
+            alternatives = "|".join(f"(?:{pat})" for pat in patterns) or "(?!)"
+            parts.append(f"(?:(?=.*?(?P<{group}>{alternatives})))?")
+        self.pattern = re.compile("^" + "".join(parts), flags=re.I | re.S)
+        self._memo: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _classify_new(self, roots: List[str]) -> np.ndarray:
+        extracted = pd.Series(roots, dtype=object).str.extract(self.pattern, expand=True)
+        return extracted[self._groups].notna().to_numpy()
+
+    def classify(self, values: Iterable) -> np.ndarray:
+        """Matriz bool (valores x categorias); valores não-texto não casam nada."""
+        values = list(values)
+        result = np.zeros((len(values), len(self.categories)), dtype=bool)
+        pending: Dict[str, List[int]] = {}
+        with self._lock:
+            for row, value in enumerate(values):
+                if not isinstance(value, str):
+                    continue
+                hit = self._memo.get(value)
+                if hit is not None:
+                    result[row] = hit
+                else:
+                    pending.setdefault(value, []).append(row)
+        if pending:
+            keys = list(pending)
+            matrix = self._classify_new([_root(value) for value in keys])
+            with self._lock:
+                if len(self._memo) + len(keys) > CATEGORY_MEMO_MAX_ENTRIES:
+                    self._memo.clear()
+                for value, hits in zip(keys, matrix):
+                    self._memo[value] = hits
+                    result[pending[value]] = hits
+        return result
+
+    def matches(self, value, category: str) -> bool:
+        if category not in self.categories:
+            return False
+        return bool(self.classify([value])[0, self.categories.index(category)])
+
+
+_classifier: Optional[CategoryClassifier] = None
+
+
+def get_category_classifier() -> CategoryClassifier:
+    global _classifier
+    if _classifier is None:
+        _classifier = CategoryClassifier(CAT_KEYWORDS, CATEGORIAS_CANONICAS)
+    return _classifier
@@ -0,0 +1,263 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .seller_store import ROLE_NAMES, ColumnRoles, SellerDataset
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Orçamento de memória para os datasets carregados (MB). Acima disso, o
+# menos usado recentemente sai da memória.
+SELLER_CACHE_MAX_MB = float(os.getenv("SELLER_CACHE_MAX_MB", "2048"))
+# Datasets tirados da memória vão para Parquet aqui e voltam sob demanda.
+SELLER_SPILL_ENABLED = os.getenv("SELLER_SPILL_ENABLED", "1") == "1"
+SELLER_SPILL_DIR = os.getenv("SELLER_SPILL_DIR", os.path.join(BASE_DIR, "state", "seller_datasets"))
+# Arquivos de spill mais velhos que isso são apagados (0 = nunca).
+SELLER_SPILL_MAX_AGE_HOURS = float(os.getenv("SELLER_SPILL_MAX_AGE_HOURS", "72"))
+
+
+class DatasetRegistry:
+    """
+    Datasets de sellers enviados, cada um com id próprio.
+
+    Os carregados ficam em LRU dentro de SELLER_CACHE_MAX_MB; o que sai da
+    memória vai para SELLER_SPILL_DIR (Parquet + metadados) e é recarregado
+    no próximo acesso. Sem pyarrow ou com spill desligado, o dataset
+    despejado é descartado (o cliente recebe 404 e refaz o upload).
+
+    Um alias (ex.: "current_data") aponta para o upload mais recente.
+    """
+
+    def __init__(
+        self,
+        max_bytes: float = SELLER_CACHE_MAX_MB * 1024 * 1024,
+        spill_dir: Optional[str] = SELLER_SPILL_DIR if SELLER_SPILL_ENABLED else None,
+    ):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir if PARQUET_AVAILABLE else None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._aliases: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._scan_spill_dir()
+
+    # ------------------------------------------------------------- disco
+
+    def _paths(self, dataset_id: str) -> Dict[str, str]:
+        base = os.path.join(self.spill_dir, dataset_id)
+        return {"data": base + ".parquet", "order": base + ".order.npy", "meta": base + ".json"}
+
+    def _scan_spill_dir(self) -> None:
+        """Reconhece datasets de execuções anteriores (ficam só em disco até o primeiro acesso)."""
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return
+        now = time.time()
+        for name in sorted(os.listdir(self.spill_dir)):
+            if not name.endswith(".json"):
+                continue
+            dataset_id = name[:-len(".json")]
+            try:
+                with open(os.path.join(self.spill_dir, name), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except Exception as e:
+                logger.warning(f"Metadados de dataset ignorados ({name}): {e}")
+                continue
+            if SELLER_SPILL_MAX_AGE_HOURS > 0 and now - meta.get("created_at", 0) > SELLER_SPILL_MAX_AGE_HOURS * 3600:
+                self._remove_files(dataset_id)
+                continue
+            self._entries[dataset_id] = {
+                "dataset": None,
+                "rows": meta.get("rows", 0),
+                "schema": meta.get("schema"),
+                "bytes": meta.get("bytes", 0),
+                "created_at": meta.get("created_at", 0),
+                "last_access": meta.get("created_at", 0),
+                "hits": 0,
+                "spilled": True,
+            }
+
+    def _spill(self, dataset_id: str, entry: Dict[str, Any]) -> bool:
+        if not self.spill_dir:
+            return False
+        if entry.get("spilled"):
+            return True  # datasets não mudam: o arquivo de antes continua valendo
+        dataset: SellerDataset = entry["dataset"]
+        paths = self._paths(dataset_id)
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            tmp_data = paths["data"] + ".tmp"
+            dataset.df.to_parquet(tmp_data, index=False)
+            os.replace(tmp_data, paths["data"])
+            if dataset.order is not None:
+                with open(paths["order"], "wb") as f:
+                    np.save(f, dataset.order)
+            tmp_meta = paths["meta"] + ".tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({
+                    "columns": dataset.columns,
+                    "schema": dataset.schema,
+                    "rows": entry["rows"],
+                    "bytes": entry["bytes"],
+                    "created_at": entry["created_at"],
+                    "has_order": dataset.order is not None,
+                }, f, ensure_ascii=False)
+            # Metadados por último: sem .json o spill não é considerado completo.
+            os.replace(tmp_meta, paths["meta"])
+        except Exception as e:
+            logger.error(f"Erro salvando dataset {dataset_id} em disco: {e}")
+            self._remove_files(dataset_id)
+            return False
+        entry["spilled"] = True
+        return True
+
+    def _load(self, dataset_id: str) -> Optional[SellerDataset]:
+        paths = self._paths(dataset_id)
+        try:
+            with open(paths["meta"], "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            df = pd.read_parquet(paths["data"])
+            order = np.load(paths["order"]) if meta.get("has_order") else None
+        except Exception as e:
+            logger.error(f"Erro recarregando dataset {dataset_id} do disco: {e}")
+            return None
+        # Spills antigos podem não ter papéis adicionados depois (ex.: category).
+        columns = ColumnRoles(**{role: None for role in ROLE_NAMES})
+        columns.update(meta["columns"])
+        return SellerDataset(df, columns, order=order, schema=meta.get("schema"))
+
+    def _remove_files(self, dataset_id: str) -> None:
+        if not self.spill_dir:
+            return
+        for path in self._paths(dataset_id).values():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Erro removendo {path}: {e}")
+
+    # ------------------------------------------------------------ memória
+
+    def _memory_bytes(self) -> int:
+        return sum(e["bytes"] for e in self._entries.values() if e["dataset"] is not None)
+
+    def _evict(self, keep: str) -> None:
+        """Tira da memória os menos usados até caber no orçamento (nunca o `keep`)."""
+        for dataset_id in list(self._entries):
+            if self._memory_bytes() <= self.max_bytes:
+                return
+            entry = self._entries[dataset_id]
+            if dataset_id == keep or entry["dataset"] is None:
+                continue
+            if self._spill(dataset_id, entry):
+                entry["dataset"] = None
+                logger.info(f"Dataset {dataset_id} salvo em disco para liberar memória ({entry['bytes'] / 2**20:.0f} MB)")
+            else:
+                self._drop(dataset_id)
+                logger.info(f"Dataset {dataset_id} descartado para liberar memória ({entry['bytes'] / 2**20:.0f} MB)")
+
+    def _drop(self, dataset_id: str) -> None:
+        self._entries.pop(dataset_id, None)
+        for alias, target in list(self._aliases.items()):
+            if target == dataset_id:
+                del self._aliases[alias]
+
+    # ---------------------------------------------------------------- API
+
+    def register(self, dataset: SellerDataset, alias: Optional[str] = None, dataset_id: Optional[str] = None) -> str:
+        """Registra com o id dado (ex.: o upload_id do cliente) ou um novo; ValueError se o id já existe."""
+        dataset_id = dataset_id or uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            if dataset_id in self._entries or dataset_id in self._aliases:
+                raise ValueError(f"Dataset {dataset_id} já existe.")
+            self._entries[dataset_id] = {
+                "dataset": dataset,
+                "rows": len(dataset),
+                "schema": dataset.schema,
+                "bytes": dataset.memory_bytes(),
+                "created_at": now,
+                "last_access": now,
+                "hits": 0,
+                "spilled": False,
+            }
+            if alias:
+                self._aliases[alias] = dataset_id
+            self._evict(keep=dataset_id)
+        return dataset_id
+
+    def __contains__(self, dataset_id: str) -> bool:
+        with self._lock:
+            return self.resolve(dataset_id) in self._entries
+
+    def resolve(self, dataset_id: str) -> str:
+        return self._aliases.get(dataset_id, dataset_id)
+
+    def get(self, dataset_id: str) -> Optional[SellerDataset]:
+        """Dataset pelo id (ou alias); recarrega do disco se preciso. None se não existe."""
+        with self._lock:
+            dataset_id = self.resolve(dataset_id)
+            entry = self._entries.get(dataset_id)
+            if entry is None:
+                return None
+            if entry["dataset"] is None:
+                dataset = self._load(dataset_id)
+                if dataset is None:
+                    self._drop(dataset_id)
+                    return None
+                entry["dataset"] = dataset
+                logger.info(f"Dataset {dataset_id} recarregado do disco ({entry['rows']} linhas)")
+            entry["hits"] += 1
+            entry["last_access"] = time.time()
+            # Índices e caches de filtro crescem com o uso: reavalia o tamanho.
+            entry["bytes"] = entry["dataset"].memory_bytes()
+            self._entries.move_to_end(dataset_id)
+            self._evict(keep=dataset_id)
+            return entry["dataset"]
+
+    def delete(self, dataset_id: str) -> bool:
+        with self._lock:
+            dataset_id = self.resolve(dataset_id)
+            if dataset_id not in self._entries:
+                return False
+            self._drop(dataset_id)
+            self._remove_files(dataset_id)
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            datasets: List[Dict[str, Any]] = []
+            for dataset_id, entry in reversed(self._entries.items()):
+                datasets.append({
+                    "id": dataset_id,
+                    "aliases": sorted(a for a, target in self._aliases.items() if target == dataset_id),
+                    "rows": entry["rows"],
+                    "schema": entry.get("schema"),
+                    "memory_mb": round(entry["bytes"] / 2**20, 1),
+                    "location": "memory" if entry["dataset"] is not None else "disk",
+                    "created_at": entry["created_at"],
+                    "last_access": entry["last_access"],
+                    "hits": entry["hits"],
+                })
+            return {
+                "budget_mb": round(self.max_bytes / 2**20, 1),
+                "memory_mb": round(self._memory_bytes() / 2**20, 1),
+                "in_memory": sum(1 for d in datasets if d["location"] == "memory"),
+                "on_disk": sum(1 for d in datasets if d["location"] == "disk"),
+                "spill_dir": self.spill_dir,
+                "datasets": datasets,
+            }
@@ -0,0 +1,448 @@
+import gzip
+import json
+import math
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from automation.diagnostics import list_diagnostic_files
+
+# Intervalo sem nenhum evento a partir do qual o robô é considerado parado
+# (não entra nas horas ativas). Igual ao tempo máximo de espera do captcha.
+DIAGNOSTICS_IDLE_GAP_SECONDS = float(os.getenv("DIAGNOSTICS_IDLE_GAP_SECONDS", "900"))
+# Razão entre baldes consecutivos do histograma (1.02 = erro relativo <= ~1% nos percentis).
+DIAGNOSTICS_HISTOGRAM_GROWTH = float(os.getenv("DIAGNOSTICS_HISTOGRAM_GROWTH", "1.02"))
+# Bytes lidos por vez do arquivo ativo.
+DIAGNOSTICS_READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+# Falhas contadas no relatório (evento -> nome no relatório).
+FAILURE_EVENTS = {
+    "batch_capture_error": "batch_capture_error",
+    "batch_skipped_no_opened_tabs": "batch_no_opened_tabs",
+    "tab_open_error": "tab_open_error",
+    "captcha_timeout": "captcha_timeout",
+    "cdp_connect_error": "cdp_connect_error",
+    "automation_crash_restart": "automation_crash_restart",
+}
+# Eventos que alimentam estágios/tempos; os demais só entram na contagem por evento.
+METRIC_EVENTS = frozenset({
+    "page_navigation",
+    "batch_open_summary",
+    "batch_capture_success",
+    "batch_capture_error",
+    "batch_skipped_no_opened_tabs",
+    "captcha_resolved",
+    "captcha_timeout",
+    "memory_pressure_backoff",
+    "tab_open_error",
+})
+STAGE_PERCENTILES = (50, 95, 99)
+
+# Campos lidos sem json.loads (a maioria das linhas só conta evento e horário).
+_EVENT_RE = re.compile(rb'"event":\s*"([^"]*)"')
+_TS_RE = re.compile(rb'"ts":\s*([0-9.]+)')
+_TIMESTAMP_RE = re.compile(rb'"timestamp":\s*"([^"]+)"')
+_SAMPLE_RE = re.compile(rb'"sample_rate":\s*([0-9.eE-]+)')
+# Carimbo de rotação no nome (automation_diagnostics.20260101-120000-000000.jsonl.gz).
+_ROTATED_STAMP_RE = re.compile(r"\.(\d{8}-\d{6})(?:-\d{6})?\.")
+
+
+class LogHistogram:
+    """
+    Histograma de baldes geométricos (valores em ms): memória limitada ao
+    número de baldes distintos, percentis com erro relativo de ~(growth-1)/2.
+    Pesos aceitam eventos amostrados (1/sample_rate).
+    """
+
+    def __init__(self, growth: float = DIAGNOSTICS_HISTOGRAM_GROWTH):
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.buckets: Dict[int, float] = {}
+        self.count = 0.0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        value = max(0.0, float(value))
+        # Balde -1 guarda tudo abaixo de 1 ms.
+        index = int(math.log(value) / self._log_growth) if value >= 1 else -1
+        self.buckets[index] = self.buckets.get(index, 0.0) + weight
+        self.count += weight
+        self.total += value * weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LogHistogram") -> None:
+        for index, weight in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0.0) + weight
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                # Meio geométrico do balde, limitado ao mínimo/máximo reais.
+                value = 0.0 if index < 0 else self.growth ** (index + 0.5)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        result: Dict[str, Any] = {"count": round(self.count)}
+        for p in STAGE_PERCENTILES:
+            result[f"p{p}_ms"] = round(self.quantile(p / 100), 1)
+        result["mean_ms"] = round(self.total / self.count, 1)
+        result["max_ms"] = round(self.max, 1)
+        result["total_seconds"] = round(self.total / 1000, 1)
+        return result
+
+
+def _number(value: Any) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+
+def _add_upc(table: Dict[str, List[float]], key: str, captured: float, known: float, with_upc: float) -> None:
+    # [capturados, capturados com informação de UPC, com UPC]
+    counts = table.setdefault(key, [0.0, 0.0, 0.0])
+    counts[0] += captured
+    counts[1] += known
+    counts[2] += with_upc
+
+
+def _upc_rows(table: Dict[str, List[float]], label: str, top: int) -> List[Dict[str, Any]]:
+    rows = sorted(table.items(), key=lambda kv: kv[1][0], reverse=True)
+    if top > 0:
+        rows = rows[:top]
+    return [
+        {
+            label: key,
+            "captured": round(captured),
+            "with_upc": round(with_upc),
+            "upc_hit_rate": round(with_upc / known, 4) if known else None,
+        }
+        for key, (captured, known, with_upc) in rows
+    ]
+
+
+class DiagnosticsMetrics:
+    """
+    Agregados de um trecho do JSONL de diagnóstico (um arquivo ou parte dele).
+    Tudo é contador, soma ou LogHistogram, então a memória não depende do
+    tamanho do log e dois agregados em ordem cronológica se juntam com merge().
+    """
+
+    def __init__(self):
+        self.lines = 0
+        self.bad_lines = 0
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+        self.active_seconds = 0.0
+        self.events: Dict[str, float] = {}
+        self.failures: Dict[str, float] = {}
+        self.lost_seconds: Dict[str, float] = {"captcha": 0.0, "settle": 0.0, "failures": 0.0, "memory_backoff": 0.0}
+        self.stages: Dict[str, LogHistogram] = {}
+        self.captured = 0.0
+        self.suppliers: Dict[str, List[float]] = {}
+        self.domains: Dict[str, List[float]] = {}
+        self._last_timestamp: Tuple[bytes, float] = (b"", 0.0)
+
+    # ------------------------------------------------------------ entrada
+
+    def _timestamp(self, raw: bytes) -> Optional[float]:
+        match = _TS_RE.search(raw)
+        if match:
+            return float(match.group(1))
+        # Linhas anteriores ao envelope v1 só têm "timestamp" (resolução de segundo).
+        match = _TIMESTAMP_RE.search(raw)
+        if not match:
+            return None
+        text = match.group(1)
+        if text != self._last_timestamp[0]:
+            try:
+                parsed = datetime.strptime(text.decode("ascii"), "%Y-%m-%d %H:%M:%S").timestamp()
+            except (UnicodeDecodeError, ValueError):
+                return None
+            self._last_timestamp = (text, parsed)
+        return self._last_timestamp[1]
+
+    def _touch(self, ts: float) -> None:
+        if self.first_ts is None:
+            self.first_ts = ts
+        elif self.last_ts is not None and 0 < ts - self.last_ts <= DIAGNOSTICS_IDLE_GAP_SECONDS:
+            self.active_seconds += ts - self.last_ts
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+
+    def add_line(self, raw: bytes, since_ts: Optional[float] = None) -> None:
+        raw = raw.strip()
+        if not raw:
+            return
+        match = _EVENT_RE.search(raw)
+        if not match:
+            self.bad_lines += 1
+            return
+        ts = self._timestamp(raw)
+        if since_ts is not None and (ts is None or ts < since_ts):
+            return
+        self.lines += 1
+        if ts is not None:
+            self._touch(ts)
+        event = match.group(1).decode("utf-8", errors="replace")
+        sample = _SAMPLE_RE.search(raw)
+        rate = _number(sample.group(1)) if sample else 1.0
+        weight = 1.0 / rate if rate > 0 else 1.0
+        self.events[event] = self.events.get(event, 0.0) + weight
+        if event in FAILURE_EVENTS:
+            name = FAILURE_EVENTS[event]
+            self.failures[name] = self.failures.get(name, 0.0) + weight
+        if event not in METRIC_EVENTS:
+            return
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            self.bad_lines += 1
+            return
+        if isinstance(record, dict):
+            self._add_metrics(event, record, weight)
+
+    def _stage(self, name: str, value_ms: float, weight: float) -> None:
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self.stages[name] = LogHistogram()
+        histogram.add(value_ms, weight)
+
+    def _add_metrics(self, event: str, record: Dict[str, Any], weight: float) -> None:
+        lost = self.lost_seconds
+        if event == "page_navigation":
+            settle_ms = _number(record.get("settle_ms"))
+            elapsed_ms = _number(record.get("elapsed_ms"))
+            self._stage("navigation", max(0.0, elapsed_ms - settle_ms), weight)
+            lost["settle"] += settle_ms / 1000 * weight
+            if record.get("error"):
+                self.failures["navigation_error"] = self.failures.get("navigation_error", 0.0) + weight
+                lost["failures"] += max(0.0, elapsed_ms - settle_ms) / 1000 * weight
+        elif event == "batch_open_summary":
+            if "elapsed_ms" in record:
+                elapsed_ms = _number(record["elapsed_ms"])
+                self._stage("tab_open", elapsed_ms, weight)
+                if not _number(record.get("opened")):
+                    lost["failures"] += elapsed_ms / 1000 * weight
+        elif event == "batch_capture_success":
+            captured = _number(record.get("captured_items")) * weight
+            self.captured += captured
+            if "elapsed_ms" in record:
+                self._stage("capture", _number(record["elapsed_ms"]), weight)
+            lost["settle"] += _number(record.get("settle_ms")) / 1000 * weight
+            known = captured if "with_upc" in record else 0.0
+            with_upc = _number(record.get("with_upc")) * weight
+            supplier = record.get("supplier_index")
+            if supplier is not None:
+                _add_upc(self.suppliers, str(supplier), captured, known, with_upc)
+            by_domain = record.get("upc_by_domain")
+            if isinstance(by_domain, dict):
+                for domain, counts in by_domain.items():
+                    if isinstance(counts, list) and len(counts) == 2:
+                        domain_captured = _number(counts[0]) * weight
+                        _add_upc(self.domains, domain or "?", domain_captured, domain_captured, _number(counts[1]) * weight)
+        elif event == "batch_capture_error":
+            elapsed_ms = _number(record.get("elapsed_ms"))
+            if "elapsed_ms" in record:
+                self._stage("capture_error", elapsed_ms, weight)
+            lost["settle"] += _number(record.get("settle_ms")) / 1000 * weight
+            lost["failures"] += (elapsed_ms / 1000 + _number(record.get("retry_sleep_seconds"))) * weight
+        elif event == "batch_skipped_no_opened_tabs":
+            lost["failures"] += _number(record.get("retry_sleep_seconds")) * weight
+        elif event in ("captcha_resolved", "captcha_timeout"):
+            waited = _number(record.get("waited_seconds"))
+            self._stage("captcha_wait", waited * 1000, weight)
+            lost["captcha"] += waited * weight
+        elif event == "memory_pressure_backoff":
+            cooldown = _number(record.get("cooldown_seconds"))
+            if "cooldown_seconds" in record:
+                self._stage("memory_backoff", cooldown * 1000, weight)
+            lost["memory_backoff"] += cooldown * weight
+
+    def add_lines(self, lines: Iterable[bytes], since_ts: Optional[float] = None) -> None:
+        for raw in lines:
+            self.add_line(raw, since_ts)
+
+    # ------------------------------------------------------------- junção
+
+    def merge(self, other: "DiagnosticsMetrics") -> None:
+        """Soma `other` (trecho posterior do log) neste agregado."""
+        self.lines += other.lines
+        self.bad_lines += other.bad_lines
+        if other.first_ts is not None:
+            if self.last_ts is not None and 0 < other.first_ts - self.last_ts <= DIAGNOSTICS_IDLE_GAP_SECONDS:
+                self.active_seconds += other.first_ts - self.last_ts
+            if self.first_ts is None or other.first_ts < self.first_ts:
+                self.first_ts = other.first_ts
+            if self.last_ts is None or (other.last_ts or 0) > self.last_ts:
+                self.last_ts = other.last_ts
+        self.active_seconds += other.active_seconds
+        for target, source in ((self.events, other.events), (self.failures, other.failures), (self.lost_seconds, other.lost_seconds)):
+            for key, value in source.items():
+                target[key] = target.get(key, 0.0) + value
+        for name, histogram in other.stages.items():
+            mine = self.stages.get(name)
+            if mine is None:
+                mine = self.stages[name] = LogHistogram(histogram.growth)
+            mine.merge(histogram)
+        self.captured += other.captured
+        for target, source in ((self.suppliers, other.suppliers), (self.domains, other.domains)):
+            for key, (captured, known, with_upc) in source.items():
+                _add_upc(target, key, captured, known, with_upc)
+
+    # ------------------------------------------------------------- saída
+
+    def report(self, top: int = 20) -> Dict[str, Any]:
+        active_hours = self.active_seconds / 3600
+        known = sum(counts[1] for counts in self.suppliers.values())
+        with_upc = sum(counts[2] for counts in self.suppliers.values())
+        return {
+            "lines": self.lines,
+            "bad_lines": self.bad_lines,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "wall_hours": round(((self.last_ts or 0) - (self.first_ts or 0)) / 3600, 3),
+            "active_hours": round(active_hours, 3),
+            "products": {
+                "captured": round(self.captured),
+                "per_active_hour": round(self.captured / active_hours, 1) if active_hours else None,
+                "with_upc": round(with_upc),
+                "upc_hit_rate": round(with_upc / known, 4) if known else None,
+            },
+            "suppliers": _upc_rows(self.suppliers, "supplier_index", top),
+            "domains": _upc_rows(self.domains, "domain", top),
+            "time_lost_seconds": {key: round(value, 1) for key, value in self.lost_seconds.items()},
+            "failures": {key: round(value) for key, value in sorted(self.failures.items())},
+            "stages": {name: histogram.summary() for name, histogram in sorted(self.stages.items())},
+            "events": {key: round(value) for key, value in sorted(self.events.items(), key=lambda kv: -kv[1])},
+        }
+
+
+def _open_lines(path: str) -> Iterator[bytes]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        yield from f
+
+
+def _rotated_before(path: str, since_ts: float) -> bool:
+    # Arquivo rotacionado antes de `since` só tem eventos anteriores a ele.
+    match = _ROTATED_STAMP_RE.search(os.path.basename(path))
+    if not match:
+        return False
+    try:
+        rotated_at = datetime.strptime(match.group(1), "%Y%m%d-%H%M%S").timestamp()
+    except ValueError:
+        return False
+    return rotated_at + 1 < since_ts
+
+
+def diagnostics_metrics(paths: Iterable[str], since_ts: Optional[float] = None) -> DiagnosticsMetrics:
+    """Um passe em streaming pelos arquivos (em ordem cronológica), .jsonl ou .jsonl.gz."""
+    metrics = DiagnosticsMetrics()
+    for path in paths:
+        if since_ts is not None and _rotated_before(path, since_ts):
+            continue
+        part = DiagnosticsMetrics()
+        part.add_lines(_open_lines(path), since_ts)
+        metrics.merge(part)
+    return metrics
+
+
+class DiagnosticsMetricsCache:
+    """
+    Agregado do log de diagnóstico inteiro para /metrics sem reler gigabytes:
+    arquivos rotacionados (.gz, imutáveis) são lidos uma vez e guardados por
+    (tamanho, mtime); o arquivo ativo é lido só a partir do último offset.
+    Rotação ou truncamento (inode diferente/tamanho menor) refaz só o ativo.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._files: Dict[str, Tuple[Tuple[int, int], DiagnosticsMetrics]] = {}
+        self._active = DiagnosticsMetrics()
+        self._active_inode: Optional[int] = None
+        self._active_offset = 0
+        self._active_pending = b""
+        self._lock = threading.Lock()
+
+    def _reset_active(self) -> None:
+        self._active = DiagnosticsMetrics()
+        self._active_inode = None
+        self._active_offset = 0
+        self._active_pending = b""
+
+    def _read_active(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset_active()
+            return
+        if self._active_inode is not None and (st.st_ino != self._active_inode or st.st_size < self._active_offset):
+            self._reset_active()
+        self._active_inode = st.st_ino
+        if st.st_size == self._active_offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._active_offset)
+            while True:
+                block = f.read(DIAGNOSTICS_READ_CHUNK_BYTES)
+                if not block:
+                    break
+                self._active_offset += len(block)
+                # Linha ainda sem "\n" fica para a próxima leitura.
+                *complete, self._active_pending = (self._active_pending + block).split(b"\n")
+                self._active.add_lines(complete)
+
+    def metrics(self) -> DiagnosticsMetrics:
+        with self._lock:
+            seen = set()
+            merged = DiagnosticsMetrics()
+            for path in list_diagnostic_files(self.path):
+                if path == self.path:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                key = (st.st_size, st.st_mtime_ns)
+                cached = self._files.get(path)
+                if cached is None or cached[0] != key:
+                    part = DiagnosticsMetrics()
+                    part.add_lines(_open_lines(path))
+                    cached = self._files[path] = (key, part)
+                seen.add(path)
+                merged.merge(cached[1])
+            for path in set(self._files) - seen:
+                del self._files[path]
+            self._read_active()
+            merged.merge(self._active)
+            return merged
+
+    def report(self, since_ts: Optional[float] = None, top: int = 20) -> Dict[str, Any]:
+        if since_ts is None:
+            metrics = self.metrics()
+        else:
+            # Janela de tempo: passe novo (ainda em streaming), sem cache.
+            metrics = diagnostics_metrics(list_diagnostic_files(self.path), since_ts)
+        result = metrics.report(top)
+        result["files"] = len(list_diagnostic_files(self.path))
+        result["since_ts"] = since_ts
+        return result
@@ -0,0 +1,233 @@
+import glob
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+EXPORTS_DIR = os.getenv("JOIN_EXPORTS_DIR", os.path.join(BASE_DIR, "exports"))
+CAPTURE_FILE_PATTERN = "Produtos_*.xlsx"
+# Capturas já lidas e indexadas, por (caminho, mtime).
+CAPTURE_CACHE_ENTRIES = int(os.getenv("JOIN_CAPTURE_CACHE_ENTRIES", "64"))
+
+# UPC-12, EAN-13 e GTIN-14 são o mesmo número com zeros à esquerda; EAN-8
+# também entra. Abaixo de 8 dígitos não é código (UPC lido como float perde
+# só os zeros à esquerda, então 11 dígitos ainda vale).
+GTIN_MIN_DIGITS = 8
+GTIN_MAX_DIGITS = 14
+# Keepa às vezes traz vários códigos na mesma célula ("0123..., 0456...").
+_CODE_SEPARATORS_RE = r"[,;|/\s]+"
+_HYPERLINK_RE = re.compile(r'^=HYPERLINK\("([^"]*)"', re.I)
+
+# Colunas da captura (cabeçalho do template, em minúsculas) -> nome na saída.
+CAPTURE_COLUMNS = {
+    "produto": "Produto",
+    "upc": "UPC",
+    "url fornecedor": "URL Fornecedor",
+}
+# Coluna de custo do fornecedor, se alguém acrescentou uma na planilha.
+CAPTURE_COST_HINTS = ("custo", "cost", "preço", "preco", "price")
+
+
+def gtin_keys(values: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (posição da linha, GTIN como inteiro) para cada código válido.
+
+    O inteiro do GTIN-14 com zeros à esquerda é o mesmo do UPC-12/EAN-13
+    equivalente, então a chave de junção é só int64 (cabe: < 10**14). Uma
+    célula com vários códigos gera várias chaves para a mesma posição.
+    """
+    series = pd.Series(values, dtype=object)
+    text = series.dropna().astype(str).str.strip()
+    text = text[text != ""]
+    if text.empty:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # "12345678905.0" (UPC que passou por float) perde só o sufixo.
+    text = text.str.replace(r"\.0+$", "", regex=True)
+    if text.str.contains(_CODE_SEPARATORS_RE, regex=True).any():
+        text = text.str.split(_CODE_SEPARATORS_RE, regex=True).explode()
+    digits = text.str.replace(r"\D+", "", regex=True)
+    lengths = digits.str.len()
+    digits = digits[(lengths >= GTIN_MIN_DIGITS) & (lengths <= GTIN_MAX_DIGITS)]
+    keys = pd.to_numeric(digits).to_numpy(dtype=np.int64)
+    rows = digits.index.to_numpy(dtype=np.int64)
+    valid = keys > 0
+    pairs = pd.DataFrame({"row": rows[valid], "key": keys[valid]}).drop_duplicates()
+    return pairs["row"].to_numpy(), pairs["key"].to_numpy()
+
+
+def gtin14(keys: np.ndarray) -> pd.Series:
+    """Chaves inteiras de volta para texto GTIN-14 (14 dígitos, zeros à esquerda)."""
+    return pd.Series(keys, dtype=np.int64).astype(str).str.zfill(GTIN_MAX_DIGITS)
+
+
+def hash_join(
+    left_rows: np.ndarray,
+    left_keys: np.ndarray,
+    right_rows: np.ndarray,
+    right_keys: np.ndarray,
+) -> pd.DataFrame:
+    """Junção interna pela chave (merge do pandas = tabela hash); colunas left, right, key."""
+    left = pd.DataFrame({"left": left_rows, "key": left_keys})
+    right = pd.DataFrame({"right": right_rows, "key": right_keys})
+    joined = left.merge(right, on="key", how="inner", sort=False)
+    return joined[["left", "right", "key"]]
+
+
+# ------------------------------------------------------------ capturas
+
+
+def list_capture_files(exports_dir: str = EXPORTS_DIR) -> List[str]:
+    """Produtos_*.xlsx em exports (caminhos relativos, mais recentes primeiro)."""
+    pattern = os.path.join(exports_dir, "**", CAPTURE_FILE_PATTERN)
+    paths = glob.glob(pattern, recursive=True)
+    paths.sort(key=os.path.getmtime, reverse=True)
+    return [os.path.relpath(path, exports_dir).replace("\\", "/") for path in paths]
+
+
+def resolve_capture_file(name: str, exports_dir: str = EXPORTS_DIR) -> str:
+    """Caminho absoluto de uma captura; ValueError se sair de exports ou não existir."""
+    root = os.path.realpath(exports_dir)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not path.endswith(".xlsx"):
+        raise ValueError(f"Arquivo de captura inválido: {name}")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Arquivo de captura não encontrado: {name}")
+    return path
+
+
+def _sibling(path: str, folder: str, ext: str) -> str:
+    # Mesmo esquema de nomes do exportador (ARQUIVOS XLSX -> ARQUIVOS PARQUET/CSV).
+    return path.replace(".xlsx", ext).replace("ARQUIVOS XLSX", folder)
+
+
+def _read_xlsx(path: str) -> pd.DataFrame:
+    """XLSX em modo read-only; fórmulas HYPERLINK viram a URL (não há valor em cache)."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        names = [str(h).strip() if h is not None else f"col_{i}" for i, h in enumerate(header)]
+        records = []
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            values = []
+            for v in row[:len(names)]:
+                if isinstance(v, str):
+                    match = _HYPERLINK_RE.match(v)
+                    if match:
+                        v = match.group(1)
+                values.append(v)
+            records.append(values)
+    finally:
+        wb.close()
+    return pd.DataFrame.from_records(records, columns=names)
+
+
+def _read_capture(path: str) -> pd.DataFrame:
+    """
+    Lê uma captura. O Parquet/CSV.gz gerado junto com o XLSX é bem mais
+    rápido e é usado enquanto o XLSX não for alterado depois da exportação
+    (se foi, pode ter ganho uma coluna de custo: lê o próprio XLSX).
+    """
+    xlsx_mtime = os.path.getmtime(path)
+    for sibling, reader in (
+        (_sibling(path, "ARQUIVOS PARQUET", ".parquet"), pd.read_parquet),
+        (_sibling(path, "ARQUIVOS CSV", ".csv.gz"), lambda p: pd.read_csv(p, dtype=str, keep_default_na=False)),
+    ):
+        if sibling != path and os.path.isfile(sibling) and os.path.getmtime(sibling) >= xlsx_mtime:
+            try:
+                return reader(sibling)
+            except Exception as e:
+                logger.warning(f"Erro lendo {sibling}, usando o XLSX: {e}")
+    return _read_xlsx(path)
+
+
+def _parse_cost(series: pd.Series) -> np.ndarray:
+    """Custo digitado à mão: "$12.50", "12,50", "1,234.50" e "1.234,50" viram float."""
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64")
+    text = series.astype(str).str.replace(r"[^\d.,-]", "", regex=True)
+    # O separador que aparece por último é o decimal; o outro é de milhar.
+    comma_decimal = text.str.rfind(",") > text.str.rfind(".")
+    dot_decimal = text.str.replace(",", "", regex=False)
+    comma_as_dot = text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    text = dot_decimal.where(~comma_decimal, comma_as_dot)
+    return pd.to_numeric(text, errors="coerce").to_numpy(dtype="float64")
+
+
+def _capture_frame(raw: pd.DataFrame, name: str) -> pd.DataFrame:
+    by_key = {str(col).strip().lower(): col for col in raw.columns}
+    frame = pd.DataFrame(index=pd.RangeIndex(len(raw)))
+    for key, out in CAPTURE_COLUMNS.items():
+        col = by_key.get(key)
+        frame[out] = raw[col].astype(object).where(raw[col].notna(), None).to_numpy() if col is not None else None
+    cost_col = next(
+        (col for key, col in by_key.items() if key not in CAPTURE_COLUMNS and not key.startswith("amazon")
+         and any(hint in key for hint in CAPTURE_COST_HINTS)),
+        None,
+    )
+    frame["Custo"] = _parse_cost(raw[cost_col]) if cost_col is not None else np.nan
+    frame["Arquivo"] = name
+    return frame
+
+
+class _CaptureCache:
+    """Capturas lidas e com GTIN indexado, por (caminho, mtime) em LRU."""
+
+    def __init__(self, max_entries: int = CAPTURE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, float], Tuple[pd.DataFrame, np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, name: str) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+        key = (path, os.path.getmtime(path))
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                return hit
+        frame = _capture_frame(_read_capture(path), name)
+        rows, keys = gtin_keys(frame["UPC"].to_numpy())
+        entry = (frame, rows, keys)
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+_capture_cache = _CaptureCache()
+
+
+def load_captures(names: Sequence[str], exports_dir: str = EXPORTS_DIR) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Capturas concatenadas e o índice GTIN (posição, chave) sobre elas.
+    Cada arquivo é lido e indexado uma vez enquanto não mudar.
+    """
+    frames: List[pd.DataFrame] = []
+    all_rows: List[np.ndarray] = []
+    all_keys: List[np.ndarray] = []
+    offset = 0
+    for name in names:
+        frame, rows, keys = _capture_cache.get(resolve_capture_file(name, exports_dir), name)
+        frames.append(frame)
+        all_rows.append(rows + offset)
+        all_keys.append(keys)
+        offset += len(frame)
+    if not frames:
+        empty = np.empty(0, dtype=np.int64)
+        return _capture_frame(pd.DataFrame(), ""), empty, empty
+    captures = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return captures, np.concatenate(all_rows), np.concatenate(all_keys)
+
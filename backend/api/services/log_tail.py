@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+# Linhas recentes mantidas em memória (o que um cliente novo recebe de cara).
+LOG_RING_LINES = int(os.getenv("LOG_RING_LINES", "2000"))
+# Na primeira leitura de um log grande, só o final entra no buffer.
+LOG_INITIAL_TAIL_BYTES = int(os.getenv("LOG_INITIAL_TAIL_BYTES", str(512 * 1024)))
+# Intervalo mínimo entre leituras do arquivo (vários clientes dividem a mesma leitura).
+LOG_POLL_INTERVAL_SECONDS = float(os.getenv("LOG_POLL_INTERVAL_SECONDS", "0.5"))
+# Bytes lidos por vez quando o arquivo cresceu muito de uma vez.
+LOG_READ_CHUNK_BYTES = 1024 * 1024
+
+
+class LogTailer:
+    """
+    Leitor único de um arquivo de log que só cresce (ou é truncado).
+
+    Guarda o offset já lido e um ring buffer das últimas linhas completas,
+    cada uma com seus offsets de início e fim. Clientes pedem "o que veio depois
+    do offset X" (cursor opaco que só aumenta dentro da mesma geração); ler o
+    arquivo é um stat + read do trecho novo, sem subprocesso.
+
+    Truncamento (START sem resume, /clear) é detectado pelo tamanho menor ou
+    inode diferente: o buffer é zerado e a geração muda, então o cliente
+    recebe reset=True e troca as linhas que tinha.
+    """
+
+    def __init__(self, path: str, max_lines: int = LOG_RING_LINES):
+        self.path = path
+        # (offset onde a linha começa, offset logo após o "\n", texto)
+        self._lines: Deque[Tuple[int, int, str]] = deque(maxlen=max_lines)
+        self._offset = 0
+        self._pending = b""
+        self._skip_partial_line = False
+        self._inode: Optional[int] = None
+        self._generation = 0
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------- leitura
+
+    def reset(self) -> None:
+        """Esquece o que foi lido (arquivo recriado/limpo por quem escreve nele)."""
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        self._lines.clear()
+        self._offset = 0
+        self._pending = b""
+        self._skip_partial_line = False
+        self._inode = None
+        self._generation += 1
+        self._last_poll = 0.0
+
+    def poll(self, force: bool = False) -> None:
+        """Lê o trecho novo do arquivo (no máximo a cada LOG_POLL_INTERVAL_SECONDS)."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_poll < LOG_POLL_INTERVAL_SECONDS:
+                return
+            self._last_poll = now
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self._offset or self._lines:
+                    self._reset()
+                return
+            if self._inode is not None and (st.st_ino != self._inode or st.st_size < self._offset):
+                self._reset()
+            if self._inode is None:
+                self._inode = st.st_ino
+                # Primeira leitura: só o final do arquivo, a partir de uma linha inteira.
+                if st.st_size > LOG_INITIAL_TAIL_BYTES:
+                    self._offset = st.st_size - LOG_INITIAL_TAIL_BYTES
+                    self._skip_partial_line = True
+                else:
+                    self._skip_partial_line = False
+            if st.st_size == self._offset:
+                return
+            self._read_new()
+
+    def _read_new(self) -> None:
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            while True:
+                block = f.read(LOG_READ_CHUNK_BYTES)
+                if not block:
+                    break
+                start = self._offset - len(self._pending)
+                data = self._pending + block
+                self._offset += len(block)
+                if self._skip_partial_line:
+                    cut = data.find(b"\n")
+                    if cut < 0:
+                        self._pending = b""
+                        continue
+                    start += cut + 1
+                    data = data[cut + 1:]
+                    self._skip_partial_line = False
+                *complete, self._pending = data.split(b"\n")
+                for raw in complete:
+                    end = start + len(raw) + 1
+                    line = raw.rstrip(b"\r").decode("utf-8", errors="replace")
+                    self._lines.append((start, end, line))
+                    start = end
+
+    # ---------------------------------------------------------- consulta
+
+    def _end(self) -> int:
+        # Fim da última linha completa (a linha ainda sem "\n" não conta).
+        return self._offset - len(self._pending)
+
+    def _cursor(self, offset: int) -> str:
+        return f"{self._generation}:{offset}"
+
+    def _parse_cursor(self, since: Optional[str]) -> Optional[int]:
+        """Offset do cursor se for desta geração; None se não veio ou ficou velho."""
+        if not since:
+            return None
+        generation, _, offset = since.partition(":")
+        try:
+            if int(generation) != self._generation:
+                return None
+            return int(offset)
+        except ValueError:
+            return None
+
+    def read(self, since: Optional[str] = None, limit: int = 150) -> Dict[str, Any]:
+        """
+        Linhas depois do cursor `since` (até `limit`, as mais recentes).
+        Sem cursor, ou com cursor de outra geração, devolve as últimas `limit`
+        linhas com reset=True. `next` é o cursor para o próximo pedido;
+        `gap` indica que linhas saíram do buffer antes de serem entregues.
+        """
+        self.poll()
+        with self._lock:
+            offset = self._parse_cursor(since)
+            lines = list(self._lines)
+            end = self._end()
+            reset = offset is None or offset > end
+            if reset:
+                selected = lines[-limit:] if limit > 0 else []
+                gap = False
+            else:
+                # Offsets crescentes: busca binária do primeiro depois do cursor.
+                lo, hi = 0, len(lines)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if lines[mid][1] <= offset:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                selected = lines[lo:]
+                gap = bool(lines) and offset < lines[0][0]
+                if limit > 0 and len(selected) > limit:
+                    selected = selected[-limit:]
+                    gap = True
+            return {
+                "lines": [line for _, _, line in selected],
+                "next": self._cursor(end),
+                "reset": reset,
+                "gap": gap,
+            }
+
+    def has_new(self, since: Optional[str]) -> bool:
+        self.poll()
+        with self._lock:
+            offset = self._parse_cursor(since)
+            return offset is None or offset != self._end()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "offset": self._offset,
+                "buffered_lines": len(self._lines),
+                "generation": self._generation,
+            }
+
+
+_tailers: Dict[str, LogTailer] = {}
+_tailers_lock = threading.Lock()
+
+
+def get_log_tailer(path: str) -> LogTailer:
+    """Um leitor por arquivo no processo inteiro."""
+    path = os.path.abspath(path)
+    with _tailers_lock:
+        tailer = _tailers.get(path)
+        if tailer is None:
+            tailer = _tailers[path] = LogTailer(path)
+        return tailer
@@ -0,0 +1,237 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Tabelas de produtos já tipadas, pelo hash do arquivo enviado.
+PRODUCT_CACHE_ENTRIES = int(os.getenv("PRODUCT_CACHE_ENTRIES", "8"))
+# Resultados de filtro (posições) guardados por tabela.
+PRODUCT_FILTER_CACHE_ENTRIES = int(os.getenv("PRODUCT_FILTER_CACHE_ENTRIES", "32"))
+# Ordem padrão da cadeia de filtros (nomes de PRODUCT_FILTERS).
+PRODUCT_FILTER_CHAIN = tuple(
+    name.strip()
+    for name in os.getenv("PRODUCT_FILTER_CHAIN", "fba,not_amazon,price,reviews,rating").split(",")
+    if name.strip()
+)
+# Linhas por fatia no NDJSON/CSV em streaming.
+PRODUCT_STREAM_SLICE_ROWS = int(os.getenv("PRODUCT_STREAM_SLICE_ROWS", "20000"))
+
+# Papel -> nomes de coluna aceitos (o primeiro presente no CSV vence).
+PRODUCT_ROLE_CANDIDATES: Dict[str, Tuple[str, ...]] = {
+    "price": ("buybox_atual", "preco", "price", "Buy Box: Current", "New Price"),
+    "reviews": ("avaliacoes", "reviews", "Reviews: Review Count"),
+    "rating": ("rating", "Reviews: Rating"),
+    "fba": ("isFBA", "is_fba"),
+    "amazon": ("amazon_sold", "amazon_vende"),
+}
+NUMERIC_ROLES = ("price", "reviews", "rating")
+BOOL_ROLES = ("fba", "amazon")
+
+# Mesmo resultado do antigo para_numero (tira "(...)" e tudo que não é número) em
+# um único regex, aplicado só nos valores distintos.
+_NUMBER_JUNK_RE = re.compile(r"\(.*?\)|[^0-9.\-eE]")
+_TRUE_STRINGS = frozenset({"true", "1", "yes", "sim", "y", "s"})
+
+
+def upload_hash(fileobj, chunk_size: int = 1 << 20) -> str:
+    """SHA-1 do conteúdo (lido em blocos; volta ao início no fim)."""
+    digest = hashlib.sha1()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def parse_number(series: pd.Series) -> np.ndarray:
+    """
+    Texto tipo "1,234 (aprox.)" / "$12.99" para float64 (NaN se não der).
+    Coluna já numérica passa direto; texto é limpo uma vez por valor distinto.
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype="float64")
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_numeric(series, errors="coerce").to_numpy(dtype="float64")
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    cleaned = [_NUMBER_JUNK_RE.sub("", str(value)) for value in uniques]
+    numbers = pd.to_numeric(pd.Series(cleaned, dtype=object), errors="coerce").to_numpy(dtype="float64")
+    # Código -1 (faltante) vira NaN.
+    return np.append(numbers, np.nan)[codes]
+
+
+def parse_bool(series: pd.Series) -> np.ndarray:
+    """True/"true"/"1"/"sim" -> True; o resto (inclusive faltante) -> False."""
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=bool)
+    if pd.api.types.is_numeric_dtype(series):
+        return (pd.to_numeric(series, errors="coerce") == 1).to_numpy()
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    hits = np.array(
+        [value is True or (isinstance(value, str) and value.strip().lower() in _TRUE_STRINGS) for value in uniques],
+        dtype=bool,
+    )
+    return np.append(hits, False)[codes]
+
+
+def detect_product_columns(columns: Sequence) -> Dict[str, Optional[str]]:
+    present = {str(col).strip().lower(): col for col in columns}
+    roles: Dict[str, Optional[str]] = {}
+    for role, candidates in PRODUCT_ROLE_CANDIDATES.items():
+        roles[role] = next((present[c.lower()] for c in candidates if c.lower() in present), None)
+    return roles
+
+
+class ProductFilters(NamedTuple):
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    max_reviews: Optional[float] = None
+    min_rating: Optional[float] = None
+
+
+class ProductFilter(NamedTuple):
+    role: str
+    mask: Callable[[np.ndarray, ProductFilters], Optional[np.ndarray]]
+
+
+def _between(values: np.ndarray, low: Optional[float], high: Optional[float]) -> Optional[np.ndarray]:
+    if low is None and high is None:
+        return None
+    mask = ~np.isnan(values)
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+    return mask
+
+
+# Filtros disponíveis para a cadeia. Cada um recebe o array tipado do seu
+# papel e devolve a máscara (None = filtro sem efeito com esses parâmetros).
+PRODUCT_FILTERS: Dict[str, ProductFilter] = {
+    "fba": ProductFilter("fba", lambda values, f: values),
+    "not_amazon": ProductFilter("amazon", lambda values, f: ~values),
+    "price": ProductFilter("price", lambda values, f: _between(values, f.min_price, f.max_price)),
+    # Estrito, como antes (NaN nunca passa).
+    "reviews": ProductFilter(
+        "reviews", lambda values, f: None if f.max_reviews is None else values < f.max_reviews
+    ),
+    "rating": ProductFilter("rating", lambda values, f: _between(values, f.min_rating, None)),
+}
+
+
+def parse_chain(chain: Optional[str]) -> Tuple[str, ...]:
+    """'fba,price' -> ("fba", "price"); vazio usa PRODUCT_FILTER_CHAIN. ValueError se nome desconhecido."""
+    if chain is None or not chain.strip():
+        names = PRODUCT_FILTER_CHAIN
+    else:
+        names = tuple(name.strip() for name in chain.split(",") if name.strip())
+    unknown = [name for name in names if name not in PRODUCT_FILTERS]
+    if unknown:
+        raise ValueError(f"Filtro desconhecido: {', '.join(unknown)} (disponíveis: {', '.join(PRODUCT_FILTERS)})")
+    return tuple(dict.fromkeys(names))
+
+
+class ProductTable:
+    """
+    CSV de produtos lido e tipado uma vez: o DataFrame original fica para a
+    saída e os papéis (preço, avaliações, rating, FBA, vendido pela Amazon)
+    viram arrays float64/bool. Rodar de novo com outros limites só refaz as
+    máscaras; o resultado de cada combinação fica em LRU.
+    """
+
+    def __init__(self, df: pd.DataFrame, upload_id: str):
+        self.df = df
+        self.upload_id = upload_id
+        self.columns = detect_product_columns(df.columns)
+        self.arrays: Dict[str, np.ndarray] = {}
+        for role, col in self.columns.items():
+            if col is None:
+                continue
+            parse = parse_number if role in NUMERIC_ROLES else parse_bool
+            self.arrays[role] = parse(df[col])
+        self._results: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def filter_positions(self, chain: Sequence[str], filters: ProductFilters) -> np.ndarray:
+        """Posições das linhas que passam na cadeia (somente leitura, em cache)."""
+        key = (tuple(chain), tuple(filters))
+        with self._lock:
+            positions = self._results.get(key)
+            if positions is not None:
+                self._results.move_to_end(key)
+                return positions
+
+        mask = np.ones(len(self), dtype=bool)
+        for name in chain:
+            step = PRODUCT_FILTERS[name]
+            values = self.arrays.get(step.role)
+            if values is None:
+                continue  # coluna ausente: filtro ignorado, como antes
+            hits = step.mask(values, filters)
+            if hits is not None:
+                mask &= hits
+        positions = np.flatnonzero(mask)
+        positions.flags.writeable = False
+
+        with self._lock:
+            self._results[key] = positions
+            while len(self._results) > PRODUCT_FILTER_CACHE_ENTRIES:
+                self._results.popitem(last=False)
+        return positions
+
+    def rows(self, positions: np.ndarray) -> pd.DataFrame:
+        return self.df.iloc[positions]
+
+    def records(self, positions: np.ndarray) -> List[dict]:
+        """Linhas como dicts prontos para JSON (NaN -> None)."""
+        frame = self.rows(positions)
+        return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+    def iter_ndjson(self, positions: np.ndarray) -> Iterator[bytes]:
+        for start in range(0, len(positions), PRODUCT_STREAM_SLICE_ROWS):
+            part = self.rows(positions[start:start + PRODUCT_STREAM_SLICE_ROWS])
+            yield part.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+
+    def iter_csv(self, positions: np.ndarray) -> Iterator[bytes]:
+        if len(positions) == 0:
+            yield self.df.iloc[0:0].to_csv(index=False).encode("utf-8")
+            return
+        for start in range(0, len(positions), PRODUCT_STREAM_SLICE_ROWS):
+            part = self.rows(positions[start:start + PRODUCT_STREAM_SLICE_ROWS])
+            yield part.to_csv(index=False, header=start == 0).encode("utf-8")
+
+
+class ProductTableCache:
+    """Tabelas por hash do upload (LRU de PRODUCT_CACHE_ENTRIES)."""
+
+    def __init__(self, max_entries: int = PRODUCT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._tables: "OrderedDict[str, ProductTable]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, upload_id: str) -> Optional[ProductTable]:
+        with self._lock:
+            table = self._tables.get(upload_id)
+            if table is not None:
+                self._tables.move_to_end(upload_id)
+            return table
+
+    def load(self, fileobj) -> Tuple[ProductTable, bool]:
+        """Tabela do arquivo (reaproveitada se o mesmo conteúdo já foi enviado); (tabela, veio do cache)."""
+        upload_id = upload_hash(fileobj)
+        table = self.get(upload_id)
+        if table is not None:
+            return table, True
+        table = ProductTable(pd.read_csv(fileobj), upload_id)
+        with self._lock:
+            self._tables[upload_id] = table
+            while len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+        return table, False
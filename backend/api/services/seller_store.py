@@ -0,0 +1,653 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypedDict
+
+import numpy as np
+import pandas as pd
+
+from .category_classifier import get_category_classifier
+from .gtin_join import gtin_keys
+
+# Colunas de texto com menos valores distintos que isso (proporção das linhas)
+# viram category na carga.
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+FLOAT32_MAX_EXACT_INT = 2 ** 24
+# Resultados de filtro (posições das linhas) guardados por dataset, em LRU.
+SELLER_FILTER_CACHE_ENTRIES = int(os.getenv("SELLER_FILTER_CACHE_ENTRIES", "32"))
+
+# Papéis que aceitam ordenação, e até quantas linhas o top-K (argpartition)
+# é usado em vez da ordenação completa.
+SORT_ROLES = ("price", "bsr", "fba_count")
+SELLER_TOPK_MAX_ROWS = int(os.getenv("SELLER_TOPK_MAX_ROWS", "5000"))
+
+# Linhas por chunk na leitura dos CSVs enviados.
+SELLER_CSV_CHUNK_ROWS = int(os.getenv("SELLER_CSV_CHUNK_ROWS", "100000"))
+# 1 = guarda todas as colunas do upload; senão só as usadas pelos endpoints.
+SELLER_UPLOAD_ALL_COLUMNS = os.getenv("SELLER_UPLOAD_ALL_COLUMNS", "0") == "1"
+FBA_COLUMN = "Uses FBA"
+
+# Mapas de papéis já detectados, por hash do cabeçalho.
+COLUMN_ROLES_CACHE_ENTRIES = 64
+
+
+class ColumnRoles(TypedDict):
+    """Papel -> nome da coluna no CSV (None quando o arquivo não tem)."""
+    image: Optional[str]
+    title: Optional[str]
+    upc: Optional[str]
+    asin: Optional[str]
+    price: Optional[str]
+    bsr: Optional[str]
+    fba_count: Optional[str]
+    seller: Optional[str]
+    buybox: Optional[str]
+    category: Optional[str]
+
+
+ROLE_NAMES = tuple(ColumnRoles.__annotations__)
+
+_roles_cache: "OrderedDict[str, ColumnRoles]" = OrderedDict()
+_roles_lock = threading.Lock()
+
+
+def schema_hash(header: Iterable) -> str:
+    """Hash estável do cabeçalho (nomes e ordem das colunas)."""
+    return hashlib.sha1("\x1f".join(str(col) for col in header).encode("utf-8")).hexdigest()
+
+
+def detect_columns(columns) -> ColumnRoles:
+    """
+    Mapa de papéis do cabeçalho, detectado uma vez por esquema: cabeçalhos
+    iguais (mesmo hash) reaproveitam o resultado. Devolve uma cópia.
+    """
+    header = list(columns)
+    key = schema_hash(header)
+    with _roles_lock:
+        roles = _roles_cache.get(key)
+        if roles is not None:
+            _roles_cache.move_to_end(key)
+            return ColumnRoles(**roles)
+
+    roles = _detect_roles(header)
+    with _roles_lock:
+        _roles_cache[key] = roles
+        while len(_roles_cache) > COLUMN_ROLES_CACHE_ENTRIES:
+            _roles_cache.popitem(last=False)
+    return ColumnRoles(**roles)
+
+
+def _detect_roles(columns: List) -> ColumnRoles:
+    """Acha as colunas usadas pelos endpoints (mesmas heurísticas de antes)."""
+    found = ColumnRoles(**{role: None for role in ROLE_NAMES})
+    for col in columns:
+        col_lower = str(col).lower()
+        if 'image' in col_lower and not found["image"]:
+            found["image"] = col
+        elif any(x in col_lower for x in ['title', 'product name']) and 'parent' not in col_lower and not found["title"]:
+            found["title"] = col
+        elif 'upc' in col_lower and not found["upc"]:
+            found["upc"] = col
+        elif 'asin' in col_lower and 'parent' not in col_lower and not found["asin"]:
+            found["asin"] = col
+
+    for col in columns:
+        col_lower = str(col).lower()
+        # Preço "atual": exclui colunas de mudança de preço, buy box, etc.
+        if not found["price"] and 'price' in col_lower and not any(
+            x in col_lower for x in ['change', 'last', 'buy', 'variation', 'drop']
+        ):
+            found["price"] = col
+        if not found["bsr"] and any(
+            x in col_lower for x in ['bsr', 'sales rank', 'salesrank', 'best seller', 'bestseller', 'rank']
+        ) and not any(x in col_lower for x in ['change', 'drop', 'growth', 'last']):
+            found["bsr"] = col
+        if not found["fba_count"] and 'fba' in col_lower and any(
+            x in col_lower for x in ['seller', 'count', 'number', '#']
+        ) and not any(x in col_lower for x in ['%', 'percent', 'ratio', 'share']):
+            found["fba_count"] = col
+        if not found["seller"] and 'seller' in col_lower:
+            found["seller"] = col
+        if not found["buybox"] and any(
+            x in col_lower for x in ['buy box', 'buybox', 'featured merchant', 'primary seller']
+        ):
+            found["buybox"] = col
+
+    # Categoria: de preferência a raiz (Keepa: "Categories: Root"), senão a primeira de categoria.
+    category_cols = [col for col in columns if 'categor' in str(col).lower()]
+    found["category"] = next(
+        (col for col in category_cols if 'root' in str(col).lower()),
+        category_cols[0] if category_cols else None,
+    )
+    return found
+
+
+def _to_float32(series: pd.Series) -> pd.Series:
+    values = pd.to_numeric(series, errors='coerce').astype('float64')
+    values[~np.isfinite(values)] = np.nan
+    return values.astype('float32')
+
+
+def _to_count(series: pd.Series) -> pd.Series:
+    """Contagens/ranks: float32 enquanto os inteiros couberem exatos, senão float64."""
+    values = pd.to_numeric(series, errors='coerce').astype('float64')
+    values[~np.isfinite(values)] = np.nan
+    if values.abs().max(skipna=True) < FLOAT32_MAX_EXACT_INT or values.isna().all():
+        return values.astype('float32')
+    return values
+
+
+def _to_text_id(series: pd.Series) -> pd.Series:
+    """UPC/ASIN sempre como texto (read_csv lê UPC como float e perde zeros/".0")."""
+    if pd.api.types.is_numeric_dtype(series):
+        values = pd.to_numeric(series, errors='coerce')
+        text = values.map(lambda v: None if pd.isna(v) else str(int(v)))
+        return text.astype(object)
+    return series.map(lambda v: None if pd.isna(v) else (str(v).strip() or None)).astype(object)
+
+
+def _downcast(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_float_dtype(series):
+        values = series.astype('float64')
+        values[~np.isfinite(values)] = np.nan
+        return values.astype('float32')
+    if pd.api.types.is_integer_dtype(series):
+        lo, hi = series.min(), series.max()
+        if np.iinfo(np.int32).min <= lo and hi <= np.iinfo(np.int32).max:
+            return series.astype('int32')
+        return series
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        non_null = series.count()
+        if non_null and series.nunique(dropna=True) <= CATEGORY_MAX_UNIQUE_RATIO * non_null:
+            return series.astype('category')
+    return series
+
+
+def _type_roles(chunk: pd.DataFrame, columns: ColumnRoles) -> pd.DataFrame:
+    """Converte as colunas de papel (preço, BSR, FBA, UPC/ASIN) de um chunk; o resto fica como veio."""
+    typed = {}
+    for col in chunk.columns:
+        series = chunk[col]
+        if col == columns["price"]:
+            typed[col] = _to_float32(series)
+        elif col in (columns["bsr"], columns["fba_count"]):
+            typed[col] = _to_count(series)
+        elif col in (columns["upc"], columns["asin"]):
+            typed[col] = _to_text_id(series)
+        else:
+            typed[col] = series
+    return pd.DataFrame(typed, index=chunk.index)
+
+
+def read_csv_header(fileobj) -> List[str]:
+    """Cabeçalho do CSV sem ler o corpo (volta o arquivo para o início)."""
+    fileobj.seek(0)
+    header = list(pd.read_csv(fileobj, nrows=0).columns)
+    fileobj.seek(0)
+    return header
+
+
+def ingest_columns(header: Iterable[str], columns: ColumnRoles) -> List[str]:
+    """Colunas guardadas no upload: papéis detectados, Uses FBA e categorias."""
+    wanted = {col for col in columns.values() if col}
+    wanted.add(FBA_COLUMN)
+    return [col for col in header if col in wanted or 'categor' in str(col).lower()]
+
+
+def iter_csv_chunks(
+    fileobj,
+    usecols: Optional[List[str]] = None,
+    only_fba: bool = True,
+    progress: Optional[Callable[[int, int, int], None]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê o CSV em chunks de SELLER_CSV_CHUNK_ROWS linhas, já descartando quem
+    não usa FBA (mesma regra de antes: Uses FBA == True). Com only_fba, um
+    arquivo sem a coluna não contribui linhas, como no concat antigo em que
+    ela ficava NaN.
+
+    progress(linhas_lidas, linhas_mantidas, bytes_lidos) é chamado a cada chunk.
+    """
+    fileobj.seek(0)
+    reader = pd.read_csv(fileobj, chunksize=SELLER_CSV_CHUNK_ROWS, usecols=usecols, low_memory=False)
+    with reader:
+        for chunk in reader:
+            read = len(chunk)
+            if only_fba:
+                chunk = chunk[chunk[FBA_COLUMN] == True] if FBA_COLUMN in chunk.columns else chunk.iloc[0:0]
+            if progress:
+                try:
+                    position = fileobj.tell()
+                except (OSError, ValueError):
+                    position = 0
+                progress(read, len(chunk), position)
+            yield chunk
+
+
+class SellerDataset:
+    """
+    DataFrame de sellers já tipado na carga (não muda depois).
+
+    Preço vira float32; BSR e contagem de FBA viram float32 (ou float64 se o
+    inteiro não couber exato); seller/buy box viram category; UPC/ASIN ficam
+    texto. Faltantes continuam NaN/None no próprio dtype: a conversão para
+    JSON acontece só nas linhas devolvidas.
+
+    Os filtros produzem uma máscara booleana sobre os arrays originais; os
+    endpoints só materializam as linhas da página/exportação.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        columns: ColumnRoles,
+        order: Optional[np.ndarray] = None,
+        schema: Optional[str] = None,
+    ):
+        self.df = df
+        self.columns = columns
+        # Hash do cabeçalho de origem (mesmo esquema = mesmo mapa de papéis).
+        self.schema = schema or schema_hash(df.columns)
+        # Ordem de exibição (permutação das linhas); None = ordem do arquivo.
+        self.order = order
+        self._amazon_mask: Optional[np.ndarray] = None
+        self._upc_mask: Optional[np.ndarray] = None
+        self._category: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._gtin: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._filter_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._frame_bytes: Optional[int] = None
+
+    @classmethod
+    def from_chunks(
+        cls,
+        chunks: Iterable[pd.DataFrame],
+        columns: ColumnRoles,
+        shuffle: bool = False,
+        schema: Optional[str] = None,
+    ) -> "SellerDataset":
+        """
+        Monta o dataset a partir de chunks já filtrados: cada chunk tem as
+        colunas de papel tipadas ao chegar (chunks pequenos, float32 logo de
+        cara) e a categorização acontece uma vez no final.
+
+        shuffle=True sorteia só uma permutação de posições (self.order), sem
+        copiar o DataFrame como df.sample(frac=1) fazia.
+        """
+        typed_chunks = [_type_roles(chunk, columns) for chunk in chunks]
+        typed_chunks = [chunk for chunk in typed_chunks if len(chunk)] or typed_chunks[:1]
+        if not typed_chunks:
+            return cls(pd.DataFrame(), columns, schema=schema)
+        if len(typed_chunks) > 1:
+            df = pd.concat(typed_chunks, ignore_index=True)
+        else:
+            # Chunk filtrado tem índice com buracos; o frame final usa RangeIndex.
+            df = typed_chunks[0].reset_index(drop=True)
+        del typed_chunks
+
+        final = {}
+        for col in df.columns:
+            series = df[col]
+            # Colunas de papel já vêm tipadas dos chunks; o concat só pode ter
+            # juntado float32 com float64 (contagens) ou texto com NaN.
+            if col == columns["price"]:
+                final[col] = series if series.dtype == np.float32 else _to_float32(series)
+            elif col in (columns["bsr"], columns["fba_count"]):
+                final[col] = _to_count(series)
+            elif col in (columns["upc"], columns["asin"]):
+                final[col] = series if series.dtype == object else _to_text_id(series)
+            elif col in (columns["seller"], columns["buybox"]) and not pd.api.types.is_numeric_dtype(series):
+                final[col] = series.astype('category')
+            else:
+                final[col] = _downcast(series)
+        frame = pd.DataFrame(final, index=pd.RangeIndex(len(df)))
+        del df
+
+        order = np.random.permutation(len(frame)) if shuffle else None
+        return cls(frame, columns, order=order, schema=schema)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, shuffle: bool = False) -> "SellerDataset":
+        return cls.from_chunks([df], detect_columns(df.columns), shuffle=shuffle, schema=schema_hash(df.columns))
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def memory_bytes(self) -> int:
+        """Memória aproximada: DataFrame (deep, medido uma vez) + permutação, índices e caches."""
+        if self._frame_bytes is None:
+            self._frame_bytes = int(self.df.memory_usage(deep=True).sum())
+        total = self._frame_bytes
+        if self.order is not None:
+            total += self.order.nbytes
+        for mask in (self._amazon_mask, self._upc_mask):
+            if mask is not None:
+                total += mask.nbytes
+        for index in (self._category, self._gtin):
+            if index is not None:
+                total += sum(part.nbytes for part in index)
+        total += sum(order.nbytes + values.nbytes for order, values in self._sorted.values())
+        with self._lock:
+            total += sum(positions.nbytes for positions in self._filter_cache.values())
+        return total
+
+    def values(self, role: str) -> Optional[np.ndarray]:
+        col = self.columns.get(role)
+        if not col:
+            return None
+        return self.df[col].to_numpy()
+
+    def _category_contains(self, role: str, needle: str) -> Optional[np.ndarray]:
+        """str.contains avaliado nas categorias (valores únicos) e projetado pelos códigos."""
+        col = self.columns.get(role)
+        if not col:
+            return None
+        series = self.df[col]
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            return series.astype(str).str.contains(needle, case=False, na=False, regex=False).to_numpy()
+        categories = series.cat.categories.astype(str)
+        hits = np.asarray(categories.str.contains(needle, case=False, na=False, regex=False), dtype=bool)
+        codes = series.cat.codes.to_numpy()
+        # Código -1 (faltante) nunca casa.
+        return np.append(hits, False)[codes]
+
+    def amazon_mask(self) -> np.ndarray:
+        """True para linhas cujo seller ou buy box contém 'amazon' (calculado uma vez)."""
+        if self._amazon_mask is None:
+            mask = np.zeros(len(self), dtype=bool)
+            for role in ("seller", "buybox"):
+                hits = self._category_contains(role, "amazon")
+                if hits is not None:
+                    mask |= hits
+            self._amazon_mask = mask
+        return self._amazon_mask
+
+    def upc_mask(self) -> Optional[np.ndarray]:
+        if self._upc_mask is None and self.columns.get("upc"):
+            upc = self.df[self.columns["upc"]]
+            self._upc_mask = (upc.notna() & (upc.astype(str).str.strip() != "")).to_numpy()
+        return self._upc_mask
+
+    def gtin_index(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(posição, GTIN inteiro) dos UPCs válidos, para junção com as capturas. Feito uma vez."""
+        if self._gtin is None:
+            upc = self.values("upc")
+            if upc is None:
+                return None
+            self._gtin = gtin_keys(upc)
+        return self._gtin
+
+    def _sorted_index(self, role: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(posições ordenadas pelo valor, valores ordenados), sem NaN. Feito uma vez por coluna."""
+        if role not in self._sorted:
+            values = self.values(role)
+            if values is None:
+                return None
+            valid = np.flatnonzero(~np.isnan(values))
+            order = valid[np.argsort(values[valid], kind="stable")]
+            self._sorted[role] = (order, values[order])
+        return self._sorted[role]
+
+    def _range_mask(self, role: str, low, high) -> Optional[np.ndarray]:
+        """Filtro de faixa via searchsorted no índice ordenado (NaN nunca entra, como antes)."""
+        index = self._sorted_index(role)
+        if index is None:
+            return None
+        order, sorted_values = index
+        # Limites no mesmo dtype da coluna: 19.99 em float32 não pode cair fora de ">= 19.99".
+        start = 0 if low is None else np.searchsorted(sorted_values, sorted_values.dtype.type(low), side="left")
+        stop = len(order) if high is None else np.searchsorted(sorted_values, sorted_values.dtype.type(high), side="right")
+        mask = np.zeros(len(self), dtype=bool)
+        mask[order[start:stop]] = True
+        return mask
+
+    def _category_index(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        (código do valor por linha, matriz valores únicos x categorias
+        canônicas). A classificação roda só sobre os valores distintos.
+        """
+        if self._category is None:
+            col = self.columns.get("category")
+            if not col:
+                return None
+            series = self.df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                codes, uniques = pd.factorize(series)
+            matrix = get_category_classifier().classify(uniques)
+            self._category = (codes.astype(np.int32, copy=False), matrix)
+        return self._category
+
+    def category_mask(self, categoria: str) -> Optional[np.ndarray]:
+        index = self._category_index()
+        if index is None:
+            return None
+        categories = get_category_classifier().categories
+        if categoria not in categories:
+            return np.zeros(len(self), dtype=bool)
+        codes, matrix = index
+        # Código -1 (faltante) nunca casa.
+        return np.append(matrix[:, categories.index(categoria)], False)[codes]
+
+    def category_facets(self, positions: np.ndarray) -> Optional[Dict[str, object]]:
+        """Contagem por categoria canônica das linhas em `positions` (bincount x matriz)."""
+        index = self._category_index()
+        if index is None:
+            return None
+        codes, matrix = index
+        selected = codes[positions]
+        per_value = np.bincount(selected[selected >= 0], minlength=matrix.shape[0])
+        counts = per_value @ matrix
+        classified = int(per_value[matrix.any(axis=1)].sum())
+        return {
+            "counts": dict(zip(get_category_classifier().categories, (int(c) for c in counts))),
+            "unclassified": int(len(selected) - classified),
+        }
+
+    def normalize_filters(
+        self,
+        seller: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_bsr: Optional[int] = None,
+        max_bsr: Optional[int] = None,
+        max_fba_sellers: Optional[int] = None,
+        exclude_amazon: bool = False,
+        only_with_upc: bool = False,
+        categoria: Optional[str] = None,
+    ) -> tuple:
+        """
+        Chave canônica dos filtros: filtros sem coluna correspondente viram
+        None (são ignorados de qualquer forma) e o seller, que já é buscado
+        sem caixa, vai em minúsculas: "Foo" e "foo" caem na mesma entrada.
+        """
+        has = {role: bool(self.columns.get(role)) for role in ("seller", "price", "bsr", "fba_count", "upc", "category")}
+        seller_key = seller.lower() if has["seller"] and seller and seller.strip() else None
+        return (
+            seller_key,
+            float(min_price) if has["price"] and min_price is not None else None,
+            float(max_price) if has["price"] and max_price is not None else None,
+            float(min_bsr) if has["bsr"] and min_bsr is not None else None,
+            float(max_bsr) if has["bsr"] and max_bsr is not None else None,
+            float(max_fba_sellers) if has["fba_count"] and max_fba_sellers is not None else None,
+            bool(exclude_amazon),
+            bool(only_with_upc and has["upc"]),
+            categoria if has["category"] and categoria else None,
+        )
+
+    def filter_mask(
+        self,
+        seller: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_bsr: Optional[int] = None,
+        max_bsr: Optional[int] = None,
+        max_fba_sellers: Optional[int] = None,
+        exclude_amazon: bool = False,
+        only_with_upc: bool = False,
+        categoria: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Máscara com os mesmos filtros de antes. Filtro cuja coluna não existe
+        é ignorado (como no código original).
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        if seller and seller.strip():
+            hits = self._category_contains("seller", seller)
+            if hits is not None:
+                mask &= hits
+
+        # Faixas de preço/BSR/FBA pelos índices ordenados.
+        for role, low, high in (
+            ("price", min_price, max_price),
+            ("bsr", min_bsr, max_bsr),
+            ("fba_count", None, max_fba_sellers),
+        ):
+            if low is None and high is None:
+                continue
+            hits = self._range_mask(role, low, high)
+            if hits is not None:
+                mask &= hits
+
+        if exclude_amazon:
+            mask &= ~self.amazon_mask()
+
+        if only_with_upc:
+            upc = self.upc_mask()
+            if upc is not None:
+                mask &= upc
+
+        if categoria:
+            hits = self.category_mask(categoria)
+            if hits is not None:
+                mask &= hits
+
+        return mask
+
+    def _cache_get(self, key: tuple) -> Optional[np.ndarray]:
+        with self._lock:
+            positions = self._filter_cache.get(key)
+            if positions is not None:
+                self._filter_cache.move_to_end(key)
+            return positions
+
+    def _cache_put(self, key: tuple, positions: np.ndarray) -> None:
+        positions.flags.writeable = False
+        if SELLER_FILTER_CACHE_ENTRIES <= 0:
+            return
+        with self._lock:
+            self._filter_cache[key] = positions
+            self._filter_cache.move_to_end(key)
+            while len(self._filter_cache) > SELLER_FILTER_CACHE_ENTRIES:
+                self._filter_cache.popitem(last=False)
+
+    def _index_dtype(self):
+        return np.int32 if len(self) <= np.iinfo(np.int32).max else np.int64
+
+    def filter_positions(self, **filters) -> np.ndarray:
+        """
+        Posições (em ordem) das linhas que passam nos filtros, guardadas em
+        LRU pela chave normalizada: paginar o mesmo filtro só fatia o array.
+        O array devolvido é somente leitura.
+        """
+        key = self.normalize_filters(**filters)
+        positions = self._cache_get(key)
+        if positions is not None:
+            return positions
+
+        seller_key, min_price, max_price, min_bsr, max_bsr, max_fba, exclude_amazon, only_with_upc, categoria = key
+        mask = self.filter_mask(
+            seller=seller_key,
+            min_price=min_price,
+            max_price=max_price,
+            min_bsr=min_bsr,
+            max_bsr=max_bsr,
+            max_fba_sellers=max_fba,
+            exclude_amazon=exclude_amazon,
+            only_with_upc=only_with_upc,
+            categoria=categoria,
+        )
+        if self.order is None:
+            positions = np.flatnonzero(mask).astype(self._index_dtype(), copy=False)
+        else:
+            # Mantém a ordem embaralhada do upload.
+            positions = self.order[mask[self.order]].astype(self._index_dtype(), copy=False)
+        self._cache_put(key, positions)
+        return positions
+
+    def _top_k(self, base: np.ndarray, values: np.ndarray, k: int, descending: bool) -> Optional[np.ndarray]:
+        """
+        Primeiras k posições da ordenação via argpartition, sem ordenar tudo.
+        Empates no k-ésimo valor entram todos e são desempatados pela
+        posição, como na ordenação completa (estável). None quando k alcança
+        as linhas sem valor (aí a ordenação completa resolve o rabo de NaN).
+        """
+        candidates = base[~np.isnan(values[base])]
+        if k <= 0 or k >= len(candidates):
+            return None
+        keys = values[candidates]
+        if descending:
+            keys = -keys
+        kth = keys[np.argpartition(keys, k - 1)[k - 1]]
+        chosen = keys <= kth
+        top, top_keys = candidates[chosen], keys[chosen]
+        # Crescente: empate por posição crescente; decrescente: a ordenação
+        # completa é o índice crescente invertido, então posição decrescente.
+        ties = -top.astype(np.int64) if descending else top
+        return top[np.lexsort((ties, top_keys))][:k].astype(self._index_dtype(), copy=False)
+
+    def sorted_positions(
+        self,
+        sort_by: str,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        **filters,
+    ) -> np.ndarray:
+        """
+        Posições filtradas ordenadas por preço, BSR ou contagem de FBA; linhas
+        sem valor vão para o fim, na ordem de exibição.
+
+        Com `limit` pequeno (até SELLER_TOPK_MAX_ROWS) e a ordenação ainda
+        fora do cache, usa top-K por argpartition (o prefixo de
+        SELLER_TOPK_MAX_ROWS fica no cache). Caso contrário intersecta
+        o argsort da coluna (montado uma vez) com o resultado dos filtros e
+        guarda a ordenação completa no mesmo LRU dos filtros.
+        """
+        if sort_by not in SORT_ROLES or not self.columns.get(sort_by):
+            raise ValueError(f"Ordenação indisponível: {sort_by}")
+
+        filter_key = self.normalize_filters(**filters)
+        key = ("sort", sort_by, bool(descending)) + filter_key
+        positions = self._cache_get(key)
+        if positions is not None:
+            return positions if limit is None else positions[:limit]
+
+        base = self.filter_positions(**filters)
+        values = self.values(sort_by)
+        if limit is not None and limit <= SELLER_TOPK_MAX_ROWS:
+            # Um prefixo de SELLER_TOPK_MAX_ROWS atende todas as primeiras páginas.
+            top_key = ("top", sort_by, bool(descending)) + filter_key
+            top = self._cache_get(top_key)
+            if top is None:
+                top = self._top_k(base, values, SELLER_TOPK_MAX_ROWS, descending)
+                if top is not None:
+                    self._cache_put(top_key, top)
+            if top is not None:
+                return top[:limit]
+
+        order, _sorted_values = self._sorted_index(sort_by)
+        if descending:
+            order = order[::-1]
+        selected = np.zeros(len(self), dtype=bool)
+        selected[base] = True
+        head = order[selected[order]]
+        tail = base[np.isnan(values[base])]
+        positions = np.concatenate([head, tail]).astype(self._index_dtype(), copy=False)
+        self._cache_put(key, positions)
+        return positions if limit is None else positions[:limit]
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo entre verificações do diretório de exports (stat por pasta).
+EXPORT_INDEX_REFRESH_SECONDS = float(os.getenv("EXPORT_INDEX_REFRESH_SECONDS", "2"))
+EXPORT_EXTENSION = ".xlsx"
+
+# Chaves de lista/dict do estado que viram só contagem no resumo.
+STATE_COUNT_KEYS = {
+    "accumulated_items": "accumulated_count",
+    "processed_links": "processed_links_count",
+    "global_captured_urls": "global_captured_count",
+    "processed_suppliers_indices": "processed_suppliers_count",
+    "deferred_suppliers_indices": "deferred_suppliers_count",
+    "quarantined_links": "quarantined_links_count",
+    "quarantined_domains": "quarantined_domains_count",
+    "pending_exports": "pending_exports_count",
+}
+# Campos pequenos copiados como estão.
+STATE_SCALAR_KEYS = ("start_index", "current_supplier_row", "current_page_url", "total_captured_for_supplier")
+
+
+def summarize_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Resumo de tamanho fixo do automation_state.json (contagens, fornecedor e página atuais)."""
+    summary: Dict[str, Any] = {key: state.get(key) for key in STATE_SCALAR_KEYS}
+    summary["total_captured_for_supplier"] = summary["total_captured_for_supplier"] or 0
+    for key, count_key in STATE_COUNT_KEYS.items():
+        value = state.get(key)
+        summary[count_key] = len(value) if isinstance(value, (list, dict)) else 0
+    summary["pending_exports"] = [
+        {"out_path": entry.get("out_path"), "reason": entry.get("reason"), "attempts": entry.get("attempts", 0)}
+        for entry in state.get("pending_exports") or []
+        if isinstance(entry, dict)
+    ]
+    return summary
+
+
+class StateSummaryCache:
+    """
+    Resumo do arquivo de estado, refeito só quando (mtime, tamanho) mudam
+    ou quando alguém chama invalidate(). Entre uma gravação e outra da
+    automação, cada /status custa um os.stat. O mesmo objeto volta enquanto
+    nada mudar (inclusive o {} de arquivo ausente): quem compara por
+    identidade só vê mudança real.
+    """
+
+    _MISSING = (-1, -1)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._key: Optional[Tuple[int, int]] = None
+        self._summary: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._key = None
+
+    def get(self) -> Dict[str, Any]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            with self._lock:
+                if self._key != self._MISSING:
+                    self._key = self._MISSING
+                    self._summary = {}
+                return self._summary
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if key == self._key:
+                return self._summary
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except Exception:
+            # Arquivo no meio de uma gravação: mantém o último resumo bom.
+            return self._summary
+        summary = summarize_state(state if isinstance(state, dict) else {})
+        summary["updated_at"] = st.st_mtime
+        with self._lock:
+            self._key = key
+            self._summary = summary
+        return summary
+
+
+class ExportIndex:
+    """
+    Lista de arquivos exportados (caminhos relativos, ordem decrescente como
+    antes), mantida por pasta: cada pasta guarda o mtime e o conteúdo da
+    última leitura. Criar/apagar arquivo muda o mtime da pasta, então uma
+    verificação é um os.stat por pasta; só a pasta alterada é relida.
+    """
+
+    def __init__(self, root: str, extension: str = EXPORT_EXTENSION):
+        self.root = root
+        self.extension = extension
+        # pasta -> (mtime_ns, arquivos da extensão, subpastas)
+        self._dirs: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        self._items: List[str] = []
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """Força a próxima consulta a verificar as pastas (ex.: exportação concluída)."""
+        with self._lock:
+            self._last_check = 0.0
+
+    def _scan(self, path: str, seen: Dict[str, Tuple[int, List[str], List[str]]]) -> bool:
+        """Atualiza `seen` com a pasta e as subpastas; True se algo mudou."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return path in self._dirs
+        cached = self._dirs.get(path)
+        changed = False
+        if cached is None or cached[0] != mtime:
+            files, subdirs = [], []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name.endswith(self.extension):
+                            rel = os.path.relpath(entry.path, self.root)
+                            files.append(rel.replace("\\", "/"))
+            except OSError as e:
+                logger.error(f"Erro processando exports: {e}")
+                return False
+            cached = (mtime, files, subdirs)
+            changed = True
+        seen[path] = cached
+        for subdir in cached[2]:
+            changed |= self._scan(subdir, seen)
+        return changed
+
+    def refresh(self, force: bool = False) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_check < EXPORT_INDEX_REFRESH_SECONDS:
+                return
+            self._last_check = now
+            if not os.path.isdir(self.root):
+                self._dirs, self._items = {}, []
+                return
+            seen: Dict[str, Tuple[int, List[str], List[str]]] = {}
+            changed = self._scan(self.root, seen)
+            if changed or set(seen) != set(self._dirs):
+                self._items = sorted((f for _, files, _ in seen.values() for f in files), reverse=True)
+            self._dirs = seen
+
+    def page(self, page: int = 1, per_page: int = 50) -> Dict[str, Any]:
+        self.refresh()
+        with self._lock:
+            items = self._items
+        page = max(page, 1)
+        per_page = max(per_page, 1)
+        start = (page - 1) * per_page
+        return {
+            "total": len(items),
+            "page": page,
+            "per_page": per_page,
+            "total_pages": (len(items) + per_page - 1) // per_page,
+            "items": items[start:start + per_page],
+        }
@@ -0,0 +1,409 @@
+import atexit
+import gzip
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import shutil
+import signal
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Versão do envelope gravado em cada linha (sobe se um campo comum mudar de sentido).
+DIAGNOSTICS_SCHEMA_VERSION = 1
+# Intervalo máximo entre gravações em disco (eventos ficam no buffer até lá).
+DIAGNOSTICS_FLUSH_SECONDS = float(os.getenv("DIAGNOSTICS_FLUSH_SECONDS", "1.0"))
+# Eventos por write(): o lote sai antes do intervalo se encher.
+DIAGNOSTICS_BATCH_EVENTS = int(os.getenv("DIAGNOSTICS_BATCH_EVENTS", "512"))
+# Eventos aguardando a thread; acima disso são descartados (e contados).
+DIAGNOSTICS_QUEUE_MAX = int(os.getenv("DIAGNOSTICS_QUEUE_MAX", "20000"))
+# Rotação por tamanho e por idade do arquivo ativo (0 desativa cada uma).
+DIAGNOSTICS_MAX_MB = float(os.getenv("DIAGNOSTICS_MAX_MB", "64"))
+DIAGNOSTICS_ROTATE_HOURS = float(os.getenv("DIAGNOSTICS_ROTATE_HOURS", "24"))
+# Arquivos rotacionados (.jsonl.gz) mantidos; os mais antigos são apagados.
+DIAGNOSTICS_KEEP_FILES = int(os.getenv("DIAGNOSTICS_KEEP_FILES", "20"))
+# Amostragem por evento: "link_skipped_quarantine=0.1,product_skipped_zero_price=0.2".
+# "*" vale para os eventos não listados. Sem regra, o evento é sempre gravado.
+DIAGNOSTICS_SAMPLE = os.getenv("DIAGNOSTICS_SAMPLE", "")
+
+# Campos comuns de toda linha. Os demais são os kwargs de emit().
+#   v            versão do envelope (DIAGNOSTICS_SCHEMA_VERSION)
+#   ts           epoch em segundos (float, precisão de ms)
+#   timestamp    "%Y-%m-%d %H:%M:%S" local, como antes
+#   event        nome do evento
+#   seq          contador do processo (lacunas = descarte por fila cheia)
+#   pid          processo que gravou (seq reinicia a cada processo)
+#   sample_rate  só quando < 1: cada linha representa 1/sample_rate eventos
+ENVELOPE_FIELDS = ("v", "ts", "timestamp", "event", "seq", "pid", "sample_rate")
+
+# Eventos com métricas numéricas conhecidas (campo -> unidade), para quem
+# analisa o log não precisar adivinhar. Eventos fora daqui continuam válidos.
+DIAGNOSTIC_EVENTS: Dict[str, Dict[str, str]] = {
+    "page_navigation": {"elapsed_ms": "ms", "settle_ms": "ms", "http_status": "status"},
+    "captcha_resolved": {"waited_seconds": "s"},
+    "captcha_timeout": {"waited_seconds": "s"},
+    "page_links_ready": {"total_links": "count", "valid_links": "count", "priced_items": "count"},
+    "memory_pressure_backoff": {
+        "available_mb": "MB",
+        "total_mb": "MB",
+        "new_batch_size": "count",
+        "cooldown_seconds": "s",
+    },
+    "batch_start": {"batch_requested": "count", "batch_effective": "count", "tab_open_parallel": "count"},
+    "batch_open_summary": {"opened": "count", "failed": "count", "failure_ratio": "ratio", "elapsed_ms": "ms"},
+    "batch_skipped_no_opened_tabs": {"retry_sleep_seconds": "s"},
+    "batch_capture_success": {
+        "opened_tabs": "count",
+        "captured_items": "count",
+        "with_upc": "count",
+        "upc_by_domain": "{domínio: [capturados, com UPC]}",
+        "elapsed_ms": "ms",
+        "settle_ms": "ms",
+    },
+    "batch_capture_error": {
+        "opened_tabs": "count",
+        "consecutive_capture_failures": "count",
+        "elapsed_ms": "ms",
+        "settle_ms": "ms",
+        "retry_sleep_seconds": "s",
+    },
+    "supplier_completed": {"captured_for_supplier": "count"},
+    "diagnostics_dropped": {"dropped": "count"},
+}
+# elapsed_ms de page_navigation inclui o settle_ms da listagem; o de
+# batch_capture_* é só a chamada de captura (o settle vem antes).
+
+_FLUSH = object()
+_STOP = object()
+
+
+def parse_sample_spec(spec: str) -> Dict[str, float]:
+    """'evento=0.1,*=0.5' -> {"evento": 0.1, "*": 0.5}; entradas inválidas são ignoradas."""
+    rates: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if not name or not value.strip():
+            continue
+        try:
+            rates[name] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            logger.warning(f"Amostragem de diagnóstico inválida ignorada: {part.strip()}")
+    return rates
+
+
+def rotated_name(path: str, when: datetime) -> str:
+    """logs/automation_diagnostics.jsonl -> logs/automation_diagnostics.20260101-120000-000000.jsonl"""
+    # Microssegundos no nome: duas rotações no mesmo segundo não se sobrescrevem.
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{when.strftime('%Y%m%d-%H%M%S-%f')}{ext or '.jsonl'}"
+
+
+def list_diagnostic_files(path: str) -> List[str]:
+    """Arquivos rotacionados (mais antigo primeiro) seguidos do arquivo ativo, se existir."""
+    folder = os.path.dirname(path) or "."
+    stem, ext = os.path.splitext(os.path.basename(path))
+    ext = ext or ".jsonl"
+    prefix = f"{stem}."
+    rotated = []
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        if not name.startswith(prefix) or name == os.path.basename(path):
+            continue
+        if name.endswith(ext + ".gz") or name.endswith(ext):
+            rotated.append(os.path.join(folder, name))
+    # O carimbo no nome ordena cronologicamente.
+    rotated.sort()
+    if os.path.exists(path):
+        rotated.append(path)
+    return rotated
+
+
+def _compress(path: str) -> str:
+    target = path + ".gz"
+    tmp = target + ".tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(tmp, target)
+    os.remove(path)
+    return target
+
+
+def _snapshot(value: Any) -> Any:
+    """Cópia dos contêineres (escalares e demais objetos seguem por referência)."""
+    if isinstance(value, dict):
+        return {k: _snapshot(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_snapshot(v) for v in value]
+    return value
+
+
+class DiagnosticsWriter:
+    """
+    Gravação do JSONL de diagnóstico fora do event loop.
+
+    emit() só monta a tupla do evento e enfileira (sem I/O nem json.dumps);
+    uma thread serializa, junta até DIAGNOSTICS_BATCH_EVENTS linhas ou
+    DIAGNOSTICS_FLUSH_SECONDS e grava tudo num write() no arquivo que fica
+    aberto. O arquivo ativo é rotacionado por tamanho/idade e o antigo vira
+    .jsonl.gz ao lado dele.
+
+    Diagnóstico nunca pode derrubar nem travar o robô: fila cheia descarta
+    (e grava um diagnostics_dropped depois), erro de disco só vai para o log.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        enabled: bool = True,
+        sample_spec: str = DIAGNOSTICS_SAMPLE,
+        max_bytes: int = int(DIAGNOSTICS_MAX_MB * 1024 * 1024),
+        rotate_seconds: float = DIAGNOSTICS_ROTATE_HOURS * 3600,
+        keep_files: int = DIAGNOSTICS_KEEP_FILES,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.sample_rates = parse_sample_spec(sample_spec)
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.keep_files = keep_files
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, DIAGNOSTICS_QUEUE_MAX))
+        self._seq = itertools.count(1)
+        self._pid = os.getpid()
+        self._dropped = 0
+        self._dropped_total = 0
+        self._written = 0
+        self._file: Optional[TextIO] = None
+        self._size = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    # ------------------------------------------------------------ produção
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="diagnostics-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def sample_rate(self, event: str) -> float:
+        rate = self.sample_rates.get(event)
+        if rate is None:
+            rate = self.sample_rates.get("*", 1.0)
+        return rate
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """
+        Enfileira o evento; a serialização fica para a thread. Dicts, listas
+        e sets dos campos são copiados aqui: o chamador pode alterá-los depois.
+        """
+        if not self.enabled or self._closed:
+            return
+        rate = self.sample_rate(event)
+        if rate < 1.0 and random.random() >= rate:
+            return
+        record = (time.time(), event, next(self._seq), rate, {k: _snapshot(v) for k, v in fields.items()})
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+            self._dropped_total += 1
+            return
+        self._ensure_thread()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera o que já foi emitido chegar ao disco."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put((_FLUSH, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Grava o que falta e fecha o arquivo (chamado também no atexit)."""
+        if self._closed:
+            return
+        self._closed = True
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "written": self._written,
+            "dropped": self._dropped_total,
+            "sample_rates": dict(self.sample_rates),
+        }
+
+    # -------------------------------------------------------------- thread
+
+    def _serialize(self, record: Tuple[float, str, int, float, Dict[str, Any]]) -> str:
+        ts, event, seq, rate, fields = record
+        payload: Dict[str, Any] = {
+            "v": DIAGNOSTICS_SCHEMA_VERSION,
+            "ts": round(ts, 3),
+            "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+            "event": event,
+            "seq": seq,
+            "pid": self._pid,
+        }
+        if rate < 1.0:
+            payload["sample_rate"] = rate
+        for key, value in fields.items():
+            # Campo do envelope não é sobrescrito por kwargs do evento.
+            payload.setdefault(key, value)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+    def _run(self) -> None:
+        pending: List[str] = []
+        waiters: List[threading.Event] = []
+        deadline = time.monotonic() + DIAGNOSTICS_FLUSH_SECONDS
+        stop = False
+        while not stop:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, tuple) and item and item[0] is _FLUSH:
+                waiters.append(item[1])
+            elif item is not None:
+                try:
+                    pending.append(self._serialize(item))
+                except Exception as e:
+                    logger.warning(f"Evento de diagnóstico não serializável ({item[1]}): {e}")
+
+            due = time.monotonic() >= deadline
+            if stop or waiters or due or len(pending) >= DIAGNOSTICS_BATCH_EVENTS:
+                if self._dropped:
+                    dropped, self._dropped = self._dropped, 0
+                    record = (time.time(), "diagnostics_dropped", next(self._seq), 1.0, {"dropped": dropped})
+                    pending.append(self._serialize(record))
+                if pending:
+                    self._write_batch(pending)
+                    pending = []
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+                deadline = time.monotonic() + DIAGNOSTICS_FLUSH_SECONDS
+        self._close_file()
+
+    def _write_batch(self, lines: List[str]) -> None:
+        try:
+            if self._file is None:
+                self._open()
+            elif self._should_rotate():
+                self._rotate()
+            data = "\n".join(lines) + "\n"
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data.encode("utf-8"))
+            self._written += len(lines)
+        except Exception as e:
+            logger.error(f"Falha gravando diagnóstico em {self.path}: {e}")
+            self._close_file()
+
+    # ------------------------------------------------------------- arquivo
+
+    def _open(self) -> None:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._opened_at = self._first_record_ts() if self._size else time.time()
+        if self._should_rotate():
+            self._rotate()
+
+    def _first_record_ts(self) -> float:
+        # Idade do arquivo herdado de outra execução: ts da primeira linha (ou mtime).
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return float(json.loads(f.readline()).get("ts"))
+        except Exception:
+            try:
+                return os.path.getmtime(self.path)
+            except OSError:
+                return time.time()
+
+    def _should_rotate(self) -> bool:
+        if not self._size:
+            return False
+        if self.max_bytes > 0 and self._size >= self.max_bytes:
+            return True
+        return self.rotate_seconds > 0 and time.time() - self._opened_at >= self.rotate_seconds
+
+    def _rotate(self) -> None:
+        self._close_file()
+        target = rotated_name(self.path, datetime.now())
+        try:
+            os.replace(self.path, target)
+            _compress(target)
+        except Exception as e:
+            logger.error(f"Falha rotacionando diagnóstico {self.path}: {e}")
+        self._prune()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+
+    def _prune(self) -> None:
+        rotated = [p for p in list_diagnostic_files(self.path) if p != self.path]
+        excess = len(rotated) - max(0, self.keep_files)
+        for old in rotated[:max(0, excess)]:
+            try:
+                os.remove(old)
+            except OSError as e:
+                logger.warning(f"Não foi possível apagar diagnóstico antigo {old}: {e}")
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+
+
+def flush_on_signals(writer: DiagnosticsWriter, signums: Tuple[int, ...] = (signal.SIGTERM,)) -> None:
+    """
+    SIGTERM (parada pela API) mata o processo sem passar pelo atexit: grava o
+    buffer e então repete o sinal com o tratamento padrão. Só na thread principal.
+    """
+
+    def _handler(signum, frame):
+        writer.close(timeout=2.0)
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+    for signum in signums:
+        try:
+            signal.signal(signum, _handler)
+        except (ValueError, OSError):
+            pass
@@ -0,0 +1,193 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from automation.exporter import export_to_xlsx
+
+logger = logging.getLogger(__name__)
+
+# Tentativas por lote antes de desistir (o lote continua em pending_exports).
+EXPORT_MAX_ATTEMPTS = int(os.getenv("EXPORT_MAX_ATTEMPTS", "3"))
+# Tempo máximo esperando a fila esvaziar no fim da automação.
+EXPORT_DRAIN_TIMEOUT_SECONDS = float(os.getenv("EXPORT_DRAIN_TIMEOUT_SECONDS", "600"))
+
+
+class ExportWorker:
+    """
+    Thread única que gera os arquivos de exportação fora do event loop.
+
+    Recebe lotes já entregues ao estado (pending_exports) e só devolve o
+    resultado (id, erro); quem mexe no estado é sempre a thread principal,
+    via reap_exports().
+    """
+
+    def __init__(self, export_fn: Callable[[Any, str, str], Any] = export_to_xlsx):
+        self.export_fn = export_fn
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._inflight: Set[str] = set()
+        self._finished: List[Tuple[str, Optional[str]]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="export-worker", daemon=True)
+            self._thread.start()
+
+    def submit(self, job: Dict[str, Any]) -> bool:
+        """Enfileira um lote; ignora se o mesmo id já está na fila/em execução."""
+        with self._lock:
+            if job["id"] in self._inflight:
+                return False
+            self._inflight.add(job["id"])
+        self._queue.put(job)
+        self._ensure_thread()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            error = None
+            t0 = time.perf_counter()
+            try:
+                self.export_fn(job["items"], job["template_path"], job["out_path"])
+                logger.info(
+                    f"Exportação ({job.get('reason')}) concluída em: {job['out_path']} "
+                    f"({len(job['items'])} itens, {time.perf_counter() - t0:.1f}s)"
+                )
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                logger.error(f"Falha na exportação {job['out_path']}: {error}")
+            with self._lock:
+                self._inflight.discard(job["id"])
+                self._finished.append((job["id"], error))
+            self._queue.task_done()
+
+    def pop_finished(self) -> List[Tuple[str, Optional[str]]]:
+        with self._lock:
+            finished, self._finished = self._finished, []
+        return finished
+
+    @property
+    def busy(self) -> bool:
+        with self._lock:
+            return bool(self._inflight)
+
+    def wait_idle(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while self.busy:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+
+def _job_from_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    # Cópia imutável do lote: o worker nunca enxerga a lista guardada no estado.
+    return {
+        "id": entry["id"],
+        "items": tuple(entry.get("items", [])),
+        "template_path": entry["template_path"],
+        "out_path": entry["out_path"],
+        "reason": entry.get("reason"),
+    }
+
+
+def queue_export(
+    state: Dict[str, Any],
+    worker: ExportWorker,
+    export_dir: str,
+    template_path: str,
+    reason: str,
+    save_fn: Callable[[Dict[str, Any]], None],
+) -> Optional[str]:
+    """
+    Move accumulated_items para pending_exports (com o caminho final já
+    definido), persiste o estado e só então entrega o lote ao worker.
+
+    Se o processo cair no meio da exportação, resume_pending_exports() gera
+    o mesmo arquivo de novo na próxima execução.
+    """
+    items = state.get("accumulated_items", [])
+    if not items:
+        return None
+
+    ts = datetime.now()
+    base_name = f"Produtos_{ts.strftime('%d_%m_%Y')}_{ts.strftime('%H%M%S')}.xlsx"
+    entry = {
+        "id": uuid.uuid4().hex,
+        "reason": reason,
+        "out_path": os.path.join(export_dir, base_name),
+        "template_path": template_path,
+        "queued_at": int(time.time()),
+        "attempts": 0,
+        "items": items,
+    }
+    state.setdefault("pending_exports", []).append(entry)
+    state["accumulated_items"] = []
+    save_fn(state)
+
+    worker.submit(_job_from_entry(entry))
+    logger.info(f"Exportação ({reason}) enviada para segundo plano: {entry['out_path']} ({len(items)} itens)")
+    return entry["out_path"]
+
+
+def resume_pending_exports(state: Dict[str, Any], worker: ExportWorker) -> int:
+    """Reenvia ao worker os lotes de pending_exports ainda não concluídos."""
+    resumed = 0
+    for entry in state.get("pending_exports", []):
+        if entry.get("attempts", 0) >= EXPORT_MAX_ATTEMPTS:
+            continue
+        if worker.submit(_job_from_entry(entry)):
+            resumed += 1
+    if resumed:
+        logger.info(f"Retomando {resumed} exportação(ões) pendente(s) de execução anterior.")
+    return resumed
+
+
+def reap_exports(
+    state: Dict[str, Any],
+    worker: ExportWorker,
+    save_fn: Callable[[Dict[str, Any]], None],
+) -> List[Dict[str, Any]]:
+    """
+    Aplica no estado os resultados do worker (chamar na thread principal).
+
+    Lotes concluídos saem de pending_exports; lotes com erro voltam para a
+    fila até EXPORT_MAX_ATTEMPTS e depois ficam parados no estado (os itens
+    não se perdem). Retorna [{"out_path", "reason", "error", "attempts"}].
+    """
+    finished = worker.pop_finished()
+    if not finished:
+        return []
+
+    by_id = {entry["id"]: entry for entry in state.get("pending_exports", [])}
+    done: Set[str] = set()
+    results: List[Dict[str, Any]] = []
+    for job_id, error in finished:
+        entry = by_id.get(job_id)
+        if entry is None:
+            continue
+        if error is None:
+            done.add(job_id)
+        else:
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            entry["last_error"] = error
+            if entry["attempts"] < EXPORT_MAX_ATTEMPTS:
+                worker.submit(_job_from_entry(entry))
+        results.append({
+            "out_path": entry["out_path"],
+            "reason": entry.get("reason"),
+            "error": error,
+            "attempts": entry.get("attempts", 0),
+        })
+
+    if results:
+        state["pending_exports"] = [e for e in state.get("pending_exports", []) if e["id"] not in done]
+        save_fn(state)
+    return results
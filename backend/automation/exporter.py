@@ -1,167 +1,504 @@
+import json
 import os
 from copy import copy
-from openpyxl import load_workbook
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle
 from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment, Font
 
-def export_to_xlsx(accumulated_items, template_path, output_path):
-    # Carrega o template mantendo formatação
-    if not os.path.exists(template_path):
-        raise FileNotFoundError(f"Template não encontrado: {template_path}")
-        
+try:
+    import pyarrow  # noqa: F401 (engine do pandas.to_parquet)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+EXPORT_COLUMNAR_ENABLED = os.getenv("EXPORT_COLUMNAR_ENABLED", "1") == "1"
+# "virtual": JSON embutido + rolagem virtual (padrão); "table": tabela estática antiga.
+EXPORT_HTML_MODE = os.getenv("EXPORT_HTML_MODE", "virtual").strip().lower()
+# Dataset consolidado (particionado por data) com todos os lotes exportados.
+EXPORT_DATASET_DIR = os.getenv("EXPORT_DATASET_DIR", "")
+
+# Colunas do mapeamento do template, na ordem usada nos formatos colunares.
+EXPORT_COLUMNS = [
+    ("produto", "Produto"),
+    ("upc", "UPC"),
+    ("url fornecedor", "URL Fornecedor"),
+    ("amazon upc", "Amazon UPC"),
+    ("amazon titulo", "Amazon Titulo"),
+]
+
+# Layout do template lido uma única vez por (caminho, mtime).
+_template_layout_cache = {}
+
+
+def _column_width(header_name):
+    if 'url' in header_name or 'amazon' in header_name:
+        return 60
+    if 'produto' in header_name:
+        return 80
+    return 25
+
+
+def _load_template_layout(template_path):
+    """
+    Lê do template o cabeçalho (linha 1), o estilo da primeira linha de dados
+    (linha 2) e configurações da aba. O resultado fica em cache enquanto o
+    arquivo não mudar.
+    """
+    mtime = os.path.getmtime(template_path)
+    cached = _template_layout_cache.get(template_path)
+    if cached and cached["mtime"] == mtime:
+        return cached
+
     wb = load_workbook(template_path)
     ws = wb.active
 
-    # O template "SRAM 05_01_2026.xlsx" tem os headers na linha 1
-    # Vamos descobrir as colunas com base no cabecalho
-    headers = {}
+    columns = []
     for cell in ws[1]:
-        if cell.value:
-            headers[str(cell.value).strip().lower()] = cell.column
+        if not cell.value:
+            continue
+        style_cell = ws.cell(row=2, column=cell.column)
+        columns.append({
+            "idx": cell.column,
+            "header": cell.value,
+            "key": str(cell.value).strip().lower(),
+            "header_style": {
+                "font": copy(cell.font),
+                "border": copy(cell.border),
+                "fill": copy(cell.fill),
+                "number_format": cell.number_format,
+                "protection": copy(cell.protection),
+                "alignment": copy(cell.alignment),
+            } if cell.has_style else None,
+            "data_style": {
+                "font": copy(style_cell.font),
+                "border": copy(style_cell.border),
+                "fill": copy(style_cell.fill),
+                "number_format": style_cell.number_format,
+                "protection": copy(style_cell.protection),
+                "alignment": copy(style_cell.alignment),
+            } if style_cell.has_style else None,
+        })
 
-    # Preenche os dados copiando o estilo da linha 2 (primeira linha de dados)
-    # Assumimos que o cabecalho está na linha 1 e os dados comecam na 2
-    
-    start_row = 2
-    # Extrair os estilos da linha 2 (row=2)
-    style_row = 2
-    for r_idx, item in enumerate(accumulated_items, start=start_row):
-        
-        # Mapear chaves do item para colunas (ajustado para o padrão Qota Store)
-        mapping = {
-            "produto": item.get('product_title', ''),
-            "upc": item.get('upc', ''),
-            "url fornecedor": item.get('url', ''),
-            "amazon upc": f"https://www.amazon.com/s?k={item.get('upc', '')}" if item.get('upc') else "",
-            "amazon titulo": f"https://www.amazon.com/s?k={item.get('product_title', '')}" if item.get('product_title') else "",
-        }
-
-        # Insere dados
-        for header_name, col_idx in headers.items():
-            val = ""
-            for k, v in mapping.items():
-                if k.lower() == header_name:
-                    val = v
-                    break
-            
-            cell = ws.cell(row=r_idx, column=col_idx)
-            cell.value = val
-            
-            # Copiar estilo da primeira linha de dados
-            template_cell = ws.cell(row=style_row, column=col_idx)
-            if template_cell.has_style:
-                cell.font = copy(template_cell.font)
-                cell.border = copy(template_cell.border)
-                cell.fill = copy(template_cell.fill)
-                cell.number_format = copy(template_cell.number_format)
-                cell.protection = copy(template_cell.protection)
-                cell.alignment = copy(template_cell.alignment)
-                
-            # Transforma explicitamente em fórmula HYPERLINK para ser 100% nativo e clicável no Google Planilhas
+    layout = {
+        "mtime": mtime,
+        "title": ws.title,
+        "freeze_panes": ws.freeze_panes,
+        "columns": columns,
+    }
+    wb.close()
+    _template_layout_cache[template_path] = layout
+    return layout
+
+
+def _named_style(name, base, font=None, wrap=False):
+    style = NamedStyle(name=name)
+    if base:
+        style.font = copy(base["font"])
+        style.border = copy(base["border"])
+        style.fill = copy(base["fill"])
+        style.number_format = base["number_format"]
+        style.protection = copy(base["protection"])
+        style.alignment = copy(base["alignment"])
+    if font is not None:
+        style.font = font
+    if wrap:
+        horizontal = base["alignment"].horizontal if base else None
+        style.alignment = Alignment(wrap_text=True, horizontal=horizontal, vertical='center')
+    return style
+
+
+def _item_values(item):
+    # Mapear chaves do item para colunas (ajustado para o padrão Qota Store)
+    return {
+        "produto": item.get('product_title', ''),
+        "upc": item.get('upc', ''),
+        "url fornecedor": item.get('url', ''),
+        "amazon upc": f"https://www.amazon.com/s?k={item.get('upc', '')}" if item.get('upc') else "",
+        "amazon titulo": f"https://www.amazon.com/s?k={item.get('product_title', '')}" if item.get('product_title') else "",
+    }
+
+
+def export_to_xlsx(accumulated_items, template_path, output_path):
+    """
+    Gera o XLSX no layout do template em uma única passada (openpyxl write-only).
+
+    Cada estilo de coluna vira um NamedStyle criado uma vez; as linhas são
+    escritas em streaming, sem carregar o template inteiro nem copiar estilo
+    célula a célula.
+    """
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f"Template não encontrado: {template_path}")
+
+    layout = _load_template_layout(template_path)
+    columns = layout["columns"]
+    max_col = max((c["idx"] for c in columns), default=0)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=layout["title"])
+    if layout["freeze_panes"]:
+        ws.freeze_panes = layout["freeze_panes"]
+
+    # Ajusta largura das colunas e registra os estilos (uma vez por coluna).
+    # Nomes ficam num dict local: o layout vem do cache e é compartilhado entre exportações.
+    link_font = Font(color="0563C1", underline="single")
+    style_names = {}
+    for col in columns:
+        ws.column_dimensions[get_column_letter(col["idx"])].width = _column_width(col["key"])
+        header_name = None
+        if col["header_style"]:
+            header_name = f"fba_header_{col['idx']}"
+            wb.add_named_style(_named_style(header_name, col["header_style"]))
+        data_name = f"fba_data_{col['idx']}"
+        link_name = f"fba_link_{col['idx']}"
+        wb.add_named_style(_named_style(data_name, col["data_style"], wrap=True))
+        wb.add_named_style(_named_style(link_name, col["data_style"], font=link_font, wrap=True))
+        style_names[col["idx"]] = (header_name, data_name, link_name)
+
+    header_row = [None] * max_col
+    for col in columns:
+        cell = WriteOnlyCell(ws, value=col["header"])
+        header_name = style_names[col["idx"]][0]
+        if header_name:
+            cell.style = header_name
+        header_row[col["idx"] - 1] = cell
+    ws.append(header_row)
+
+    for item in accumulated_items:
+        values = _item_values(item)
+        row = [None] * max_col
+        for col in columns:
+            _, data_name, link_name = style_names[col["idx"]]
+            val = values.get(col["key"], "")
             if val and isinstance(val, str) and val.startswith("http"):
-                cell.hyperlink = None # Remove metadados se houver
-                cell.value = f'=HYPERLINK("{val}", "{val}")'
-                # Colore de azul e sublinha para manter aspecto de link
-                cell.font = Font(color="0563C1", underline="single")
-
-    # Limpar as linhas extras do template original
-    max_orig_row = ws.max_row
-    if max_orig_row > max(start_row, r_idx):
-        ws.delete_rows(r_idx + 1, max_orig_row - r_idx)
-
-    # Ajusta largura das colunas e quebra de linha para garantir visibilidade
-    for header_name, col_idx in headers.items():
-        col_letter = get_column_letter(col_idx)
-        if 'url' in header_name or 'amazon' in header_name:
-            ws.column_dimensions[col_letter].width = 60
-        elif 'produto' in header_name:
-            ws.column_dimensions[col_letter].width = 80
-        else:
-            ws.column_dimensions[col_letter].width = 25
-            
-        for row in range(start_row, r_idx + 1):
-            cell = ws.cell(row=row, column=col_idx)
-            if cell.alignment:
-                cell.alignment = Alignment(wrap_text=True, horizontal=cell.alignment.horizontal, vertical='center')
+                # Fórmula HYPERLINK para ser 100% nativo e clicável no Google Planilhas
+                cell = WriteOnlyCell(ws, value=f'=HYPERLINK("{val}", "{val}")')
+                cell.style = link_name
             else:
-                cell.alignment = Alignment(wrap_text=True, vertical='center')
+                cell = WriteOnlyCell(ws, value=val)
+                cell.style = data_name
+            row[col["idx"] - 1] = cell
+        ws.append(row)
 
     wb.save(output_path)
-    
+
+    export_html_sidecar(accumulated_items, output_path)
+    if EXPORT_COLUMNAR_ENABLED:
+        export_columnar(accumulated_items, output_path)
+    return output_path
+
+
+def _items_frame(accumulated_items):
+    rows = [_item_values(item) for item in accumulated_items]
+    df = pd.DataFrame.from_records(rows, columns=[key for key, _ in EXPORT_COLUMNS])
+    df.columns = [name for _, name in EXPORT_COLUMNS]
+    # UPC sempre como texto: preserva zeros à esquerda.
+    return df.fillna("").astype(str)
+
+
+def export_columnar(accumulated_items, output_path):
+    """
+    Grava o lote também em Parquet e CSV.gz (mesmas colunas do XLSX) e
+    acrescenta uma partição ao dataset consolidado em exports/dataset.
+
+    Sem pyarrow, grava só o CSV.gz. Reexportar o mesmo arquivo sobrescreve
+    a mesma partição (o nome da parte vem do nome do XLSX).
+    """
+    try:
+        df = _items_frame(accumulated_items)
+        stem = os.path.splitext(os.path.basename(output_path))[0]
+
+        csv_path = output_path.replace(".xlsx", ".csv.gz").replace("ARQUIVOS XLSX", "ARQUIVOS CSV")
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+        df.to_csv(csv_path, index=False, compression="gzip")
+
+        if not PARQUET_AVAILABLE:
+            print("pyarrow não instalado: exportação Parquet e dataset consolidado ignorados.")
+            return
+
+        parquet_path = output_path.replace(".xlsx", ".parquet").replace("ARQUIVOS XLSX", "ARQUIVOS PARQUET")
+        os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+        df.to_parquet(parquet_path, index=False, engine="pyarrow")
+
+        exported_at = datetime.fromtimestamp(os.path.getmtime(output_path))
+        dataset_dir = EXPORT_DATASET_DIR or os.path.join(os.path.dirname(os.path.dirname(output_path)), "dataset")
+        partition_dir = os.path.join(dataset_dir, f"export_date={exported_at.strftime('%Y-%m-%d')}")
+        os.makedirs(partition_dir, exist_ok=True)
+        df["export_file"] = stem
+        df["exported_at"] = pd.Timestamp(exported_at)
+        part_path = os.path.join(partition_dir, f"part-{stem}.parquet")
+        # Nome com "." inicial: leitores de dataset ignoram a parte incompleta.
+        tmp_path = os.path.join(partition_dir, f".part-{stem}.parquet.tmp")
+        df.to_parquet(tmp_path, index=False, engine="pyarrow")
+        os.replace(tmp_path, part_path)
+    except Exception as e:
+        print(f"Erro ao gerar exportação colunar: {e}")
+
+
+def export_html_sidecar(accumulated_items, output_path):
     # GERADOR DE HTML PARALELO PARA CLICK INSTANTÂNEO NATIVO
+    html_path = output_path.replace(".xlsx", ".html").replace("ARQUIVOS XLSX", "ARQUIVOS HTML")
     try:
-        html_path = output_path.replace(".xlsx", ".html").replace("ARQUIVOS XLSX", "ARQUIVOS HTML")
         os.makedirs(os.path.dirname(html_path), exist_ok=True)
-        html_content = [
-            "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Produtos Capturados</title>",
-            "<style>",
-            ":root { --bg: #ffffff; --text: #333333; --table-bg: #f9f9f9; --border: #dddddd; --th-bg: #0563C1; --th-text: #ffffff; --link: #0066cc; --link-hover: #003399; --link-visited: #cc0000; --tr-hover: #f1f1f1; --clicked-bg: #ffe6e6; }",
-            "@media (prefers-color-scheme: dark) {",
-            "  :root { --bg: #121212; --text: #e0e0e0; --table-bg: #1e1e1e; --border: #333333; --th-bg: #0563C1; --th-text: #ffffff; --link: #4da6ff; --link-hover: #80bfff; --link-visited: #ff8080; --tr-hover: #2a2a2a; --clicked-bg: #4a1515; }",
-            "}",
-            "body { font-family: monospace; font-size: 14px; margin: 20px; background: var(--bg); color: var(--text); }",
-            "table { border-collapse: collapse; width: 100%; margin-top: 10px; background: var(--table-bg); }",
-            "th, td { border: 1px solid var(--border); padding: 8px; text-align: left; transition: background-color 0.3s; }",
-            "th { background-color: var(--th-bg); color: var(--th-text); position: sticky; top: 0; }",
-            "a { color: var(--link); text-decoration: none; display: block; width: 100%; height: 100%; }",
-            "a:hover { text-decoration: underline; color: var(--link-hover); }",
-            "a:visited { color: var(--link-visited); }",
-            "tr:hover { background-color: var(--tr-hover); }",
-            "td.clicked-cell { background-color: var(--clicked-bg) !important; }",
-            "</style></head><body>",
-            "<h2>Lote de Produtos Exportados</h2>",
-            "<p>Dica: Segure <b>CTRL + Clique</b> nos links abaixo para abrir na hora sem sair dessa tela!</p>",
-            "<table><thead><tr><th>Indice</th><th>Produto</th><th>UPC</th><th>URL Fornecedor</th><th>Amazon UPC</th><th>Amazon Título</th></tr></thead><tbody>"
-        ]
+        if EXPORT_HTML_MODE == "table":
+            _export_html_table(accumulated_items, html_path)
+        else:
+            _export_html_virtual(accumulated_items, html_path)
+    except Exception as e:
+        print(f"Erro ao gerar versão HTML: {e}")
+
+    return output_path
+
+
+def _export_html_virtual(accumulated_items, html_path):
+    """
+    HTML com os dados em JSON compacto e renderização virtual: só as linhas
+    visíveis existem no DOM, o filtro roda no navegador e os links clicados
+    ficam em uma única chave do localStorage.
+    """
+    rows = [
+        [item.get('product_title', '') or '', str(item.get('upc', '') or ''), item.get('url', '') or '']
+        for item in accumulated_items
+    ]
+    # "</" escapado para o JSON não fechar a tag <script> antes da hora.
+    data = json.dumps(rows, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+    html = _VIRTUAL_HTML_TEMPLATE.replace("__TOTAL__", str(len(rows))).replace("__DATA__", data)
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+def _export_html_table(accumulated_items, html_path):
+    # Modo antigo: uma <table> com todas as linhas (EXPORT_HTML_MODE=table)
+    html_content = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Produtos Capturados</title>",
+        "<style>",
+        ":root { --bg: #ffffff; --text: #333333; --table-bg: #f9f9f9; --border: #dddddd; --th-bg: #0563C1; --th-text: #ffffff; --link: #0066cc; --link-hover: #003399; --link-visited: #cc0000; --tr-hover: #f1f1f1; --clicked-bg: #ffe6e6; }",
+        "@media (prefers-color-scheme: dark) {",
+        "  :root { --bg: #121212; --text: #e0e0e0; --table-bg: #1e1e1e; --border: #333333; --th-bg: #0563C1; --th-text: #ffffff; --link: #4da6ff; --link-hover: #80bfff; --link-visited: #ff8080; --tr-hover: #2a2a2a; --clicked-bg: #4a1515; }",
+        "}",
+        "body { font-family: monospace; font-size: 14px; margin: 20px; background: var(--bg); color: var(--text); }",
+        "table { border-collapse: collapse; width: 100%; margin-top: 10px; background: var(--table-bg); }",
+        "th, td { border: 1px solid var(--border); padding: 8px; text-align: left; transition: background-color 0.3s; }",
+        "th { background-color: var(--th-bg); color: var(--th-text); position: sticky; top: 0; }",
+        "a { color: var(--link); text-decoration: none; display: block; width: 100%; height: 100%; }",
+        "a:hover { text-decoration: underline; color: var(--link-hover); }",
+        "a:visited { color: var(--link-visited); }",
+        "tr:hover { background-color: var(--tr-hover); }",
+        "td.clicked-cell { background-color: var(--clicked-bg) !important; }",
+        "</style></head><body>",
+        "<h2>Lote de Produtos Exportados</h2>",
+        "<p>Dica: Segure <b>CTRL + Clique</b> nos links abaixo para abrir na hora sem sair dessa tela!</p>",
+        "<table><thead><tr><th>Indice</th><th>Produto</th><th>UPC</th><th>URL Fornecedor</th><th>Amazon UPC</th><th>Amazon Título</th></tr></thead><tbody>"
+    ]
+    
+    for index, item in enumerate(accumulated_items, start=1):
+        produto = item.get('product_title', '')
+        upc = item.get('upc', '')
+        url = item.get('url', '')
+        amz_upc = f"https://www.amazon.com/s?k={upc}" if upc else ""
+        amz_tit = f"https://www.amazon.com/s?k={produto}" if produto else ""
         
-        for index, item in enumerate(accumulated_items, start=1):
-            produto = item.get('product_title', '')
-            upc = item.get('upc', '')
-            url = item.get('url', '')
-            amz_upc = f"https://www.amazon.com/s?k={upc}" if upc else ""
-            amz_tit = f"https://www.amazon.com/s?k={produto}" if produto else ""
-            
-            html_content.append("<tr>")
-            html_content.append(f"<td>{index}</td>")
-            html_content.append(f"<td>{produto}</td>")
-            html_content.append(f"<td>{upc}</td>")
-            html_content.append(f"<td><a href='{url}' target='_blank'>Abrir Fornecedor</a></td>" if url else "<td></td>")
-            html_content.append(f"<td><a href='{amz_upc}' target='_blank'>Buscar UPC na Amazon</a></td>" if amz_upc else "<td></td>")
-            html_content.append(f"<td><a href='{amz_tit}' target='_blank'>Buscar Titulo na Amazon</a></td>" if amz_tit else "<td></td>")
-            html_content.append("</tr>")
-            
-        html_content.append("</tbody></table>")
+        html_content.append("<tr>")
+        html_content.append(f"<td>{index}</td>")
+        html_content.append(f"<td>{produto}</td>")
+        html_content.append(f"<td>{upc}</td>")
+        html_content.append(f"<td><a href='{url}' target='_blank'>Abrir Fornecedor</a></td>" if url else "<td></td>")
+        html_content.append(f"<td><a href='{amz_upc}' target='_blank'>Buscar UPC na Amazon</a></td>" if amz_upc else "<td></td>")
+        html_content.append(f"<td><a href='{amz_tit}' target='_blank'>Buscar Titulo na Amazon</a></td>" if amz_tit else "<td></td>")
+        html_content.append("</tr>")
         
-        # Add JavaScript for LocalStorage click tracking
-        js_script = """
-        <script>
-            document.addEventListener('DOMContentLoaded', () => {
-                const links = document.querySelectorAll('td a');
+    html_content.append("</tbody></table>")
+    
+    # Add JavaScript for LocalStorage click tracking
+    js_script = """
+    <script>
+        document.addEventListener('DOMContentLoaded', () => {
+            const links = document.querySelectorAll('td a');
+            
+            // Load clicked state from localStorage
+            links.forEach(link => {
+                const url = link.getAttribute('href');
+                if(url && localStorage.getItem('clicked_' + url)) {
+                    link.parentElement.classList.add('clicked-cell');
+                }
                 
-                // Load clicked state from localStorage
-                links.forEach(link => {
-                    const url = link.getAttribute('href');
-                    if(url && localStorage.getItem('clicked_' + url)) {
-                        link.parentElement.classList.add('clicked-cell');
+                // Add click listener
+                link.addEventListener('click', function() {
+                    if(url) {
+                        localStorage.setItem('clicked_' + url, 'true');
+                        this.parentElement.classList.add('clicked-cell');
                     }
-                    
-                    // Add click listener
-                    link.addEventListener('click', function() {
-                        if(url) {
-                            localStorage.setItem('clicked_' + url, 'true');
-                            this.parentElement.classList.add('clicked-cell');
-                        }
-                    });
                 });
             });
-        </script>
-        """
-        html_content.append(js_script)
-        html_content.append("</body></html>")
-        
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(html_content))
-    except Exception as e:
-        print(f"Erro ao gerar versão HTML: {e}")
+        });
+    </script>
+    """
+    html_content.append(js_script)
+    html_content.append("</body></html>")
+    
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(html_content))
 
-    return output_path
+
+# Página do modo "virtual". __DATA__ = [[produto, upc, url], ...]; links da
+# Amazon são montados no navegador para o arquivo ficar menor.
+_VIRTUAL_HTML_TEMPLATE = """<!DOCTYPE html><html><head><meta charset='utf-8'><title>Produtos Capturados</title>
+<style>
+:root { --bg: #ffffff; --text: #333333; --table-bg: #f9f9f9; --border: #dddddd; --th-bg: #0563C1; --th-text: #ffffff; --link: #0066cc; --link-hover: #003399; --tr-hover: #f1f1f1; --clicked-bg: #ffe6e6; }
+@media (prefers-color-scheme: dark) {
+  :root { --bg: #121212; --text: #e0e0e0; --table-bg: #1e1e1e; --border: #333333; --th-bg: #0563C1; --th-text: #ffffff; --link: #4da6ff; --link-hover: #80bfff; --tr-hover: #2a2a2a; --clicked-bg: #4a1515; }
+}
+body { font-family: monospace; font-size: 14px; margin: 20px; background: var(--bg); color: var(--text); }
+.toolbar { display: flex; gap: 16px; align-items: center; margin: 10px 0; }
+.toolbar input[type=search] { flex: 1; padding: 6px; font: inherit; }
+.grid-row { display: grid; grid-template-columns: 70px minmax(200px, 3fr) 140px 1fr 1fr 1fr; height: 34px; box-sizing: border-box; }
+.grid-row > div { border: 1px solid var(--border); padding: 0 8px; line-height: 32px; overflow: hidden; white-space: nowrap; text-overflow: ellipsis; }
+.head > div { background-color: var(--th-bg); color: var(--th-text); font-weight: bold; }
+#viewport { height: calc(100vh - 190px); overflow-y: auto; background: var(--table-bg); position: relative; }
+#spacer { position: relative; }
+#rows { position: absolute; left: 0; right: 0; top: 0; }
+#rows .grid-row:hover { background-color: var(--tr-hover); }
+a { color: var(--link); text-decoration: none; display: block; }
+a:hover { text-decoration: underline; color: var(--link-hover); }
+div.clicked-cell { background-color: var(--clicked-bg) !important; }
+</style></head><body>
+<h2>Lote de Produtos Exportados</h2>
+<p>Dica: Segure <b>CTRL + Clique</b> nos links abaixo para abrir na hora sem sair dessa tela!</p>
+<div class="toolbar">
+  <input type="search" id="filter" placeholder="Filtrar por produto, UPC ou URL...">
+  <label><input type="checkbox" id="hideClicked"> Ocultar já clicados</label>
+  <span id="count">__TOTAL__ produtos</span>
+</div>
+<div class="grid-row head"><div>Indice</div><div>Produto</div><div>UPC</div><div>URL Fornecedor</div><div>Amazon UPC</div><div>Amazon Título</div></div>
+<div id="viewport"><div id="spacer"><div id="rows"></div></div></div>
+<script type="application/json" id="data">__DATA__</script>
+<script>
+(() => {
+  const ROW_HEIGHT = 34, OVERSCAN = 10, STORE_KEY = 'fba_clicked_links';
+  const DATA = JSON.parse(document.getElementById('data').textContent);
+  const AMAZON_SEARCH = 'https://www.amazon.com/s?k=';
+  const amazon = q => q ? AMAZON_SEARCH + encodeURIComponent(q) : '';
+  const LINK_LABELS = ['Abrir Fornecedor', 'Buscar UPC na Amazon', 'Buscar Titulo na Amazon'];
+  const rowsData = DATA.map(([produto, upc, url], i) => ({
+    index: i + 1, produto, upc,
+    links: [url, amazon(upc), amazon(produto)],
+    haystack: (produto + ' ' + upc + ' ' + url).toLowerCase(),
+  }));
+
+  // Estado de clique: uma única chave no localStorage, lida uma vez e
+  // gravada em lote. Chaves antigas "clicked_<url>" são migradas e apagadas
+  // depois da primeira gravação; nelas a busca da Amazon tinha o termo cru,
+  // então entram também na forma codificada de amazon().
+  let clicked;
+  try { clicked = new Set(JSON.parse(localStorage.getItem(STORE_KEY) || '[]')); } catch (e) { clicked = new Set(); }
+  let dirty = false, saveTimer = null;
+  const legacyKeys = [];
+  for (let i = 0; i < localStorage.length; i++) {
+    const key = localStorage.key(i);
+    if (!key || !key.startsWith('clicked_')) continue;
+    const url = key.slice(8);
+    clicked.add(url);
+    if (url.startsWith(AMAZON_SEARCH)) clicked.add(amazon(url.slice(AMAZON_SEARCH.length)));
+    legacyKeys.push(key);
+    dirty = true;
+  }
+  const flush = () => {
+    saveTimer = null;
+    if (!dirty) return;
+    dirty = false;
+    try { localStorage.setItem(STORE_KEY, JSON.stringify([...clicked])); } catch (e) { return; }
+    // Só apaga as chaves antigas com o conjunto novo já gravado.
+    legacyKeys.splice(0).forEach(key => localStorage.removeItem(key));
+  };
+  const scheduleSave = () => { dirty = true; if (!saveTimer) saveTimer = setTimeout(flush, 500); };
+  window.addEventListener('pagehide', flush);
+  window.addEventListener('storage', e => {
+    if (e.key !== STORE_KEY) return;
+    try { clicked = new Set(JSON.parse(e.newValue || '[]')); } catch (err) {}
+    render(true);
+  });
+  if (dirty) scheduleSave();
+
+  const viewport = document.getElementById('viewport');
+  const spacer = document.getElementById('spacer');
+  const rowsEl = document.getElementById('rows');
+  const filterEl = document.getElementById('filter');
+  const hideClickedEl = document.getElementById('hideClicked');
+  const countEl = document.getElementById('count');
+  let visible = rowsData, lastStart = -1, lastEnd = -1;
+
+  const applyFilter = () => {
+    const terms = filterEl.value.toLowerCase().split(/\\s+/).filter(Boolean);
+    const hideClicked = hideClickedEl.checked;
+    visible = rowsData.filter(r =>
+      terms.every(t => r.haystack.includes(t)) && !(hideClicked && r.links[0] && clicked.has(r.links[0]))
+    );
+    countEl.textContent = visible.length === rowsData.length
+      ? rowsData.length + ' produtos'
+      : visible.length + ' de ' + rowsData.length + ' produtos';
+    spacer.style.height = (visible.length * ROW_HEIGHT) + 'px';
+    viewport.scrollTop = 0;
+    render(true);
+  };
+
+  const cell = (text) => { const d = document.createElement('div'); d.textContent = text; d.title = text; return d; };
+  const linkCell = (href, label) => {
+    const d = document.createElement('div');
+    if (!href) return d;
+    const a = document.createElement('a');
+    a.href = href; a.target = '_blank'; a.rel = 'noopener'; a.textContent = label;
+    d.appendChild(a);
+    if (clicked.has(href)) d.className = 'clicked-cell';
+    return d;
+  };
+
+  function render(force) {
+    const start = Math.max(0, Math.floor(viewport.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const end = Math.min(visible.length, Math.ceil((viewport.scrollTop + viewport.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+    if (!force && start === lastStart && end === lastEnd) return;
+    lastStart = start; lastEnd = end;
+    const frag = document.createDocumentFragment();
+    for (let i = start; i < end; i++) {
+      const r = visible[i];
+      const row = document.createElement('div');
+      row.className = 'grid-row';
+      row.appendChild(cell(String(r.index)));
+      row.appendChild(cell(r.produto));
+      row.appendChild(cell(r.upc));
+      LINK_LABELS.forEach((label, k) => row.appendChild(linkCell(r.links[k], label)));
+      frag.appendChild(row);
+    }
+    rowsEl.style.transform = 'translateY(' + (start * ROW_HEIGHT) + 'px)';
+    rowsEl.replaceChildren(frag);
+  }
+
+  let frame = null;
+  viewport.addEventListener('scroll', () => {
+    if (frame) return;
+    frame = requestAnimationFrame(() => { frame = null; render(false); });
+  });
+  window.addEventListener('resize', () => render(true));
+
+  // Um único listener para todos os links (clique normal, CTRL+clique e botão do meio).
+  const onLinkClick = e => {
+    const a = e.target.closest('a');
+    if (!a || !rowsEl.contains(a)) return;
+    clicked.add(a.getAttribute('href'));
+    a.parentElement.classList.add('clicked-cell');
+    scheduleSave();
+  };
+  rowsEl.addEventListener('click', onLinkClick);
+  rowsEl.addEventListener('auxclick', onLinkClick);
+
+  let filterTimer = null;
+  filterEl.addEventListener('input', () => { clearTimeout(filterTimer); filterTimer = setTimeout(applyFilter, 150); });
+  hideClickedEl.addEventListener('change', applyFilter);
+
+  applyFilter();
+})();
+</script>
+</body></html>
+"""
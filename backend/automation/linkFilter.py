@@ -0,0 +1,141 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from automation.supplierCrawler import normalize_product_url, parse_price_batch, parse_price_details
+
+# Padrões de URL de ação/carrinho (mesma lista usada antes no loop de run_automation).
+ACTION_URL_PATTERNS = (
+    "cart.php?action=", "cart.php?action%3d",
+    "/cart/add", "/cart/", "add-to-cart",
+    "addtocart", "/wishlist/", "/checkout",
+    "action=add&product_id=", "action=add&",
+    "/compare/", "compare.php",
+    "login", "account", "register",
+)
+DEFAULT_BLACKLIST = ("milwaukee",)
+
+
+def _compile_substrings(patterns: Iterable[str]) -> Optional["re.Pattern[str]"]:
+    escaped = [re.escape(p.lower()) for p in patterns if p]
+    if not escaped:
+        return None
+    return re.compile("|".join(escaped))
+
+
+ACTION_URL_RE = _compile_substrings(ACTION_URL_PATTERNS)
+
+
+def prepare_link(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calcula uma única vez os campos derivados do link e guarda no próprio item:
+    URL normalizada, domínio e preço parseado da listagem.
+    """
+    if "clean_url" not in item:
+        clean_url = normalize_product_url(item.get("url", ""))
+        item["clean_url"] = clean_url
+        try:
+            item["domain"] = (urlparse(clean_url).netloc or "").lower()
+        except Exception:
+            item["domain"] = ""
+    if "price_info" not in item:
+        item["price_info"] = parse_price_details(item.get("price_text", ""))
+    return item
+
+
+def attach_listing_prices(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Parseia de uma vez (parse_price_batch) os preços dos itens que ainda não
+    têm price_info e guarda o resultado no próprio item.
+    """
+    pending = [item for item in items if "price_info" not in item]
+    if pending:
+        texts = [item.get("price_text", "") for item in pending]
+        values, statuses = parse_price_batch(texts)
+        for item, text, value, status in zip(pending, texts, values, statuses):
+            item["price_info"] = {"value": value, "status": status, "raw": (text or "").strip()}
+    return items
+
+
+class ListingLinkFilter:
+    """
+    Estágio de filtro dos links de uma listagem.
+
+    Guarda os links já vistos na página atual, de modo que cada passada após
+    "load more"/scroll infinito só processa os links novos. Links que já saíram
+    como candidatos voltam a ser avaliados enquanto não estiverem em
+    processed_links (ex.: falha de abertura de aba sem quarentena).
+    """
+
+    def __init__(self, blacklist: Iterable[str] = DEFAULT_BLACKLIST):
+        self.blacklist = tuple(blacklist)
+        self._blacklist_re = _compile_substrings(self.blacklist)
+        self.page_url: Optional[str] = None
+        self._seen: Set[str] = set()
+        self._emitted: Dict[str, Dict[str, Any]] = {}
+
+    def start_page(self, page_url: str) -> None:
+        """Zera o cursor quando a listagem muda de URL."""
+        if page_url != self.page_url:
+            self.page_url = page_url
+            self._seen = set()
+            self._emitted = {}
+
+    def select(
+        self,
+        links: List[Dict[str, Any]],
+        processed_links: Set[str],
+        global_history: Set[str],
+    ) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], str]]]:
+        """
+        Retorna (candidatos, rejeitados) considerando só links novos nesta página.
+
+        Rejeitados vêm como (item, motivo) com motivo em:
+        "history", "invalid_format", "action_url", "blacklist".
+        Links com motivo "history" e "action_url" são adicionados em processed_links.
+        """
+        candidates: List[Dict[str, Any]] = []
+        rejected: List[Tuple[Dict[str, Any], str]] = []
+
+        for item in links:
+            url = item.get("url", "")
+            if url in processed_links:
+                continue
+            if url in self._emitted:
+                # Candidato de uma passada anterior que ainda não foi processado:
+                # reaproveita o item já preparado.
+                candidates.append(self._emitted[url])
+                continue
+            if url in self._seen:
+                continue
+            self._seen.add(url)
+
+            prepare_link(item)
+            url_lower = url.lower()
+
+            if item["clean_url"] in global_history:
+                processed_links.add(url)
+                rejected.append((item, "history"))
+                continue
+
+            if not url_lower.startswith("http"):
+                rejected.append((item, "invalid_format"))
+                continue
+
+            if ACTION_URL_RE is not None and ACTION_URL_RE.search(url_lower):
+                processed_links.add(url)
+                rejected.append((item, "action_url"))
+                continue
+
+            if self._blacklist_re is not None and self._blacklist_re.search(url_lower):
+                rejected.append((item, "blacklist"))
+                continue
+
+            self._emitted[url] = item
+            candidates.append(item)
+
+        return candidates, rejected
+
+    def discard(self, url: str) -> None:
+        """Marca um candidato como descartado (ex.: quarentena ou faixa de preço)."""
+        self._emitted.pop(url, None)
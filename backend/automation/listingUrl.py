@@ -0,0 +1,331 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+LISTING_URL_RULES_FILE = os.getenv(
+    "LISTING_URL_RULES_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "listing_url_rules.json"),
+)
+# Resultados aprendidos por domínio (honrado/rejeitado). Arquivo próprio em
+# state/ (gerado em execução, fora do git): o automation_state.json é apagado
+# a cada START sem retomada e no /clear.
+LISTING_URL_LEARNED_FILE = os.getenv(
+    "LISTING_URL_LEARNED_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "state", "listing_url_learned.json"),
+)
+LISTING_PAGE_SIZE_PROBE_ENABLED = os.getenv("LISTING_PAGE_SIZE_PROBE_ENABLED", "1") == "1"
+# Abaixo disso a comparação de cards não prova nada (catálogo pequeno cabe em uma página).
+PAGE_SIZE_MIN_BASELINE_CARDS = int(os.getenv("PAGE_SIZE_MIN_BASELINE_CARDS", "8"))
+
+# Parâmetros de ordenação/página por plataforma de e-commerce.
+# "asc"/"desc": pares (param, valor) que ordenam a listagem por preço.
+# "page_size": (param, valor) para pedir o maior número de cards por página.
+PLATFORM_LISTING_PARAMS: Dict[str, Dict[str, object]] = {
+    "shopify": {
+        "asc": [("sort_by", "price-ascending")],
+        "desc": [("sort_by", "price-descending")],
+        "page_size": None,
+    },
+    "bigcommerce": {
+        "asc": [("sort", "priceasc")],
+        "desc": [("sort", "pricedesc")],
+        "page_size": ("limit", "100"),
+    },
+    "woocommerce": {
+        "asc": [("orderby", "price")],
+        "desc": [("orderby", "price-desc")],
+        "page_size": None,
+    },
+    "magento": {
+        "asc": [("product_list_order", "price"), ("product_list_dir", "asc")],
+        "desc": [("product_list_order", "price"), ("product_list_dir", "desc")],
+        "page_size": ("product_list_limit", "36"),
+    },
+}
+
+# Parâmetros genéricos de tamanho de página testados (na ordem) em domínios
+# sem regra configurada. O resultado de cada teste fica aprendido por domínio.
+PAGE_SIZE_CANDIDATES: List[Tuple[str, str]] = [
+    ("limit", "100"),
+    ("pageSize", "96"),
+    ("per_page", "96"),
+    ("product_list_limit", "36"),
+]
+
+# Chaves de query que indicam ordenação explícita escolhida na URL.
+SORT_QUERY_KEYS = {"sort_by", "sort", "orderby", "order", "product_list_order", "product_list_dir", "dir", "sortby"}
+
+# Padrões "soltos" reconhecidos em URLs de plataformas sem regra dedicada.
+ASC_URL_PATTERNS = (
+    "sort_by=price-ascending",
+    "sort_by=price_ascending",
+    "sort=price-asc",
+    "sort=price_asc",
+    "sort=priceasc",
+    "sort=price+asc",
+    "price-low-to-high",
+    "price_asc",
+    "product_list_dir=asc",
+)
+DESC_URL_PATTERNS = (
+    "sort_by=price-descending",
+    "sort_by=price_descending",
+    "sort=price-desc",
+    "sort=price_desc",
+    "sort=pricedesc",
+    "sort=price+desc",
+    "orderby=price-desc",
+    "price-high-to-low",
+    "price_desc",
+    "product_list_dir=desc",
+)
+
+
+def _query_pairs(url: str) -> List[Tuple[str, str]]:
+    try:
+        return parse_qsl(urlparse(url).query, keep_blank_values=True)
+    except Exception:
+        return []
+
+
+def detect_platform_hint(url: str) -> Optional[str]:
+    """Palpite de plataforma só pela URL (sem abrir a página)."""
+    u = (url or "").lower()
+    if "/collections/" in u or "sort_by=" in u:
+        return "shopify"
+    if "product_list_order=" in u or "product_list_limit=" in u:
+        return "magento"
+    if "/product-category/" in u or "orderby=" in u:
+        return "woocommerce"
+    if "/categories/" in u and ".php" in u:
+        return "bigcommerce"
+    return None
+
+
+def url_sort_hint(url: str, platform: Optional[str] = None) -> Optional[str]:
+    """
+    Retorna "asc", "desc" ou None conforme a ordenação por preço declarada na URL.
+    """
+    u = (url or "").lower()
+    if any(p in u for p in DESC_URL_PATTERNS):
+        return "desc"
+    if any(p in u for p in ASC_URL_PATTERNS):
+        return "asc"
+
+    pairs = {k.lower(): v.lower() for k, v in _query_pairs(u)}
+    platforms = [platform] if platform in PLATFORM_LISTING_PARAMS else list(PLATFORM_LISTING_PARAMS)
+    for name in platforms:
+        rules = PLATFORM_LISTING_PARAMS[name]
+        for direction in ("desc", "asc"):
+            wanted = rules[direction]
+            if wanted and all(pairs.get(k) == v for k, v in wanted):
+                return direction
+    return None
+
+
+def url_has_explicit_sort(url: str) -> bool:
+    return any(k.lower() in SORT_QUERY_KEYS for k, _ in _query_pairs(url))
+
+
+def _set_query_params(url: str, params: List[Tuple[str, str]]) -> str:
+    parsed = urlparse(url)
+    keys = {k for k, _ in params}
+    kept = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if k not in keys]
+    return urlunparse(parsed._replace(query=urlencode(kept + list(params), doseq=True)))
+
+
+def url_domain(url: str) -> str:
+    try:
+        host = (urlparse(url).netloc or "").lower()
+    except Exception:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+_configured_rules_cache: Dict[str, Any] = {"mtime": None, "domains": {}}
+
+
+def load_configured_rules() -> Dict[str, Dict[str, Any]]:
+    """
+    Lê as regras por domínio de config/listing_url_rules.json (recarrega se o arquivo mudar).
+
+    Formato: {"domains": {"loja.com": {"page_size": ["limit", "120"], "sort_asc": [["sort", "price_asc"]]}}}
+    """
+    try:
+        mtime = os.path.getmtime(LISTING_URL_RULES_FILE)
+    except OSError:
+        return {}
+    if _configured_rules_cache["mtime"] != mtime:
+        try:
+            with open(LISTING_URL_RULES_FILE, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            domains = raw.get("domains", {}) if isinstance(raw, dict) else {}
+        except Exception as e:
+            print(f"Erro lendo regras de URL de listagem ({LISTING_URL_RULES_FILE}): {e}")
+            domains = {}
+        _configured_rules_cache["mtime"] = mtime
+        _configured_rules_cache["domains"] = {
+            str(k).lower(): v for k, v in domains.items() if isinstance(v, dict)
+        }
+    return _configured_rules_cache["domains"]
+
+
+def load_learned_rules() -> Dict[str, Dict[str, Any]]:
+    """Regras aprendidas por domínio (LISTING_URL_LEARNED_FILE); {} se não existir ou estiver inválido."""
+    try:
+        with open(LISTING_URL_LEARNED_FILE, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Erro lendo regras aprendidas de listagem ({LISTING_URL_LEARNED_FILE}): {e}")
+        return {}
+    domains = raw.get("domains", {}) if isinstance(raw, dict) else {}
+    return {str(k).lower(): v for k, v in domains.items() if isinstance(v, dict)}
+
+
+def save_learned_rules(learned: Dict[str, Dict[str, Any]]) -> None:
+    folder = os.path.dirname(LISTING_URL_LEARNED_FILE)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = LISTING_URL_LEARNED_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"domains": learned}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, LISTING_URL_LEARNED_FILE)
+
+
+def _as_pair(value: Any) -> Optional[Tuple[str, str]]:
+    if isinstance(value, (list, tuple)) and len(value) == 2 and value[0]:
+        return str(value[0]), str(value[1])
+    return None
+
+
+def choose_page_size_param(
+    url: str,
+    platform: Optional[str],
+    learned: Dict[str, Dict[str, Any]],
+) -> Optional[Tuple[str, str]]:
+    """
+    Escolhe o parâmetro de tamanho de página para o domínio da URL.
+
+    Prioridade: regra configurada > regra aprendida como honrada > regra da
+    plataforma > próximo candidato genérico ainda não rejeitado no domínio.
+    """
+    domain = url_domain(url)
+    configured = load_configured_rules().get(domain, {})
+    if "page_size" in configured:
+        # "page_size": null desliga a reescrita para o domínio.
+        return _as_pair(configured["page_size"])
+
+    domain_learned = learned.get(domain, {})
+    honoured = _as_pair(domain_learned.get("honoured"))
+    if honoured:
+        return honoured
+
+    rejected = {tuple(p) for p in domain_learned.get("rejected", []) if _as_pair(p)}
+    rules = PLATFORM_LISTING_PARAMS.get(platform or "")
+    candidates: List[Tuple[str, str]] = []
+    if rules and rules["page_size"]:
+        candidates.append(rules["page_size"])
+    if LISTING_PAGE_SIZE_PROBE_ENABLED:
+        candidates.extend(PAGE_SIZE_CANDIDATES)
+    for pair in candidates:
+        if pair not in rejected:
+            return pair
+    return None
+
+
+def record_page_size_result(
+    learned: Dict[str, Dict[str, Any]],
+    url: str,
+    param: Tuple[str, str],
+    baseline_cards: int,
+    cards: int,
+) -> str:
+    """
+    Compara os cards da listagem original com os da reescrita e aprende se o
+    domínio honrou o parâmetro. Retorna "honoured", "rejected" ou "inconclusive".
+    """
+    domain = url_domain(url)
+    if not domain:
+        return "inconclusive"
+
+    entry = learned.setdefault(domain, {})
+    pair = [param[0], param[1]]
+    if cards > baseline_cards:
+        verdict = "honoured"
+        entry["honoured"] = pair
+    elif baseline_cards >= PAGE_SIZE_MIN_BASELINE_CARDS:
+        verdict = "rejected"
+        rejected = entry.setdefault("rejected", [])
+        if pair not in rejected:
+            rejected.append(pair)
+        if entry.get("honoured") == pair:
+            entry.pop("honoured", None)
+    else:
+        verdict = "inconclusive"
+
+    entry["last_check"] = {
+        "param": pair,
+        "baseline_cards": baseline_cards,
+        "cards": cards,
+        "verdict": verdict,
+        "checked_at": int(time.time()),
+    }
+    return verdict
+
+
+def rewrite_listing_url(
+    url: str,
+    platform: Optional[str],
+    sort_ascending: bool = True,
+    page_size: Optional[Tuple[str, str]] = None,
+) -> str:
+    """
+    Reescreve a URL da listagem para ordenar por preço crescente e/ou pedir o
+    tamanho de página informado (ver choose_page_size_param).
+
+    Não mexe na ordenação quando a URL já define uma ordenação explícita
+    (o fornecedor pode ter sido cadastrado com um filtro proposital).
+    """
+    if not (url or "").startswith("http"):
+        return url
+
+    params: List[Tuple[str, str]] = []
+    if sort_ascending and not url_has_explicit_sort(url):
+        configured_sort = load_configured_rules().get(url_domain(url), {}).get("sort_asc")
+        if isinstance(configured_sort, list):
+            params.extend(p for p in (_as_pair(x) for x in configured_sort) if p)
+        else:
+            rules = PLATFORM_LISTING_PARAMS.get(platform or "")
+            if rules:
+                params.extend(rules["asc"])
+    if page_size:
+        params.append(page_size)
+
+    if not params:
+        return url
+    return _set_query_params(url, params)
+
+
+def prefetch_listing_url(url: str, learned: Dict[str, Dict[str, Any]]) -> str:
+    """
+    URL da primeira listagem para pré-carregar em segundo plano.
+
+    Já vem reescrita quando o tamanho de página do domínio está decidido
+    (configurado, aprendido como honrado ou sem candidato). Se ainda falta
+    testar um candidato, volta a URL original: os cards dela são a base
+    para validar o tamanho (ver record_page_size_result).
+    """
+    platform = detect_platform_hint(url)
+    domain = url_domain(url)
+    configured = load_configured_rules().get(domain, {})
+    if "page_size" in configured:
+        page_size = _as_pair(configured["page_size"])
+    else:
+        page_size = _as_pair(learned.get(domain, {}).get("honoured"))
+        if page_size is None and choose_page_size_param(url, platform, learned) is not None:
+            return url
+    return rewrite_listing_url(url, platform, page_size=page_size)
@@ -0,0 +1,84 @@
+import os
+from typing import Iterable, List, Optional
+
+PRICE_SORT_MIN_SAMPLES = int(os.getenv("PRICE_SORT_MIN_SAMPLES", "6"))
+PRICE_SORT_MIN_SAMPLES_NO_HINT = int(os.getenv("PRICE_SORT_MIN_SAMPLES_NO_HINT", "12"))
+PRICE_SORT_MIN_RATIO = float(os.getenv("PRICE_SORT_MIN_RATIO", "0.95"))
+PRICE_CEILING_TAIL_ITEMS = int(os.getenv("PRICE_CEILING_TAIL_ITEMS", "3"))
+
+
+class PriceSortDetector:
+    """
+    Descobre a ordenação da listagem a partir dos preços observados, na ordem
+    em que aparecem, ao longo das páginas do fornecedor.
+
+    A ordenação declarada na URL (url_sort_hint) é só uma dica: a URL pode ter
+    sido reescrita por nós e o site ignorar o parâmetro. Com dica bastam menos
+    amostras, mas a exigência de monotonicidade (PRICE_SORT_MIN_RATIO) é a
+    mesma; sem dica só aceitamos "asc"/"desc" com muitas amostras.
+    """
+
+    def __init__(self):
+        self.hint: Optional[str] = None
+        self.prices: List[float] = []
+        self.non_decreasing = 0
+        self.non_increasing = 0
+
+    def reset(self) -> None:
+        self.hint = None
+        self.prices = []
+        self.non_decreasing = 0
+        self.non_increasing = 0
+
+    def set_hint(self, hint: Optional[str]) -> None:
+        if hint != self.hint:
+            # Mudou a ordenação declarada (ex.: URL reescrita): evidência anterior não vale.
+            self.reset()
+            self.hint = hint
+
+    def observe(self, prices: Iterable[Optional[float]]) -> None:
+        """Registra preços de uma passada da listagem (itens sem preço são ignorados)."""
+        for value in prices:
+            if value is None or value <= 0:
+                continue
+            if self.prices:
+                last = self.prices[-1]
+                if value >= last:
+                    self.non_decreasing += 1
+                if value <= last:
+                    self.non_increasing += 1
+            self.prices.append(float(value))
+
+    @property
+    def pairs(self) -> int:
+        return max(0, len(self.prices) - 1)
+
+    @property
+    def order(self) -> str:
+        """Retorna "asc", "desc", "unsorted" ou "unknown" (pouca evidência)."""
+        pairs = self.pairs
+        if self.hint in {"asc", "desc"}:
+            if len(self.prices) < PRICE_SORT_MIN_SAMPLES:
+                return "unknown"
+            hits = self.non_decreasing if self.hint == "asc" else self.non_increasing
+            # A dica só vale depois que os preços da página a confirmam.
+            return self.hint if hits / max(1, pairs) >= PRICE_SORT_MIN_RATIO else "unsorted"
+
+        if len(self.prices) < PRICE_SORT_MIN_SAMPLES_NO_HINT:
+            return "unknown"
+        if self.non_decreasing / max(1, pairs) >= PRICE_SORT_MIN_RATIO:
+            return "asc"
+        if self.non_increasing / max(1, pairs) >= PRICE_SORT_MIN_RATIO:
+            return "desc"
+        return "unsorted"
+
+    def past_ceiling(self, price_limit: float) -> bool:
+        """
+        True quando a listagem está comprovadamente em ordem crescente e os
+        últimos PRICE_CEILING_TAIL_ITEMS preços lidos já passaram do teto:
+        tudo o que vier depois também estará acima.
+        """
+        if price_limit <= 0 or self.order != "asc":
+            return False
+        tail = self.prices[-max(1, PRICE_CEILING_TAIL_ITEMS):]
+        return len(tail) >= max(1, PRICE_CEILING_TAIL_ITEMS) and all(p > price_limit for p in tail)
@@ -1,9 +1,26 @@
 import csv
 import io
+import json
+import os
+import threading
 import requests
 import time
 
-SHEET_EXPORT_URL = "https://docs.google.com/spreadsheets/d/1bjPtkfDmagCFDx9xTwcBh_LUzThH_cEqtbCa1dQ-PnQ/export?format=csv&gid=0"
+SHEET_EXPORT_URL = os.getenv(
+    "SUPPLIER_SHEET_URL",
+    "https://docs.google.com/spreadsheets/d/1bjPtkfDmagCFDx9xTwcBh_LUzThH_cEqtbCa1dQ-PnQ/export?format=csv&gid=0",
+)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUPPLIER_SHEET_CACHE_FILE = os.getenv(
+    "SUPPLIER_SHEET_CACHE_FILE",
+    os.path.join(BASE_DIR, "state", "supplier_sheet_cache.json"),
+)
+# Até essa idade o índice local é usado sem nenhuma requisição.
+SUPPLIER_SHEET_MAX_AGE_SECONDS = int(os.getenv("SUPPLIER_SHEET_MAX_AGE_SECONDS", "60"))
+# Intervalo da atualização em segundo plano (0 desliga).
+SUPPLIER_SHEET_REFRESH_SECONDS = int(os.getenv("SUPPLIER_SHEET_REFRESH_SECONDS", "120"))
+# Se a planilha ficar inacessível, o último índice bom vale até essa idade.
+SUPPLIER_SHEET_STALE_MAX_SECONDS = int(os.getenv("SUPPLIER_SHEET_STALE_MAX_SECONDS", "3600"))
 
 
 class SupplierSheetError(RuntimeError):
@@ -11,9 +28,199 @@ class SupplierSheetError(RuntimeError):
     pass
 
 
-def get_next_supplier(start_index="", skip_indices=None, max_retries=3, timeout_seconds=20):
+class SupplierIndex:
     """
-    Baixa o CSV público e retorna o próximo fornecedor válido.
+    Índice da planilha montado uma vez por versão do CSV.
+
+    rows: [(indice, link)] na ordem da planilha.
+    position: indice -> posição da primeira linha com esse INDICE.
+    next_valid[i]: posição da próxima linha (>= i) com link http, ou len(rows).
+    """
+
+    def __init__(self, csv_text):
+        self.rows = []
+        for row in csv.DictReader(io.StringIO(csv_text)):
+            indice = (row.get("INDICE") or "").strip()
+            link = (row.get("LINKS DO FORNECEDORES") or "").strip()
+            self.rows.append((indice, link))
+
+        self.position = {}
+        for pos, (indice, _link) in enumerate(self.rows):
+            self.position.setdefault(indice, pos)
+
+        total = len(self.rows)
+        self.next_valid = [total] * (total + 1)
+        for pos in range(total - 1, -1, -1):
+            link = self.rows[pos][1]
+            self.next_valid[pos] = pos if link.startswith("http") else self.next_valid[pos + 1]
+
+    def next_supplier(self, start_index="", skip_set=()):
+        start_index_clean = (start_index or "").strip()
+        total = len(self.rows)
+        if start_index_clean:
+            pos = self.position.get(start_index_clean)
+            if pos is None:
+                return None
+            # Força o índice inicial uma vez (mesmo se estiver em skip),
+            # para garantir fluxo sequencial N -> N+1.
+            if self.next_valid[pos] == pos:
+                indice, link = self.rows[pos]
+                return {"indice": indice, "url": link}
+            pos += 1
+        else:
+            pos = 0
+
+        pos = self.next_valid[pos]
+        while pos < total:
+            indice, link = self.rows[pos]
+            if indice not in skip_set:
+                return {"indice": indice, "url": link}
+            pos = self.next_valid[pos + 1]
+        return None
+
+
+class SupplierSheetCache:
+    """
+    Cache do CSV da planilha com requisição condicional (ETag / Last-Modified).
+
+    O corpo e os validadores ficam em disco para sobreviver a reinícios; o
+    índice parseado fica em memória e só é refeito quando o servidor manda
+    um CSV novo (status 200).
+    """
+
+    def __init__(self, url=SHEET_EXPORT_URL, cache_file=SUPPLIER_SHEET_CACHE_FILE):
+        self.url = url
+        self.cache_file = cache_file
+        self.etag = None
+        self.last_modified = None
+        self.fetched_at = 0.0
+        self.index = None
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._load_from_disk()
+
+    def _load_from_disk(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("url") != self.url:
+                return
+            self.index = SupplierIndex(data.get("body", ""))
+            self.etag = data.get("etag")
+            self.last_modified = data.get("last_modified")
+            self.fetched_at = float(data.get("fetched_at") or 0)
+        except Exception as e:
+            print(f"Cache da planilha ignorado ({self.cache_file}): {e}")
+
+    def _save_to_disk(self, body):
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_path = self.cache_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "url": self.url,
+                    "etag": self.etag,
+                    "last_modified": self.last_modified,
+                    "fetched_at": self.fetched_at,
+                    "body": body,
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except Exception as e:
+            print(f"Erro salvando cache da planilha: {e}")
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at if self.index is not None else float("inf")
+
+    def refresh(self, timeout_seconds=20):
+        """
+        Revalida o CSV no servidor. Retorna True se o conteúdo mudou.
+        Exceções de rede/HTTP sobem para o chamador.
+        """
+        headers = {}
+        if self.index is not None:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+
+        r = requests.get(self.url, headers=headers, timeout=timeout_seconds)
+        if r.status_code == 304 and self.index is not None:
+            with self._lock:
+                self.fetched_at = time.time()
+            return False
+
+        r.raise_for_status()
+        r.encoding = "utf-8"
+        body = r.text
+        index = SupplierIndex(body)
+        with self._lock:
+            self.index = index
+            self.etag = r.headers.get("ETag")
+            self.last_modified = r.headers.get("Last-Modified")
+            self.fetched_at = time.time()
+        self._save_to_disk(body)
+        return True
+
+    def get_index(self, max_retries=3, timeout_seconds=20, max_age=SUPPLIER_SHEET_MAX_AGE_SECONDS):
+        if self.age <= max_age:
+            return self.index
+
+        last_error = None
+        for attempt in range(1, max_retries + 1):
+            try:
+                self.refresh(timeout_seconds=timeout_seconds)
+                return self.index
+            except Exception as e:
+                last_error = e
+                if attempt < max_retries:
+                    print(f"Erro ao acessar Google Sheets (tentativa {attempt}/{max_retries}): {e}")
+                    time.sleep(min(10, attempt * 2))
+
+        if self.age <= SUPPLIER_SHEET_STALE_MAX_SECONDS:
+            print(f"Google Sheets inacessível ({last_error}). Usando índice local de {int(self.age)}s atrás.")
+            return self.index
+        raise SupplierSheetError(f"Falha ao acessar Google Sheets após {max_retries} tentativas: {last_error}")
+
+    def start_background_refresh(self, interval_seconds=SUPPLIER_SHEET_REFRESH_SECONDS):
+        if interval_seconds <= 0:
+            return
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+
+        def _loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Atualização em segundo plano da planilha falhou: {e}")
+
+        self._refresh_thread = threading.Thread(target=_loop, name="supplier-sheet-refresh", daemon=True)
+        self._refresh_thread.start()
+
+
+_sheet_cache = None
+
+
+def get_sheet_cache():
+    global _sheet_cache
+    if _sheet_cache is None or _sheet_cache.url != SHEET_EXPORT_URL:
+        _sheet_cache = SupplierSheetCache(SHEET_EXPORT_URL)
+    return _sheet_cache
+
+
+def get_next_supplier(start_index="", skip_indices=None, max_retries=3, timeout_seconds=20, max_age=None):
+    """
+    Retorna o próximo fornecedor válido usando o índice local da planilha.
+
+    O CSV só é baixado de novo quando o índice passa de
+    SUPPLIER_SHEET_MAX_AGE_SECONDS (ou max_age), e mesmo assim com
+    requisição condicional; max_age=0 força a revalidação.
 
     Retorna:
       - dict {"indice": ..., "url": ...} quando encontra o próximo fornecedor
@@ -23,49 +230,13 @@ def get_next_supplier(start_index="", skip_indices=None, max_retries=3, timeout_
     """
     if skip_indices is None:
         skip_indices = []
-
-    start_index_clean = (start_index or "").strip()
     skip_set = {str(x).strip() for x in skip_indices if str(x).strip()}
-    last_error = None
-
-    for attempt in range(1, max_retries + 1):
-        try:
-            r = requests.get(SHEET_EXPORT_URL, timeout=timeout_seconds)
-            r.raise_for_status()
-            r.encoding = "utf-8"
-
-            csv_reader = csv.DictReader(io.StringIO(r.text))
-
-            # If a start index is provided, we skip until we find it
-            found_start = False if start_index_clean else True
-
-            for row in csv_reader:
-                indice = (row.get("INDICE") or "").strip()
-                link = (row.get("LINKS DO FORNECEDORES") or "").strip()
-
-                is_explicit_start = False
-                if not found_start:
-                    if indice == start_index_clean:
-                        found_start = True
-                        # Força o índice inicial uma vez (mesmo se estiver em skip),
-                        # para garantir fluxo sequencial N -> N+1.
-                        is_explicit_start = True
-                    else:
-                        continue  # Skip until we reach the starting index
-
-                if not is_explicit_start and indice in skip_set:
-                    continue
-
-                if link and link.startswith("http"):
-                    return {
-                        "indice": indice,
-                        "url": link,
-                    }
-            return None
-        except Exception as e:
-            last_error = e
-            if attempt < max_retries:
-                print(f"Erro ao acessar Google Sheets (tentativa {attempt}/{max_retries}): {e}")
-                time.sleep(min(10, attempt * 2))
 
-    raise SupplierSheetError(f"Falha ao acessar Google Sheets após {max_retries} tentativas: {last_error}")
+    cache = get_sheet_cache()
+    index = cache.get_index(
+        max_retries=max_retries,
+        timeout_seconds=timeout_seconds,
+        max_age=SUPPLIER_SHEET_MAX_AGE_SECONDS if max_age is None else max_age,
+    )
+    cache.start_background_refresh()
+    return index.next_supplier(start_index=start_index, skip_set=skip_set)
@@ -24,6 +24,8 @@ def load_state():
         "domain_fail_counts": {},   # Falhas agregadas por domínio
         "quarantined_links": {},    # URL -> unix timestamp (fim quarentena)
         "quarantined_domains": {},  # domínio -> unix timestamp (fim quarentena)
+        "pending_exports": [],      # Lotes entregues ao worker de exportação e ainda sem arquivo gerado
+        "supplier_stats": {},       # INDICE -> histórico (itens/segundos, última varredura, backoff de adiamento)
     }
 
 def save_state(state):
@@ -1,7 +1,7 @@
 import asyncio
 import os
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 LOAD_MORE_WAIT_SECONDS = float(os.getenv("LOAD_MORE_WAIT_SECONDS", "2.0"))
@@ -57,15 +57,28 @@ def normalize_product_url(url: str) -> str:
     except Exception:
         return raw.split("#")[0].strip()
 
-async def fetch_product_links_from_page(page) -> List[Dict]:
-    """Extrai links de produtos baseados em heurísticas comuns em sites B2B/fornecedores."""
+async def fetch_product_links_from_page(page, incremental: bool = False) -> List[Dict]:
+    """Extrai links de produtos baseados em heurísticas comuns em sites B2B/fornecedores.
+
+    Com incremental=True retorna só os cards anexados desde a chamada anterior
+    na mesma página (load more / scroll infinito). O cursor fica no próprio
+    documento: um Set em window.__fbaHarvest e o atributo data-fba-harvested
+    nos links já lidos. Uma navegação nova zera o cursor naturalmente.
+    """
     
     # 1. Tentar pegar cards genéricos
     links = []
     
     js_extract = """
-    () => {
+    (incremental) => {
         const results = [];
+        const MARK = 'data-fba-harvested';
+        let harvest = window.__fbaHarvest;
+        if (!incremental || !harvest) {
+            harvest = window.__fbaHarvest = {seen: new Set(), selector: null};
+            document.querySelectorAll('[' + MARK + ']').forEach(el => el.removeAttribute(MARK));
+        }
+        const seen = harvest.seen;
         const selectors = [
             '.product-item a', '.product-card a', 'li.item a',
             '.grid-item a', '.product a', 'article a', 'a.product-link'
@@ -128,38 +141,68 @@ async def fetch_product_links_from_page(page) -> List[Dict]:
             return "";
         }
 
-        for (const sel of selectors) {
+        function harvestSelector(sel) {
             document.querySelectorAll(sel).forEach(el => {
+                if (el.hasAttribute(MARK)) return;
+                el.setAttribute(MARK, '1');
                 if (!el.href || isActionUrl(el.href)) return;
-                if (results.find(x => x.url === el.href)) return;
+                if (seen.has(el.href)) return;
 
                 const card = el.closest('.product-item, .product-card, li.item, .grid-item, .product, article');
 
                 if (card && isOutOfStock(card)) return;
+                seen.add(el.href);
 
                 const priceText = extractPrice(card);
                 results.push({url: el.href, price_text: priceText});
             });
-            if (results.length > 0) break;
         }
 
-        if(results.length === 0) {
+        function harvestFallback() {
            document.querySelectorAll('a[href]').forEach(el => {
+                if (el.hasAttribute(MARK)) return;
                 if (isActionUrl(el.href)) return;
                 const href = el.href.toLowerCase();
                 if(href.includes('/product/') || href.includes('/p/') || href.includes('/item/')) {
+                    el.setAttribute(MARK, '1');
+                    if (seen.has(el.href)) return;
                     const container = el.parentElement || el;
                     if (!isOutOfStock(container)) {
+                        seen.add(el.href);
                         results.push({url: el.href, price_text: ""});
                     }
                 }
            });
         }
+
+        // Mantém o seletor escolhido na primeira passada para que as passadas
+        // incrementais leiam sempre o mesmo tipo de card.
+        if (harvest.selector === '__fallback__') {
+            harvestFallback();
+            return results;
+        }
+        if (harvest.selector) {
+            harvestSelector(harvest.selector);
+            return results;
+        }
+
+        for (const sel of selectors) {
+            harvestSelector(sel);
+            if (seen.size > 0) {
+                harvest.selector = sel;
+                break;
+            }
+        }
+
+        if(seen.size === 0) {
+           harvestFallback();
+           if (seen.size > 0) harvest.selector = '__fallback__';
+        }
         return results;
     }
     """
     try:
-        raw_links = await page.evaluate(js_extract)
+        raw_links = await page.evaluate(js_extract, incremental)
         # Filter duplicates and base URLs
         seen = set()
         for item in raw_links:
@@ -172,6 +215,42 @@ async def fetch_product_links_from_page(page) -> List[Dict]:
         
     return links
 
+async def count_listing_cards(page) -> int:
+    """Conta os cards de produto presentes no DOM (usado para validar o tamanho de página)."""
+    js_count = """
+    () => {
+        const cards = new Set();
+        document.querySelectorAll('.product-item, .product-card, li.item, .grid-item, .product, article, a.product-link').forEach(el => {
+            if (el.matches('a') ? el.href : el.querySelector('a[href]')) cards.add(el);
+        });
+        return cards.size;
+    }
+    """
+    try:
+        return int(await page.evaluate(js_count) or 0)
+    except Exception as e:
+        print(f"Erro contando cards da listagem: {e}")
+        return 0
+
+async def detect_listing_platform(page) -> Optional[str]:
+    """Identifica a plataforma da loja (shopify, bigcommerce, woocommerce, magento) pelo DOM/JS global."""
+    js_detect = """
+    () => {
+        if (window.Shopify || document.querySelector('link[href*="cdn.shopify.com"], script[src*="cdn.shopify.com"]')) return 'shopify';
+        if (window.BCData || window.stencilBootstrap || document.querySelector('script[src*="bigcommerce.com"], [data-product-price-without-tax]')) return 'bigcommerce';
+        const body = document.body;
+        if (body && (body.classList.contains('woocommerce') || body.classList.contains('woocommerce-page'))) return 'woocommerce';
+        if (document.querySelector('link[href*="woocommerce"], script[src*="woocommerce"]')) return 'woocommerce';
+        if (document.querySelector('script[type="text/x-magento-init"], [data-mage-init]') || (window.require && window.require.s && window.require.s.contexts && window.require.s.contexts._ && String(window.require.s.contexts._.config.baseUrl || '').includes('/static/'))) return 'magento';
+        return null;
+    }
+    """
+    try:
+        return await page.evaluate(js_detect)
+    except Exception as e:
+        print(f"Erro detectando plataforma da listagem: {e}")
+        return None
+
 async def find_next_page(page) -> str:
     """Procura por botões de NEXT ou '>' e clica. Se mudou de URL, retorna a nova.
     Também tenta clicar em 'Show More' ou dar scroll. Se isso carregar itens novos, retorna 'SAME_PAGE'.
@@ -242,41 +321,162 @@ async def find_next_page(page) -> str:
             return nxt_href
     except:
         pass
-        
+
     return None
 
-def parse_price_details(price_text: str) -> Dict[str, Any]:
-    raw = (price_text or "").strip()
+
+async def listing_has_more(page) -> bool:
+    """
+    Verifica, sem clicar nem rolar, se a listagem mostra "Load More" visível
+    ou link de próxima página (mesmos textos de find_next_page). Scroll
+    infinito não é detectável assim: nesse caso a resposta é False.
+    """
+    js_has_more = """
+    () => {
+        const moreTexts = ['show more', 'load more', 'carregar mais', 'mostrar mais', 'view more', 'show more products'];
+        for (let el of document.querySelectorAll('button, a, span, div.btn')) {
+            const t = (el.innerText || "").toLowerCase().trim();
+            if (moreTexts.some(target => t.includes(target)) && el.offsetWidth > 0 && el.offsetHeight > 0) {
+                return true;
+            }
+        }
+        const nextTexts = ['next', 'próxima', '>>', '>', 'next page'];
+        for (let a of document.querySelectorAll('a')) {
+            const t = (a.innerText || "").toLowerCase().trim();
+            if (nextTexts.includes(t) && a.href && a.href !== location.href) return true;
+        }
+        const nextClass = document.querySelector('.next, .pagination-next, [rel="next"]');
+        return !!(nextClass && nextClass.href && nextClass.href !== location.href);
+    }
+    """
+    try:
+        return bool(await page.evaluate(js_has_more))
+    except Exception:
+        # Na dúvida, assume que há mais páginas (o prefetch só sai no fim do fornecedor).
+        return True
+
+PRICE_INQUIRY_TOKENS = ("contact", "sob consulta", "call for price", "request quote")
+
+# Valor monetário: símbolo/código opcional + número com separadores de milhar/decimal,
+# ou só a parte decimal ("$.99", ",50").
+PRICE_AMOUNT_RE = re.compile(
+    r"(?P<cur>US\$|R\$|C\$|A\$|[$€£¥]|\b(?:USD|EUR|GBP|CAD|AUD|BRL)\b)?\s*"
+    r"(?P<num>\d+(?:[.,]\d+)*|[.,]\d+)"
+    r"(?P<pct>\s*%)?",
+    re.I,
+)
+# Marcadores de preço de referência (riscado/"de") que não são o preço atual.
+PRICE_REFERENCE_RE = re.compile(
+    r"(?<![a-z])(?:was|reg(?:ular)?\.?|msrp|list|compare\s+at|original(?:ly)?|retail|de)"
+    r"(?:\s*price)?\s*:?\s*$",
+    re.I,
+)
+# Valor de economia ("Save $5.00", "You save $3.00", "$5 off"): não é preço.
+PRICE_SAVINGS_PREFIX_RE = re.compile(r"(?<![a-z])(?:you\s+save|save|savings)\s*:?\s*$", re.I)
+PRICE_SAVINGS_SUFFIX_RE = re.compile(r"^\s*off\b", re.I)
+# Separador de faixa entre dois valores ("$4.99 – $9.99", "4.99 to 9.99").
+PRICE_RANGE_SEP_RE = re.compile(r"^\s*(?:-|–|—|to|a|até)\s*$", re.I)
+
+
+def _price_number_to_float(num: str) -> float:
+    if num[0] in ".,":
+        # Sem parte inteira: o separador é sempre decimal (".99" -> 0.99).
+        return float("." + num[1:])
+    if "," in num and "." in num:
+        # Usa o último separador como decimal.
+        if num.rfind(",") > num.rfind("."):
+            return float(num.replace(".", "").replace(",", "."))
+        return float(num.replace(",", ""))
+    sep = "," if "," in num else "."
+    parts = num.split(sep)
+    if len(parts) == 1:
+        return float(num)
+    # Ponto e vírgula valem igual: "1,299" / "R$ 1.299" / "1.299.000" -> milhar;
+    # "12,99" / "12.99" / "0.125" -> decimal.
+    if len(parts) > 2 or (len(parts[1]) == 3 and len(parts[0]) <= 3 and parts[0] != "0"):
+        return float(num.replace(sep, ""))
+    return float(num.replace(sep, "."))
+
+
+def _parse_price_text(raw: str) -> Tuple[Optional[float], str, Dict[str, Any]]:
+    """Núcleo do parse: retorna (valor, status, extras) para um texto já com strip()."""
     if not raw:
-        return {"value": None, "status": "missing", "raw": raw}
+        return None, "missing", {}
 
     text = raw.lower()
-    if any(token in text for token in ("contact", "sob consulta", "call for price", "request quote")):
-        return {"value": None, "status": "inquiry", "raw": raw}
+    if any(token in text for token in PRICE_INQUIRY_TOKENS):
+        return None, "inquiry", {}
 
-    # Mantém apenas números, ponto e vírgula para tentar parse robusto.
-    number_match = re.search(r"[\d\.,]+", raw)
-    if not number_match:
-        return {"value": None, "status": "invalid_format", "raw": raw}
+    amounts = []
+    for match in PRICE_AMOUNT_RE.finditer(raw):
+        if match.group("pct"):
+            continue  # "Save 20%"
+        prefix = raw[:match.start()]
+        if PRICE_SAVINGS_PREFIX_RE.search(prefix[-16:]) or PRICE_SAVINGS_SUFFIX_RE.match(raw[match.end():]):
+            continue  # "Save $5.00", "$3 off"
+        try:
+            value = _price_number_to_float(match.group("num"))
+        except (TypeError, ValueError):
+            return None, "parse_error", {}
+        amounts.append({
+            "value": value,
+            "currency": match.group("cur") or "",
+            "reference": bool(PRICE_REFERENCE_RE.search(prefix[-16:])),
+            "start": match.start(),
+            "end": match.end(),
+        })
 
-    candidate = number_match.group(0).strip()
-    if "," in candidate and "." in candidate:
-        # Usa o último separador como decimal.
-        if candidate.rfind(",") > candidate.rfind("."):
-            candidate = candidate.replace(".", "").replace(",", ".")
-        else:
-            candidate = candidate.replace(",", "")
-    elif "," in candidate:
-        candidate = candidate.replace(",", ".")
+    if not amounts:
+        return None, "invalid_format", {}
 
-    try:
-        value = float(candidate)
-    except (TypeError, ValueError):
-        return {"value": None, "status": "parse_error", "raw": raw}
+    # Com símbolo de moeda presente, números soltos (quantidades, "2 for") não são preço.
+    if any(a["currency"] for a in amounts):
+        amounts = [a for a in amounts if a["currency"]]
+
+    kind = "single"
+    if len(amounts) == 2 and PRICE_RANGE_SEP_RE.match(raw[amounts[0]["end"]:amounts[1]["start"]]):
+        kind = "range"
+    elif len(amounts) > 1:
+        kind = "sale"
 
+    current = [a for a in amounts if not a["reference"]] or amounts
+    # Faixa -> menor valor; riscado + promoção -> menor valor atual.
+    value = min(a["value"] for a in current)
+    extras = {
+        "max": max(a["value"] for a in amounts),
+        "kind": kind,
+        "currency": next((a["currency"] for a in current if a["currency"]), ""),
+    }
     if value == 0:
-        return {"value": 0.0, "status": "zero", "raw": raw}
-    return {"value": value, "status": "ok", "raw": raw}
+        return 0.0, "zero", extras
+    return value, "ok", extras
+
+
+def parse_price_details(price_text: str) -> Dict[str, Any]:
+    raw = (price_text or "").strip()
+    value, status, extras = _parse_price_text(raw)
+    return {"value": value, "status": status, "raw": raw, **extras}
+
+
+def parse_price_batch(price_texts: List[str]) -> Tuple[List[Optional[float]], List[str]]:
+    """
+    Parse em lote dos textos de preço de uma listagem.
+
+    Retorna (valores, status) na mesma ordem da entrada. Textos repetidos
+    (comuns em grids de produto) são parseados uma única vez.
+    """
+    memo: Dict[str, Tuple[Optional[float], str]] = {}
+    values: List[Optional[float]] = []
+    statuses: List[str] = []
+    for text in price_texts:
+        raw = (text or "").strip()
+        parsed = memo.get(raw)
+        if parsed is None:
+            value, status, _ = _parse_price_text(raw)
+            parsed = memo[raw] = (value, status)
+        values.append(parsed[0])
+        statuses.append(parsed[1])
+    return values, statuses
 
 
 def parse_price(price_text: str) -> float:
@@ -0,0 +1,244 @@
+import heapq
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from automation.sheets import get_sheet_cache
+
+# Ordem de atendimento dos fornecedores pendentes:
+#   "sheet": ordem da planilha a partir de start_index (comportamento original)
+#   "yield": maior histórico de UPCs/hora primeiro (fornecedor > domínio > média)
+#   "age":   última varredura mais antiga primeiro (nunca varrido = primeiro)
+SUPPLIER_ORDERING = os.getenv("SUPPLIER_ORDERING", "sheet").strip().lower()
+# Backoff de fornecedores adiados (ex.: timeout de CAPTCHA): base * 2^(adiamentos-1), até o teto.
+SUPPLIER_DEFER_BACKOFF_SECONDS = int(os.getenv("SUPPLIER_DEFER_BACKOFF_SECONDS", "600"))
+SUPPLIER_DEFER_BACKOFF_MAX_SECONDS = int(os.getenv("SUPPLIER_DEFER_BACKOFF_MAX_SECONDS", "21600"))
+# Depois de tantos adiamentos o fornecedor é dado como concluído (0 = sem limite).
+SUPPLIER_MAX_DEFERRALS = int(os.getenv("SUPPLIER_MAX_DEFERRALS", "4"))
+
+SUPPLIER_ORDERINGS = ("sheet", "yield", "age")
+
+
+def _domain(url: str) -> str:
+    try:
+        host = (urlparse(url).netloc or "").lower()
+    except Exception:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def _index_int(indice: str) -> Optional[int]:
+    try:
+        return int(str(indice).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+class SupplierQueue:
+    """
+    Fila de fornecedores apoiada no estado (automation_state.json).
+
+    processed_suppliers_indices / deferred_suppliers_indices continuam sendo
+    a fonte de verdade no estado; aqui viram sets para claim/complete O(1).
+    supplier_stats guarda por INDICE: domínio, segundos e itens capturados,
+    última varredura, adiamentos e retry_at (fim do backoff).
+
+    first_index/last_index são a faixa pedida para a execução (--start-index /
+    --end-index). Em "yield"/"age" o heap só recebe fornecedores dessa faixa;
+    o start_index do estado anda N -> N+1 e só vale para a ordem "sheet".
+    """
+
+    def __init__(
+        self,
+        state: Dict[str, Any],
+        ordering: str = SUPPLIER_ORDERING,
+        first_index: Optional[str] = None,
+        last_index: Optional[str] = None,
+    ):
+        self.state = state
+        self.ordering = ordering if ordering in SUPPLIER_ORDERINGS else "sheet"
+        self.first_index = str(first_index or "").strip()
+        self.last_index = _index_int(last_index) if last_index not in (None, "") else None
+        state.setdefault("processed_suppliers_indices", [])
+        state.setdefault("deferred_suppliers_indices", [])
+        self.stats: Dict[str, Dict[str, Any]] = state.setdefault("supplier_stats", {})
+        self.processed = {str(x).strip() for x in state["processed_suppliers_indices"] if str(x).strip()}
+        self.deferred = {str(x).strip() for x in state["deferred_suppliers_indices"] if str(x).strip()}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._heap_key = None
+
+    # ------------------------------------------------------------------ estado
+
+    def complete(self, indice: str, captured: int = 0, seconds: float = 0.0, url: str = "") -> None:
+        """Registra o resultado do ciclo e marca o fornecedor como concluído."""
+        indice = str(indice).strip()
+        self._record(indice, captured, seconds, url)
+        if indice and indice not in self.processed:
+            self.processed.add(indice)
+            self.state["processed_suppliers_indices"].append(indice)
+        if indice in self.deferred:
+            self.deferred.discard(indice)
+            self.state["deferred_suppliers_indices"] = [
+                x for x in self.state["deferred_suppliers_indices"] if str(x).strip() != indice
+            ]
+
+    def defer(self, indice: str, captured: int = 0, seconds: float = 0.0, url: str = "") -> Optional[int]:
+        """
+        Adia o fornecedor com backoff exponencial. Retorna o retry_at (unix),
+        ou None quando o limite de adiamentos foi atingido e o fornecedor
+        passou a concluído.
+        """
+        indice = str(indice).strip()
+        entry = self._record(indice, captured, seconds, url)
+        entry["deferrals"] = entry.get("deferrals", 0) + 1
+        if SUPPLIER_MAX_DEFERRALS > 0 and entry["deferrals"] >= SUPPLIER_MAX_DEFERRALS:
+            entry["gave_up"] = True
+            self.complete(indice)
+            return None
+        delay = min(
+            SUPPLIER_DEFER_BACKOFF_MAX_SECONDS,
+            SUPPLIER_DEFER_BACKOFF_SECONDS * (2 ** (entry["deferrals"] - 1)),
+        )
+        entry["retry_at"] = int(time.time() + delay)
+        if indice and indice not in self.deferred:
+            self.deferred.add(indice)
+            self.state["deferred_suppliers_indices"].append(indice)
+        return entry["retry_at"]
+
+    def _record(self, indice: str, captured: int, seconds: float, url: str) -> Dict[str, Any]:
+        entry = self.stats.setdefault(indice, {})
+        if url:
+            entry["domain"] = _domain(url)
+        entry["captured"] = entry.get("captured", 0) + max(0, int(captured))
+        entry["seconds"] = round(entry.get("seconds", 0.0) + max(0.0, float(seconds)), 1)
+        entry["last_crawled_at"] = int(time.time())
+        self._heap_key = None
+        return entry
+
+    # ---------------------------------------------------------------- seleção
+
+    def _deferred_ready(self, indice: str, now: float) -> bool:
+        return self.stats.get(indice, {}).get("retry_at", 0) <= now
+
+    def next_retry_in(self) -> Optional[float]:
+        """
+        Segundos até o próximo adiado ficar elegível (None se não há adiados
+        que ainda existam na planilha com link válido).
+        """
+        index = get_sheet_cache().index
+        pending = [
+            i for i in self.deferred
+            if i not in self.processed and index is not None and i in index.position
+            and index.next_valid[index.position[i]] == index.position[i]
+        ]
+        if not pending:
+            return None
+        now = time.time()
+        return max(0.0, min(self.stats.get(i, {}).get("retry_at", 0) for i in pending) - now)
+
+    def _yield_score(self, indice: str, url: str, domain_yield: Dict[str, float], prior: float) -> float:
+        entry = self.stats.get(indice, {})
+        if entry.get("seconds", 0) > 0:
+            return entry.get("captured", 0) * 3600.0 / entry["seconds"]
+        return domain_yield.get(_domain(url), prior)
+
+    def _build_heap(self, index) -> None:
+        domain_totals: Dict[str, List[float]] = {}
+        for entry in self.stats.values():
+            if entry.get("seconds", 0) > 0 and entry.get("domain"):
+                totals = domain_totals.setdefault(entry["domain"], [0.0, 0.0])
+                totals[0] += entry.get("captured", 0)
+                totals[1] += entry["seconds"]
+        domain_yield = {d: c * 3600.0 / s for d, (c, s) in domain_totals.items() if s > 0}
+        prior = sorted(domain_yield.values())[len(domain_yield) // 2] if domain_yield else 0.0
+
+        heap = []
+        if self.first_index:
+            # Mesmo critério da ordem "sheet": índice inicial fora da planilha = nada a fazer.
+            pos = index.position.get(self.first_index, len(index.rows))
+        else:
+            pos = 0
+        pos = index.next_valid[pos]
+        while pos < len(index.rows):
+            indice, link = index.rows[pos]
+            pos_int = _index_int(indice)
+            # O runner encerra ao ver um INDICE acima do final; aqui ele nem entra no heap.
+            in_range = self.last_index is None or pos_int is None or pos_int <= self.last_index
+            if in_range and indice not in self.processed:
+                if self.ordering == "yield":
+                    score = -self._yield_score(indice, link, domain_yield, prior)
+                else:
+                    score = float(self.stats.get(indice, {}).get("last_crawled_at", 0))
+                heap.append((score, pos, indice))
+            pos = index.next_valid[pos + 1]
+        heapq.heapify(heap)
+        self._heap = heap
+        self._heap_key = (id(index), self.ordering)
+
+    def _pick(self, index, start_index: str, exclude: Tuple[str, ...]) -> Optional[Dict[str, str]]:
+        now = time.time()
+        skip = self.processed | self.deferred | set(exclude)
+
+        if self.ordering == "sheet":
+            supplier = index.next_supplier(start_index=start_index, skip_set=skip)
+            if supplier:
+                return supplier
+            # Adiados com backoff vencido só depois dos pendentes normais, em ordem da planilha.
+            ready = [
+                index.position[i] for i in self.deferred
+                if i not in self.processed and i not in exclude and i in index.position
+                and index.next_valid[index.position[i]] == index.position[i]
+                and self._deferred_ready(i, now)
+            ]
+            if not ready:
+                return None
+            indice, link = index.rows[min(ready)]
+            return {"indice": indice, "url": link}
+
+        if self._heap_key != (id(index), self.ordering):
+            self._build_heap(index)
+        # Remoção preguiçosa: descarta concluídos e pula adiados ainda em backoff.
+        set_aside = []
+        chosen = None
+        while self._heap:
+            score, pos, indice = self._heap[0]
+            if indice in self.processed:
+                heapq.heappop(self._heap)
+                continue
+            if indice in exclude or (indice in self.deferred and not self._deferred_ready(indice, now)):
+                set_aside.append(heapq.heappop(self._heap))
+                continue
+            chosen = {"indice": indice, "url": index.rows[pos][1]}
+            break
+        for entry in set_aside:
+            heapq.heappush(self._heap, entry)
+        return chosen
+
+    def claim(self, start_index: str = "", max_retries: int = 3, max_age: Optional[float] = None):
+        """
+        Retorna o próximo fornecedor ({"indice", "url"}) ou None.
+        Lança SupplierSheetError (via sheets) se a planilha estiver inacessível.
+        """
+        index = get_sheet_cache().get_index(
+            max_retries=max_retries,
+            **({} if max_age is None else {"max_age": max_age}),
+        )
+        get_sheet_cache().start_background_refresh()
+        return self._pick(index, (start_index or "").strip(), ())
+
+    def peek_next(self, current_indice: str) -> Optional[Dict[str, str]]:
+        """
+        Fornecedor que viria depois do atual (para prefetch), usando só o
+        índice em memória; nunca faz requisição.
+        """
+        index = get_sheet_cache().index
+        if index is None:
+            return None
+        current_indice = str(current_indice).strip()
+        start = ""
+        if self.ordering == "sheet" and current_indice.isdigit():
+            start = str(int(current_indice) + 1)
+            if start not in index.position:
+                start = ""
+        return self._pick(index, start, (current_indice,))
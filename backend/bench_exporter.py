@@ -0,0 +1,90 @@
+"""
+Benchmark do exportador XLSX (automation/exporter.py).
+
+Uso:
+    python bench_exporter.py                      # 10k e 100k linhas
+    python bench_exporter.py 5000 50000           # tamanhos customizados
+    BENCH_TEMPLATE="SRAM 05_01_2026.xlsx" python bench_exporter.py
+    BENCH_TRACE_MEMORY=1 python bench_exporter.py  # mede pico de memória (mais lento)
+
+Sem BENCH_TEMPLATE, gera um template sintético com o mesmo cabeçalho do
+template real em um diretório temporário.
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill
+
+from automation.exporter import export_to_xlsx
+
+DEFAULT_SIZES = [10_000, 100_000]
+TRACE_MEMORY = os.getenv("BENCH_TRACE_MEMORY", "0") == "1"
+HEADERS = ["Produto", "UPC", "URL Fornecedor", "Amazon UPC", "Amazon Titulo", "Status"]
+
+
+def build_template(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Produtos"
+    ws.append(HEADERS)
+    ws.append(["exemplo", "000000000000", "https://exemplo.com", "", "", ""])
+    for cell in ws[1]:
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill("solid", fgColor="0563C1")
+    for cell in ws[2]:
+        cell.font = Font(name="Calibri", size=10)
+    ws.freeze_panes = "A2"
+    wb.save(path)
+
+
+def build_items(n):
+    return [
+        {
+            "product_title": f"Produto de teste {i} - Kit com peças sortidas",
+            "upc": f"{700000000000 + i}",
+            "url": f"https://fornecedor.exemplo.com/products/item-{i}",
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or DEFAULT_SIZES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = os.getenv("BENCH_TEMPLATE")
+        if not template_path:
+            template_path = os.path.join(tmp, "template.xlsx")
+            build_template(template_path)
+
+        xlsx_dir = os.path.join(tmp, "ARQUIVOS XLSX")
+        os.makedirs(xlsx_dir, exist_ok=True)
+
+        for n in sizes:
+            items = build_items(n)
+            output_path = os.path.join(xlsx_dir, f"bench_{n}.xlsx")
+
+            if TRACE_MEMORY:
+                tracemalloc.start()
+            t0 = time.perf_counter()
+            export_to_xlsx(items, template_path, output_path)
+            elapsed = time.perf_counter() - t0
+            memory = ""
+            if TRACE_MEMORY:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                memory = f" | pico memória {peak / (1024 * 1024):7.1f} MB"
+
+            size_mb = os.path.getsize(output_path) / (1024 * 1024)
+            print(
+                f"{n:>8} linhas | {elapsed:7.2f}s | {n / elapsed:9.0f} linhas/s | "
+                f"arquivo {size_mb:6.1f} MB{memory}"
+            )
+
+
+if __name__ == "__main__":
+    main()
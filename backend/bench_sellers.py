@@ -0,0 +1,91 @@
+"""
+Benchmark dos endpoints de sellers (api/sellers.py).
+
+Uso:
+    python bench_sellers.py                 # 100k e 300k linhas
+    python bench_sellers.py 20000 500000    # tamanhos customizados
+    BENCH_CSV="keepa.csv" python bench_sellers.py   # usa um export real do Keepa
+
+Chama as funções dos endpoints direto (sem servidor HTTP) e mede:
+upload-csv, get-products (primeira página, página seguinte com o mesmo
+filtro e página profunda), get-sellers-list e download-filtered-csv.
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from starlette.datastructures import UploadFile
+
+from api import sellers
+
+DEFAULT_SIZES = [100_000, 300_000]
+FILTERS = {"min_price": 10, "max_price": 50, "max_bsr": 500_000, "exclude_amazon": True}
+REPEAT = 5
+
+
+def build_csv(n, seed=0):
+    rng = np.random.default_rng(seed)
+    seller_names = np.array(
+        ["Amazon.com", "Acme Store", "Best Deals LLC"] + [f"Seller {i}" for i in range(200)]
+    )
+    df = pd.DataFrame({
+        "Image": [f"https://images.exemplo.com/{i}.jpg" for i in range(n)],
+        "Title": [f"Produto de teste {i} - Kit com peças sortidas" for i in range(n)],
+        "Sales Rank: Current": np.where(rng.random(n) < 0.1, np.nan, rng.integers(1, 2_000_000, n)),
+        "New Price": np.where(rng.random(n) < 0.05, np.nan, np.round(rng.random(n) * 200, 2)),
+        "Buy Box Seller": rng.choice(seller_names, n),
+        "Count of retrieved live offers: New, FBA": rng.integers(0, 30, n),
+        "Product Codes: UPC": np.where(rng.random(n) < 0.2, np.nan, rng.integers(10 ** 10, 10 ** 12, n)),
+        "ASIN": [f"B0{i:08d}" for i in range(n)],
+        "Uses FBA": rng.random(n) < 0.9,
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def timed(coro_fn, repeat=1):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = asyncio.run(coro_fn())
+    return (time.perf_counter() - t0) / repeat * 1000, result
+
+
+def bench(label, content):
+    upload = UploadFile(file=io.BytesIO(content), filename="bench.csv")
+    upload_ms, info = timed(lambda: sellers.upload_sellers_csv(files=[upload]))
+    cache_id = info["cache_id"]
+
+    first_ms, page = timed(lambda: sellers.get_products(cache_id, page=1, **FILTERS))
+    next_ms, _ = timed(lambda: sellers.get_products(cache_id, page=2, **FILTERS), REPEAT)
+    deep = max(1, page["total_pages"])
+    deep_ms, _ = timed(lambda: sellers.get_products(cache_id, page=deep, **FILTERS), REPEAT)
+    list_ms, _ = timed(lambda: sellers.get_sellers_list(cache_id), REPEAT)
+    csv_ms, response = timed(lambda: sellers.download_filtered_csv(cache_id, **FILTERS))
+
+    csv_mb = len(response.body) / (1024 * 1024)
+    print(
+        f"{label:>10} | upload {upload_ms:8.0f} ms | página 1 {first_ms:7.1f} ms | "
+        f"página 2 {next_ms:6.1f} ms | página {deep} {deep_ms:6.1f} ms | "
+        f"sellers {list_ms:6.1f} ms | CSV {page['total']} linhas {csv_ms:7.0f} ms ({csv_mb:.1f} MB)"
+    )
+
+
+def main():
+    # Os endpoints logam com print a cada chamada; silencia durante a medição.
+    sellers.print = lambda *args, **kwargs: None
+
+    csv_path = os.getenv("BENCH_CSV")
+    if csv_path:
+        with open(csv_path, "rb") as f:
+            bench(os.path.basename(csv_path), f.read())
+        return
+
+    for n in [int(a) for a in sys.argv[1:]] or DEFAULT_SIZES:
+        bench(f"{n} linhas", build_csv(n))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Relatório do log de diagnóstico da automação (automation_diagnostics.jsonl).
+
+Uso:
+    python diagnostics_report.py                      # log padrão + rotacionados (.jsonl.gz)
+    python diagnostics_report.py --since-hours 24     # só as últimas 24h
+    python diagnostics_report.py --json > metricas.json
+    python diagnostics_report.py logs/a.jsonl.gz logs/b.jsonl   # arquivos específicos, nessa ordem
+
+Lê em streaming (memória constante, mesmo com gigabytes de log) e mostra
+produtos/hora, taxa de UPC por fornecedor e domínio, tempo perdido com
+captcha/settle/falhas/memória e p50/p95/p99 por estágio. Os mesmos números
+saem em GET /api/automation/metrics.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from api.services import diagnostics_metrics
+from automation.diagnostics import list_diagnostic_files
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LOG = os.getenv(
+    "AUTOMATION_DIAGNOSTICS_LOG",
+    os.path.join(BASE_DIR, "logs", "automation_diagnostics.jsonl"),
+)
+
+
+def _rate(value):
+    return "-" if value is None else f"{value * 100:.1f}%"
+
+
+def print_report(report):
+    products = report["products"]
+    print(f"Linhas: {report['lines']} (inválidas: {report['bad_lines']})")
+    print(f"Horas: {report['active_hours']} ativas / {report['wall_hours']} no total")
+    print(
+        f"Produtos: {products['captured']} capturados, {products['per_active_hour'] or '-'} por hora ativa, "
+        f"UPC {_rate(products['upc_hit_rate'])}"
+    )
+
+    print("\nTempo perdido (s):")
+    for key, value in report["time_lost_seconds"].items():
+        print(f"  {key:<16}{value:>12.1f}")
+
+    print("\nFalhas:")
+    for key, value in report["failures"].items():
+        print(f"  {key:<28}{value:>8}")
+
+    print("\nEstágios (ms):")
+    print(f"  {'estágio':<16}{'n':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'máx':>10}{'total s':>10}")
+    for name, stage in report["stages"].items():
+        if not stage["count"]:
+            continue
+        print(
+            f"  {name:<16}{stage['count']:>8}{stage['p50_ms']:>10}{stage['p95_ms']:>10}"
+            f"{stage['p99_ms']:>10}{stage['max_ms']:>10}{stage['total_seconds']:>10}"
+        )
+
+    for title, rows, label in (
+        ("Fornecedores", report["suppliers"], "supplier_index"),
+        ("Domínios", report["domains"], "domain"),
+    ):
+        if not rows:
+            continue
+        print(f"\n{title} (capturados / com UPC / taxa):")
+        for row in rows:
+            print(f"  {str(row[label]):<40}{row['captured']:>8}{row['with_upc']:>8}{_rate(row['upc_hit_rate']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório do log de diagnóstico da automação.")
+    parser.add_argument("paths", nargs="*", help="Arquivos .jsonl/.jsonl.gz em ordem cronológica (padrão: log + rotacionados)")
+    parser.add_argument("--since-hours", type=float, default=None, help="Só eventos das últimas N horas")
+    parser.add_argument("--top", type=int, default=20, help="Fornecedores/domínios listados (0 = todos)")
+    parser.add_argument("--json", action="store_true", help="Saída em JSON (mesmo formato de /api/automation/metrics)")
+    args = parser.parse_args()
+
+    paths = args.paths or list_diagnostic_files(DEFAULT_LOG)
+    if not paths:
+        print(f"Nenhum log de diagnóstico em {DEFAULT_LOG}", file=sys.stderr)
+        sys.exit(1)
+    since_ts = time.time() - args.since_hours * 3600 if args.since_hours else None
+
+    t0 = time.perf_counter()
+    report = diagnostics_metrics(paths, since_ts).report(args.top)
+    report["files"] = len(paths)
+    report["since_ts"] = since_ts
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    print_report(report)
+    print(f"\n{len(paths)} arquivo(s) lidos em {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
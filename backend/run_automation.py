@@ -1,27 +1,47 @@
 import asyncio
 import argparse
-import json
 import os
 import sys
 import logging
 import time
 from playwright.async_api import async_playwright
-from datetime import datetime
 from urllib.parse import urlparse
 
 # Modifica o path para achar as pastas locais
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from automation.state import load_state, save_state, clear_supplier_state
-from automation.sheets import get_next_supplier
+from automation.supplierQueue import SupplierQueue
 from automation.supplierCrawler import (
     fetch_product_links_from_page,
-    parse_price_details,
     find_next_page,
+    listing_has_more,
     normalize_product_url,
+    detect_listing_platform,
+    count_listing_cards,
 )
 from automation.captureRunner import call_capture_api
-from automation.exporter import export_to_xlsx
+from automation.linkFilter import ListingLinkFilter, attach_listing_prices
+from automation.listingUrl import (
+    choose_page_size_param,
+    detect_platform_hint,
+    load_learned_rules,
+    prefetch_listing_url,
+    record_page_size_result,
+    rewrite_listing_url,
+    save_learned_rules,
+    url_sort_hint,
+)
+from automation.priceOrder import PriceSortDetector
+from automation.exportQueue import (
+    EXPORT_DRAIN_TIMEOUT_SECONDS,
+    EXPORT_MAX_ATTEMPTS,
+    ExportWorker,
+    queue_export,
+    reap_exports,
+    resume_pending_exports,
+)
+from automation.diagnostics import DiagnosticsWriter, flush_on_signals
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -31,6 +51,7 @@ NO_SUPPLIER_CONFIRM_ATTEMPTS = int(os.getenv("NO_SUPPLIER_CONFIRM_ATTEMPTS", "3"
 NO_SUPPLIER_CONFIRM_DELAY_SECONDS = int(os.getenv("NO_SUPPLIER_CONFIRM_DELAY_SECONDS", "20"))
 SHEETS_ERROR_RETRY_SECONDS = int(os.getenv("SHEETS_ERROR_RETRY_SECONDS", "30"))
 MAX_CONSECUTIVE_CAPTURE_FAILURES = int(os.getenv("MAX_CONSECUTIVE_CAPTURE_FAILURES", "5"))
+CAPTURE_ERROR_RETRY_SECONDS = int(os.getenv("CAPTURE_ERROR_RETRY_SECONDS", "4"))
 TAB_OPEN_TIMEOUT_MS = int(os.getenv("TAB_OPEN_TIMEOUT_MS", "15000"))
 TAB_OPEN_DELAY_SECONDS = float(os.getenv("TAB_OPEN_DELAY_SECONDS", "0.05"))
 TAB_OPEN_MAX_PARALLEL = int(os.getenv("TAB_OPEN_MAX_PARALLEL", "4"))
@@ -40,6 +61,7 @@ POST_BATCH_SETTLE_SECONDS = float(os.getenv("POST_BATCH_SETTLE_SECONDS", "0.25")
 MIN_DYNAMIC_BATCH_SIZE = int(os.getenv("MIN_DYNAMIC_BATCH_SIZE", "4"))
 BATCH_DOWNSHIFT_FAILURE_RATIO = float(os.getenv("BATCH_DOWNSHIFT_FAILURE_RATIO", "0.5"))
 MAX_CONSECUTIVE_OPEN_FAILURE_BATCHES = int(os.getenv("MAX_CONSECUTIVE_OPEN_FAILURE_BATCHES", "4"))
+NO_OPENED_TABS_RETRY_SECONDS = int(os.getenv("NO_OPENED_TABS_RETRY_SECONDS", "2"))
 URL_FAILURE_QUARANTINE_THRESHOLD = int(os.getenv("URL_FAILURE_QUARANTINE_THRESHOLD", "3"))
 DOMAIN_FAILURE_QUARANTINE_THRESHOLD = int(os.getenv("DOMAIN_FAILURE_QUARANTINE_THRESHOLD", "7"))
 URL_QUARANTINE_MINUTES = int(os.getenv("URL_QUARANTINE_MINUTES", "720"))
@@ -47,8 +69,10 @@ DOMAIN_QUARANTINE_MINUTES = int(os.getenv("DOMAIN_QUARANTINE_MINUTES", "240"))
 MEMORY_MIN_AVAILABLE_MB = int(os.getenv("MEMORY_MIN_AVAILABLE_MB", "900"))
 LOW_MEMORY_COOLDOWN_SECONDS = int(os.getenv("LOW_MEMORY_COOLDOWN_SECONDS", "8"))
 MAX_CONSECUTIVE_LOW_MEMORY_HITS = int(os.getenv("MAX_CONSECUTIVE_LOW_MEMORY_HITS", "3"))
-HIGH_PRICE_PAGE_MIN_PRICED_ITEMS = int(os.getenv("HIGH_PRICE_PAGE_MIN_PRICED_ITEMS", "6"))
-HIGH_PRICE_PAGE_CONSECUTIVE_THRESHOLD = int(os.getenv("HIGH_PRICE_PAGE_CONSECUTIVE_THRESHOLD", "1"))
+LISTING_URL_REWRITE_ENABLED = os.getenv("LISTING_URL_REWRITE_ENABLED", "1") == "1"
+SUPPLIER_PREFETCH_ENABLED = os.getenv("SUPPLIER_PREFETCH_ENABLED", "1") == "1"
+SUPPLIER_PREFETCH_WAIT_SECONDS = float(os.getenv("SUPPLIER_PREFETCH_WAIT_SECONDS", "20"))
+DEFERRED_SUPPLIER_POLL_MAX_SECONDS = int(os.getenv("DEFERRED_SUPPLIER_POLL_MAX_SECONDS", "300"))
 AUTOMATION_DIAGNOSTICS_ENABLED = os.getenv("AUTOMATION_DIAGNOSTICS_ENABLED", "1") == "1"
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 AUTOMATION_DIAGNOSTICS_LOG = os.getenv(
@@ -57,21 +81,13 @@ AUTOMATION_DIAGNOSTICS_LOG = os.getenv(
 )
 
 
+# Gravação em lote numa thread própria (rotação/compressão/amostragem em automation.diagnostics).
+diagnostics = DiagnosticsWriter(AUTOMATION_DIAGNOSTICS_LOG, enabled=AUTOMATION_DIAGNOSTICS_ENABLED)
+
+
 def write_diagnostic(event, **fields):
-    if not AUTOMATION_DIAGNOSTICS_ENABLED:
-        return
-    try:
-        os.makedirs(os.path.dirname(AUTOMATION_DIAGNOSTICS_LOG), exist_ok=True)
-        payload = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "event": event,
-            **fields,
-        }
-        with open(AUTOMATION_DIAGNOSTICS_LOG, "a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
-    except Exception:
-        # Diagnóstico nunca pode derrubar o robô.
-        pass
+    # Só enfileira: serialização e disco ficam com a thread do writer.
+    diagnostics.emit(event, **fields)
 
 
 def clean_product_url(url):
@@ -85,11 +101,23 @@ def extract_domain(url):
         return ""
 
 
+def upc_hits_by_domain(items):
+    # {domínio: [capturados, com UPC]} do lote, para a taxa de UPC por domínio.
+    hits = {}
+    for item in items:
+        counts = hits.setdefault(extract_domain(item.get("url", "")), [0, 0])
+        counts[0] += 1
+        if item.get("upc"):
+            counts[1] += 1
+    return hits
+
+
 def ensure_runtime_state_keys(state):
     state.setdefault("link_fail_counts", {})
     state.setdefault("domain_fail_counts", {})
     state.setdefault("quarantined_links", {})
     state.setdefault("quarantined_domains", {})
+    state.setdefault("pending_exports", [])
 
 
 def clear_expired_quarantines(state):
@@ -108,11 +136,13 @@ def clear_expired_quarantines(state):
     return changed
 
 
-def quarantine_status(state, url):
+def quarantine_status(state, url, cleaned=None, domain=None):
     ensure_runtime_state_keys(state)
     now = int(time.time())
-    cleaned = clean_product_url(url)
-    domain = extract_domain(cleaned)
+    if cleaned is None:
+        cleaned = clean_product_url(url)
+    if domain is None:
+        domain = extract_domain(cleaned)
 
     link_until = int(state["quarantined_links"].get(cleaned, 0) or 0)
     if link_until > now:
@@ -198,20 +228,6 @@ def read_memory_snapshot():
         return None
 
 
-def url_suggests_price_ascending(url):
-    u = (url or "").lower()
-    patterns = (
-        "sort_by=price-ascending",
-        "sort_by=price_ascending",
-        "sort=price-asc",
-        "sort=price_asc",
-        "orderby=price",
-        "price-low-to-high",
-        "price_asc",
-    )
-    return any(p in u for p in patterns)
-
-
 def parse_supplier_index(value):
     try:
         return int(str(value).strip())
@@ -242,26 +258,62 @@ async def open_tabs_in_parallel(ctx, urls, timeout_ms, max_parallel, delay_secon
     return await asyncio.gather(*[_open(url) for url in urls])
 
 
+# Worker único do processo: sobrevive aos reinícios de run_automation no __main__.
+export_worker = ExportWorker()
+
+
 def flush_accumulated_export(state, export_dir, template_path, reason):
-    items = state.get("accumulated_items", [])
-    if not items:
-        return None
+    """
+    Entrega o lote acumulado ao worker de exportação sem bloquear o loop.
+    O lote fica registrado em state["pending_exports"] até o arquivo existir.
+    """
+    return queue_export(state, export_worker, export_dir, template_path, reason, save_state)
 
-    ts = datetime.now()
-    base_name = f"Produtos_{ts.strftime('%d_%m_%Y')}_{ts.strftime('%H%M%S')}.xlsx"
-    out_path = os.path.join(export_dir, base_name)
-    export_to_xlsx(items, template_path, out_path)
-    logger.info(f"Exportação ({reason}) concluída em: {out_path}")
-    state["accumulated_items"] = []
-    save_state(state)
-    return out_path
+
+def reap_finished_exports(state):
+    for result in reap_exports(state, export_worker, save_state):
+        if result["error"] is None:
+            write_diagnostic("export_completed", out_path=result["out_path"], reason=result["reason"])
+            continue
+        write_diagnostic(
+            "export_failed",
+            out_path=result["out_path"],
+            reason=result["reason"],
+            error=result["error"],
+            attempts=result["attempts"],
+            gave_up=result["attempts"] >= EXPORT_MAX_ATTEMPTS,
+        )
+        if result["attempts"] >= EXPORT_MAX_ATTEMPTS:
+            logger.error(
+                f"Exportação {result['out_path']} falhou {result['attempts']}x. "
+                "Lote mantido em pending_exports no estado."
+            )
 
 
-def defer_supplier_in_state(state, supplier_idx):
-    deferred = state.get("deferred_suppliers_indices", [])
-    if supplier_idx and supplier_idx not in deferred:
-        deferred.append(supplier_idx)
-    state["deferred_suppliers_indices"] = deferred
+async def drain_exports(state):
+    """Espera o worker terminar os lotes pendentes (fim da automação)."""
+    deadline = time.monotonic() + EXPORT_DRAIN_TIMEOUT_SECONDS
+    while True:
+        remaining = max(0.0, deadline - time.monotonic())
+        idle = await asyncio.to_thread(export_worker.wait_idle, remaining)
+        reap_finished_exports(state)
+        if not export_worker.busy:
+            return True
+        if not idle:
+            logger.warning(
+                f"Exportações ainda em andamento após {EXPORT_DRAIN_TIMEOUT_SECONDS:.0f}s; "
+                "serão retomadas na próxima execução."
+            )
+            return False
+
+
+def defer_supplier_in_state(state, supplier_queue, supplier, captured=0, seconds=0.0):
+    supplier_idx = str(supplier.get("indice") or "").strip()
+    retry_at = supplier_queue.defer(supplier_idx, captured, seconds, supplier.get("url", ""))
+    # Segue o fluxo sequencial N -> N+1 (como clear_supplier_state); sem isso o
+    # start_index explícito traria o mesmo fornecedor adiado de volta na hora.
+    if supplier_idx.isdigit():
+        state["start_index"] = str(int(supplier_idx) + 1)
 
     # Limpa somente o contexto do fornecedor atual para seguir fluxo
     state["current_supplier_row"] = None
@@ -269,6 +321,72 @@ def defer_supplier_in_state(state, supplier_idx):
     state["processed_links"] = []
     state["total_captured_for_supplier"] = 0
     save_state(state)
+    return retry_at
+
+
+async def prefetch_supplier_page(ctx, listing_url):
+    """Abre a primeira listagem do próximo fornecedor em uma aba de fundo."""
+    page = await ctx.new_page()
+    try:
+        await page.goto(
+            listing_url,
+            wait_until="domcontentloaded",
+            timeout=int(SUPPLIER_PREFETCH_WAIT_SECONDS * 1000),
+        )
+    except asyncio.CancelledError:
+        # Desistência (wait_for estourou): ninguém vai adotar essa aba.
+        await close_pages_safely([page])
+        raise
+    except Exception as e:
+        # Timeout não invalida a aba (desafios de Cloudflare costumam estourar).
+        logger.warning(f"Prefetch de {listing_url} com aviso: {e}")
+    return page
+
+
+def start_supplier_prefetch(ctx, supplier_queue, supplier, learned_rules):
+    """
+    Começa a pré-carregar a listagem do próximo fornecedor (já reescrita
+    quando possível). Retorna {"supplier", "listing_url", "task"} ou None.
+    """
+    next_supplier = supplier_queue.peek_next(supplier["indice"])
+    if not next_supplier:
+        return None
+    listing_url = next_supplier["url"]
+    if LISTING_URL_REWRITE_ENABLED:
+        listing_url = prefetch_listing_url(listing_url, learned_rules)
+    logger.info(f"Pré-carregando fornecedor {next_supplier['indice']}: {listing_url}")
+    return {
+        "supplier": next_supplier,
+        "listing_url": listing_url,
+        "task": asyncio.create_task(prefetch_supplier_page(ctx, listing_url)),
+    }
+
+
+async def adopt_prefetched_page(ctx, state, supplier):
+    """
+    Reaproveita a aba pré-carregada se ela for do fornecedor atual e o
+    fornecedor começa do zero. Abas de prefetch de outro fornecedor são fechadas.
+    """
+    prefetch = state.pop("supplier_prefetch", None)
+    if not prefetch:
+        return None
+    wanted = (
+        str(prefetch.get("indice")) == str(supplier.get("indice"))
+        and state.get("current_page_url") == supplier.get("url")
+    )
+    if wanted and prefetch.get("listing_url"):
+        # A aba já está na listagem reescrita: o fornecedor começa por ela.
+        state["current_page_url"] = prefetch["listing_url"]
+    save_state(state)
+
+    for page in ctx.pages:
+        if page.url != prefetch.get("page_url"):
+            continue
+        if wanted:
+            return page
+        await close_pages_safely([page])
+        break
+    return None
 
 async def close_product_tabs(browser, main_page):
     """
@@ -338,11 +456,29 @@ async def run_automation(
         requested_start_index=start_index,
         requested_end_index=end_index,
     )
-    
+    # Tamanhos de página aprendidos por domínio: arquivo próprio, sobrevive ao START/clear.
+    learned_listing_rules = load_learned_rules()
+    # start_index é zerado depois da 1ª volta; a fila ordenada (yield/age) precisa da faixa inteira.
+    run_start_index = (start_index or "").strip()
+
     while True:
         logger.info("Verificando estado atual de automação...")
         state = load_state()
         ensure_runtime_state_keys(state)
+        if "listing_url_rules" in state:
+            # Só estados antigos têm essa chave (regras aprendidas): migra uma vez.
+            legacy_listing_rules = state.pop("listing_url_rules")
+            if isinstance(legacy_listing_rules, dict) and legacy_listing_rules:
+                for domain, entry in legacy_listing_rules.items():
+                    if isinstance(entry, dict):
+                        learned_listing_rules.setdefault(domain, entry)
+                try:
+                    save_learned_rules(learned_listing_rules)
+                except Exception as e:
+                    logger.warning(f"Não foi possível salvar regras aprendidas de listagem: {e}")
+            save_state(state)
+        reap_finished_exports(state)
+        resume_pending_exports(state, export_worker)
         if clear_expired_quarantines(state):
             save_state(state)
             write_diagnostic("expired_quarantine_cleared")
@@ -353,6 +489,7 @@ async def run_automation(
             processed_suppliers_count=len(state.get("processed_suppliers_indices", [])),
             deferred_suppliers_count=len(state.get("deferred_suppliers_indices", [])),
             accumulated_items_count=len(state.get("accumulated_items", [])),
+            pending_exports_count=len(state.get("pending_exports", [])),
             quarantined_links_count=len(state.get("quarantined_links", {})),
             quarantined_domains_count=len(state.get("quarantined_domains", {})),
         )
@@ -384,9 +521,7 @@ async def run_automation(
             start_index = None # Limpa para as proximas iteracoes do loop while
             
         saved_start_index = state.get("start_index", "")
-        processed_indices = state.get("processed_suppliers_indices", [])
-        deferred_indices = state.get("deferred_suppliers_indices", [])
-        skip_indices = list(dict.fromkeys(processed_indices + deferred_indices))
+        supplier_queue = SupplierQueue(state, first_index=run_start_index, last_index=end_index)
         
         # Criação da pasta de exportação e refencia do template globais
         template_path = os.path.join(BASE_DIR, "SRAM 05_01_2026.xlsx")
@@ -400,7 +535,11 @@ async def run_automation(
 
             for check_attempt in range(1, NO_SUPPLIER_CONFIRM_ATTEMPTS + 1):
                 try:
-                    supplier = get_next_supplier(start_index=saved_start_index, skip_indices=skip_indices)
+                    # Confirmações revalidam a planilha (requisição condicional) em vez de usar o índice local.
+                    supplier = supplier_queue.claim(
+                        start_index=saved_start_index,
+                        max_age=0 if check_attempt > 1 else None,
+                    )
                 except Exception as e:
                     had_sheet_error = True
                     logger.error(f"Falha ao ler planilha de fornecedores (tentativa {check_attempt}/{NO_SUPPLIER_CONFIRM_ATTEMPTS}): {e}")
@@ -420,6 +559,7 @@ async def run_automation(
                         supplier_index=supplier.get("indice"),
                         supplier_url=supplier.get("url"),
                         start_index=saved_start_index,
+                        ordering=supplier_queue.ordering,
                     )
                     break
 
@@ -441,18 +581,19 @@ async def run_automation(
                     await asyncio.sleep(60)
                     continue
 
-                if deferred_indices:
+                retry_in = supplier_queue.next_retry_in()
+                if retry_in is not None:
+                    wait_seconds = min(max(5, retry_in), DEFERRED_SUPPLIER_POLL_MAX_SECONDS)
                     logger.warning(
-                        f"Sem novos fornecedores pendentes. Reprocessando {len(deferred_indices)} fornecedor(es) "
-                        "que foram adiados por timeout de CAPTCHA."
+                        f"Sem novos fornecedores pendentes. {len(supplier_queue.deferred)} fornecedor(es) adiado(s) "
+                        f"por timeout de CAPTCHA aguardando backoff; nova checagem em {wait_seconds:.0f}s."
                     )
-                    state["deferred_suppliers_indices"] = []
-                    save_state(state)
                     write_diagnostic(
-                        "reprocessing_deferred_suppliers",
-                        deferred_count=len(deferred_indices),
+                        "waiting_deferred_suppliers",
+                        deferred_count=len(supplier_queue.deferred),
+                        retry_in_seconds=int(retry_in),
                     )
-                    await asyncio.sleep(5)
+                    await asyncio.sleep(wait_seconds)
                     continue
 
                 logger.info("Nenhum fornecedor pendente encontrado na planilha Google Sheets.")
@@ -460,6 +601,7 @@ async def run_automation(
                 write_diagnostic("automation_completed_no_pending_suppliers")
 
                 flush_accumulated_export(state, export_dir, template_path,"lote final")
+                await drain_exports(state)
                 break
             supplier_idx_int = parse_supplier_index(supplier.get("indice"))
             if end_idx_int is not None and supplier_idx_int is not None and supplier_idx_int > end_idx_int:
@@ -472,6 +614,7 @@ async def run_automation(
                     next_supplier_index=supplier.get("indice"),
                 )
                 flush_accumulated_export(state, export_dir, template_path,"lote final")
+                await drain_exports(state)
                 break
 
             logger.info(f"Iniciando Fornecedor Indice {supplier['indice']} -> {supplier['url']}")
@@ -496,6 +639,7 @@ async def run_automation(
                     current_supplier_index=supplier.get("indice"),
                 )
                 flush_accumulated_export(state, export_dir, template_path,"lote final")
+                await drain_exports(state)
                 break
             logger.info(f"Retomando automação Fornecedor indice: {supplier['indice']}")
             write_diagnostic(
@@ -513,12 +657,16 @@ async def run_automation(
                 logger.info(f"Conectando ao browser em {devtools_url}...")
                 browser = await pw.chromium.connect_over_cdp(devtools_url)
                 ctx = browser.contexts[0] if browser.contexts else await browser.new_context()
-                main_page = await ctx.new_page()
+                main_page = await adopt_prefetched_page(ctx, state, supplier)
+                prefetched_page_ready = main_page is not None
+                if main_page is None:
+                    main_page = await ctx.new_page()
                 write_diagnostic(
                     "cdp_connected",
                     devtools_url=devtools_url,
                     contexts=len(browser.contexts),
                     pages_in_ctx=len(ctx.pages),
+                    prefetched_page=prefetched_page_ready,
                 )
             except Exception as e:
                 logger.error(f"Não foi possível conectar ao browser: {e}")
@@ -528,6 +676,8 @@ async def run_automation(
                 
             current_url = state.get("current_page_url")
             processed_links = set(state.get("processed_links", []))
+            cycle_started_at = time.time()
+            captured_at_cycle_start = state.get("total_captured_for_supplier", 0)
             
             # Variaveis de pasta ja declaradas acima
             
@@ -537,38 +687,61 @@ async def run_automation(
             consecutive_capture_failures = 0
             consecutive_open_failure_batches = 0
             consecutive_low_memory_hits = 0
-            consecutive_high_price_pages = 0
             dynamic_batch_size = max(1, batch_size)
             
             same_page_stuck_count = 0
             last_page_total_links = 0
+            page_total_links = 0
+            same_page_pass = False
+            link_filter = ListingLinkFilter()
+            sort_detector = PriceSortDetector()
+            listing_platform = detect_platform_hint(current_url)
+            # Só reescreve a URL quando o fornecedor começa do zero (não em retomada de página N).
+            listing_rewrite_pending = LISTING_URL_REWRITE_ENABLED and current_url == supplier.get("url")
+            page_size_check = None
+            supplier_prefetch = None
+            global_history = set(state.get("global_captured_urls", []))
 
             while current_url and not over_price and not supplier_ended:
-                nav_started = asyncio.get_running_loop().time()
-                nav_status = None
-                nav_error = ""
-                final_url = current_url
-                try:
-                    logger.info(f"Navegando/Processando a página: {current_url}")
-                    # Change to domcontentloaded to avoid getting stuck on tracking pixels
-                    response = await main_page.goto(current_url, wait_until="domcontentloaded", timeout=45000)
-                    nav_status = response.status if response else None
-                    final_url = main_page.url
+                if same_page_pass:
+                    # Após "load more"/scroll o conteúdo já está no DOM: recarregar a URL
+                    # perderia os itens anexados e o cursor de extração incremental.
+                    logger.info(f"Continuando na mesma página (novos itens anexados): {current_url}")
+                elif prefetched_page_ready:
+                    # Primeira listagem já carregada em segundo plano no fim do fornecedor anterior.
+                    prefetched_page_ready = False
+                    logger.info(f"Usando listagem pré-carregada: {main_page.url}")
                     if LIST_PAGE_SETTLE_SECONDS > 0:
                         await asyncio.sleep(LIST_PAGE_SETTLE_SECONDS)
-                except Exception as e:
-                    # Timeout doesn't mean failure, Cloudflare challenge pages often timeout on "load". Do NOT break.
-                    logger.warning(f"Aviso de navegação longa ou Timeout: {e}")
-                    nav_error = str(e)
-                write_diagnostic(
-                    "page_navigation",
-                    supplier_index=supplier.get("indice"),
-                    requested_url=current_url,
-                    final_url=final_url,
-                    http_status=nav_status,
-                    elapsed_ms=int((asyncio.get_running_loop().time() - nav_started) * 1000),
-                    error=nav_error,
-                )
+                else:
+                    nav_started = asyncio.get_running_loop().time()
+                    nav_status = None
+                    nav_error = ""
+                    nav_settle_ms = 0
+                    final_url = current_url
+                    try:
+                        logger.info(f"Navegando/Processando a página: {current_url}")
+                        # Change to domcontentloaded to avoid getting stuck on tracking pixels
+                        response = await main_page.goto(current_url, wait_until="domcontentloaded", timeout=45000)
+                        nav_status = response.status if response else None
+                        final_url = main_page.url
+                        if LIST_PAGE_SETTLE_SECONDS > 0:
+                            await asyncio.sleep(LIST_PAGE_SETTLE_SECONDS)
+                            nav_settle_ms = int(LIST_PAGE_SETTLE_SECONDS * 1000)
+                    except Exception as e:
+                        # Timeout doesn't mean failure, Cloudflare challenge pages often timeout on "load". Do NOT break.
+                        logger.warning(f"Aviso de navegação longa ou Timeout: {e}")
+                        nav_error = str(e)
+                    write_diagnostic(
+                        "page_navigation",
+                        supplier_index=supplier.get("indice"),
+                        requested_url=current_url,
+                        final_url=final_url,
+                        http_status=nav_status,
+                        elapsed_ms=int((asyncio.get_running_loop().time() - nav_started) * 1000),
+                        settle_ms=nav_settle_ms,
+                        error=nav_error,
+                    )
 
                 # CAPTCHA / Cloudflare verificação visual pelo titulo
                 page_title = ""
@@ -633,57 +806,118 @@ async def run_automation(
                     )
                     await asyncio.sleep(5)
                     
-                links = await fetch_product_links_from_page(main_page)
-                logger.info(f"Página extratida: {len(links)} links encontrados")
+                if listing_rewrite_pending:
+                    listing_rewrite_pending = False
+                    listing_platform = await detect_listing_platform(main_page) or listing_platform
+                    page_size_param = choose_page_size_param(current_url, listing_platform, learned_listing_rules)
+                    rewritten_url = rewrite_listing_url(current_url, listing_platform, page_size=page_size_param)
+                    if rewritten_url != current_url:
+                        if page_size_param:
+                            # Cards da listagem original: base para validar se o site honrou o tamanho.
+                            page_size_check = {
+                                "url": rewritten_url,
+                                "original_url": current_url,
+                                "param": page_size_param,
+                                "baseline_cards": await count_listing_cards(main_page),
+                            }
+                        logger.info(
+                            f"Listagem reescrita para preço crescente/página máxima ({listing_platform}): {rewritten_url}"
+                        )
+                        write_diagnostic(
+                            "listing_url_rewritten",
+                            supplier_index=supplier.get("indice"),
+                            platform=listing_platform,
+                            page_size_param=list(page_size_param) if page_size_param else None,
+                            from_url=current_url,
+                            to_url=rewritten_url,
+                        )
+                        current_url = rewritten_url
+                        state["current_page_url"] = current_url
+                        save_state(state)
+                        continue
+
+                if page_size_check and not same_page_pass and current_url == page_size_check["url"]:
+                    cards = await count_listing_cards(main_page)
+                    verdict = record_page_size_result(
+                        learned_listing_rules,
+                        current_url,
+                        page_size_check["param"],
+                        page_size_check["baseline_cards"],
+                        cards,
+                    )
+                    try:
+                        save_learned_rules(learned_listing_rules)
+                    except Exception as e:
+                        logger.warning(f"Não foi possível salvar regras aprendidas de listagem: {e}")
+                    logger.info(
+                        f"Tamanho de página {page_size_check['param'][0]}={page_size_check['param'][1]}: "
+                        f"{page_size_check['baseline_cards']} -> {cards} cards ({verdict})."
+                    )
+                    write_diagnostic(
+                        "listing_page_size_checked",
+                        supplier_index=supplier.get("indice"),
+                        url=current_url,
+                        param=list(page_size_check["param"]),
+                        baseline_cards=page_size_check["baseline_cards"],
+                        cards=cards,
+                        verdict=verdict,
+                    )
+                    if verdict == "rejected":
+                        # Tamanho não honrado (0 cards = página de erro): volta para a URL
+                        # original, só com a ordenação se a página reescrita carregou cards.
+                        original_url = page_size_check["original_url"]
+                        fallback_url = (
+                            rewrite_listing_url(original_url, listing_platform) if cards > 0 else original_url
+                        )
+                        logger.info(f"Voltando para a listagem sem o tamanho de página: {fallback_url}")
+                        page_size_check = None
+                        current_url = fallback_url
+                        state["current_page_url"] = current_url
+                        save_state(state)
+                        continue
+                    page_size_check = None
 
-                # Filtra links
+                links = await fetch_product_links_from_page(main_page, incremental=same_page_pass)
+                if same_page_pass:
+                    page_total_links += len(links)
+                    logger.info(f"Página extratida: {len(links)} links novos ({page_total_links} no total)")
+                else:
+                    page_total_links = len(links)
+                    logger.info(f"Página extratida: {len(links)} links encontrados")
+                same_page_pass = False
+
+                # Alimenta o detector de ordenação com os preços na ordem da listagem
+                sort_detector.set_hint(url_sort_hint(current_url, listing_platform))
+                attach_listing_prices(links)
+                sort_detector.observe(item["price_info"]["value"] for item in links)
+
+                # Filtra links (só os novos desde a última passada nesta página)
+                link_filter.start_page(current_url)
                 valid_links = []
-                blacklist = ["milwaukee"]
-                global_history = set(state.get("global_captured_urls", []))
                 priced_items_count = 0
                 above_price_count = 0
                 below_price_count = 0
                 zero_price_count = 0
-                zero_price_urls = []
 
-                candidate_links = []
-
-                for item in links:
-                    url_lower = item["url"].lower()
-                    clean_url = clean_product_url(item["url"])
-
-                    if item["url"] in processed_links:
-                        continue
-
-                    if clean_url in global_history:
-                        logger.info(f"Produto ignorado (Já foi capturado anteriormente na história): {clean_url}")
-                        processed_links.add(item["url"])
-                        continue
-
-                    if not url_lower.startswith("http"):
+                new_candidates, rejected_links = link_filter.select(links, processed_links, global_history)
+                for item, reason in rejected_links:
+                    if reason == "history":
+                        logger.info(f"Produto ignorado (Já foi capturado anteriormente na história): {item['clean_url']}")
+                    elif reason == "invalid_format":
                         logger.info(f"Link ignorado (formato inválido): {item['url']}")
-                        continue
-
-                    action_patterns = [
-                        "cart.php?action=", "cart.php?action%3d",
-                        "/cart/add", "/cart/", "add-to-cart",
-                        "addtocart", "/wishlist/", "/checkout",
-                        "action=add&product_id=", "action=add&",
-                        "/compare/", "compare.php",
-                        "login", "account", "register",
-                    ]
-                    if any(p in url_lower for p in action_patterns):
+                    elif reason == "action_url":
                         logger.info(f"Link ignorado (URL de ação/carrinho): {item['url']}")
-                        processed_links.add(item["url"])
-                        continue
-
-                    if any(b in url_lower for b in blacklist):
-                        logger.info(f"Produto ignorado (Blacklist: {blacklist}): {item['url']}")
-                        continue
+                    elif reason == "blacklist":
+                        logger.info(f"Produto ignorado (Blacklist: {list(link_filter.blacklist)}): {item['url']}")
 
-                    is_quarantined, quarantine_type, until_ts, _, q_domain = quarantine_status(state, item["url"])
+                candidate_links = []
+                for item in new_candidates:
+                    is_quarantined, quarantine_type, until_ts, _, q_domain = quarantine_status(
+                        state, item["url"], cleaned=item["clean_url"], domain=item["domain"]
+                    )
                     if is_quarantined:
                         processed_links.add(item["url"])
+                        link_filter.discard(item["url"])
                         write_diagnostic(
                             "link_skipped_quarantine",
                             supplier_index=supplier.get("indice"),
@@ -698,17 +932,11 @@ async def run_automation(
                     candidate_links.append(item)
 
                 for item in candidate_links:
-                    price_info = parse_price_details(item.get("price_text", ""))
-                    price = price_info.get("value")
-                    price_status = price_info.get("status")
-                    raw_price = price_info.get("raw", "")
-
-                    if raw_price:
+                    price_info = item["price_info"]
+                    if price_info.get("raw", ""):
                         priced_items_count += 1
-
-                    if price_status == "zero":
+                    if price_info.get("status") == "zero":
                         zero_price_count += 1
-                        zero_price_urls.append(item["url"])
 
                 all_prices_are_zero = (
                     zero_price_count > 0
@@ -731,12 +959,13 @@ async def run_automation(
                     )
 
                 for item in candidate_links:
-                    price_info = parse_price_details(item.get("price_text", ""))
+                    price_info = item["price_info"]
                     price = price_info.get("value")
                     price_status = price_info.get("status")
                     raw_price = price_info.get("raw", "")
 
                     if price_status == "zero" and not all_prices_are_zero:
+                        link_filter.discard(item["url"])
                         logger.info(
                             f"Ignorando produto com preço zero (raw='{raw_price}') -> {item['url']}"
                         )
@@ -750,6 +979,7 @@ async def run_automation(
                         continue
 
                     if price_status == "inquiry":
+                        link_filter.discard(item["url"])
                         logger.info(
                             f"Ignorando produto com preço sob consulta (raw='{raw_price}') -> {item['url']}"
                         )
@@ -778,44 +1008,48 @@ async def run_automation(
 
                     if price is not None and price_status != "zero" and price_min > 0 and price < price_min:
                         below_price_count += 1
+                        link_filter.discard(item["url"])
                         logger.info(f"Ignorando produto < ${price_min} (preço lido: ${price}) -> {item['url']}")
                         continue
 
                     if price is not None and price_status != "zero" and price_limit > 0 and price > price_limit:
                         above_price_count += 1
+                        link_filter.discard(item["url"])
                         logger.info(f"Ignorando produto > ${price_limit} (preço lido: ${price}) -> {item['url']}")
                         continue
 
                     valid_links.append(item["url"])
-                    
+
+                if sort_detector.past_ceiling(price_limit):
+                    # Listagem comprovadamente crescente e já acima do teto: processa o que
+                    # ainda é válido nesta página e não busca as próximas.
+                    over_price = True
+                    supplier_ended = True
+                    logger.info(
+                        f"Preços passaram do teto de ${price_limit} em listagem ordenada por preço crescente "
+                        f"({len(sort_detector.prices)} preços observados). Encerrando fornecedor após esta página."
+                    )
+                    write_diagnostic(
+                        "supplier_stopped_high_price_ceiling",
+                        supplier_index=supplier.get("indice"),
+                        page_url=current_url,
+                        price_limit=price_limit,
+                        priced_items=priced_items_count,
+                        above_price_items=above_price_count,
+                        valid_links=len(valid_links),
+                        sort_order=sort_detector.order,
+                        sort_hint=sort_detector.hint,
+                        observed_prices=len(sort_detector.prices),
+                    )
+
+                if SUPPLIER_PREFETCH_ENABLED and supplier_prefetch is None and (
+                    over_price or not await listing_has_more(main_page)
+                ):
+                    # Última listagem do fornecedor: o próximo carrega enquanto os lotes finais rodam.
+                    supplier_prefetch = start_supplier_prefetch(ctx, supplier_queue, supplier, learned_listing_rules)
+
                 if len(valid_links) == 0:
                     logger.info("Nenhum produto válido/novo na página iterada.")
-                    if (
-                        price_limit > 0
-                        and priced_items_count >= HIGH_PRICE_PAGE_MIN_PRICED_ITEMS
-                        and above_price_count == priced_items_count
-                        and url_suggests_price_ascending(current_url)
-                    ):
-                        consecutive_high_price_pages += 1
-                    else:
-                        consecutive_high_price_pages = 0
-
-                    if consecutive_high_price_pages >= HIGH_PRICE_PAGE_CONSECUTIVE_THRESHOLD:
-                        over_price = True
-                        supplier_ended = True
-                        logger.info(
-                            f"Página acima do corte de preço detectada ({above_price_count}/{priced_items_count} acima de ${price_limit}) "
-                            "em ordenação ascendente. Encerrando fornecedor para ganhar velocidade."
-                        )
-                        write_diagnostic(
-                            "supplier_stopped_high_price_ceiling",
-                            supplier_index=supplier.get("indice"),
-                            page_url=current_url,
-                            price_limit=price_limit,
-                            priced_items=priced_items_count,
-                            above_price_items=above_price_count,
-                            consecutive_pages=consecutive_high_price_pages,
-                        )
                     write_diagnostic(
                         "page_no_valid_links",
                         supplier_index=supplier.get("indice"),
@@ -824,10 +1058,9 @@ async def run_automation(
                         priced_items=priced_items_count,
                         below_price_items=below_price_count,
                         above_price_items=above_price_count,
-                        consecutive_high_price_pages=consecutive_high_price_pages,
+                        sort_order=sort_detector.order,
                     )
                 else:
-                    consecutive_high_price_pages = 0
                     write_diagnostic(
                         "page_links_ready",
                         supplier_index=supplier.get("indice"),
@@ -865,6 +1098,7 @@ async def run_automation(
                                 old_batch_size=old_size,
                                 new_batch_size=dynamic_batch_size,
                                 consecutive_low_memory_hits=consecutive_low_memory_hits,
+                                cooldown_seconds=LOW_MEMORY_COOLDOWN_SECONDS,
                             )
                             await close_product_tabs(browser, main_page)
                             if consecutive_low_memory_hits >= MAX_CONSECUTIVE_LOW_MEMORY_HITS:
@@ -901,6 +1135,7 @@ async def run_automation(
                         failed_opens = 0
                         state_dirty_by_failures = False
 
+                        open_started = asyncio.get_running_loop().time()
                         open_results = await open_tabs_in_parallel(
                             ctx=ctx,
                             urls=batch,
@@ -983,6 +1218,7 @@ async def run_automation(
                             failed=failed_opens,
                             failure_ratio=round(failure_ratio, 3),
                             dynamic_batch_size=dynamic_batch_size,
+                            elapsed_ms=int((asyncio.get_running_loop().time() - open_started) * 1000),
                         )
 
                         if failed_opens == len(batch):
@@ -997,6 +1233,7 @@ async def run_automation(
                                 supplier_index=supplier.get("indice"),
                                 page_url=current_url,
                                 consecutive_open_failure_batches=consecutive_open_failure_batches,
+                                retry_sleep_seconds=NO_OPENED_TABS_RETRY_SECONDS,
                             )
                             await close_pages_safely(opened_pages)
                             if consecutive_open_failure_batches >= MAX_CONSECUTIVE_OPEN_FAILURE_BATCHES:
@@ -1004,7 +1241,7 @@ async def run_automation(
                                     f"Muitas falhas consecutivas na abertura de abas "
                                     f"({consecutive_open_failure_batches}). Reiniciando sessão para auto-healing."
                                 )
-                            await asyncio.sleep(2)
+                            await asyncio.sleep(NO_OPENED_TABS_RETRY_SECONDS)
                             continue
 
                         logger.info("Aguardando estabilidade das abas e chamando captura...")
@@ -1012,9 +1249,11 @@ async def run_automation(
                             await asyncio.sleep(POST_BATCH_SETTLE_SECONDS)
 
                         captured_items = []
+                        capture_started = asyncio.get_running_loop().time()
                         try:
                             captured_items = await call_capture_api(devtools_url, opened_urls, fast_mode=True)
                         except Exception as e:
+                            capture_elapsed_ms = int((asyncio.get_running_loop().time() - capture_started) * 1000)
                             consecutive_capture_failures += 1
                             failure_updates = []
                             for failed_url in opened_urls:
@@ -1059,6 +1298,9 @@ async def run_automation(
                                 max_capture_failures=MAX_CONSECUTIVE_CAPTURE_FAILURES,
                                 error=str(e),
                                 failures_updated=len(failure_updates),
+                                elapsed_ms=capture_elapsed_ms,
+                                settle_ms=int(POST_BATCH_SETTLE_SECONDS * 1000),
+                                retry_sleep_seconds=CAPTURE_ERROR_RETRY_SECONDS,
                             )
 
                             if consecutive_capture_failures >= MAX_CONSECUTIVE_CAPTURE_FAILURES:
@@ -1066,7 +1308,7 @@ async def run_automation(
                                     f"Muitas falhas consecutivas na captura ({consecutive_capture_failures}). "
                                     "Reiniciando sessão para auto-healing."
                                 )
-                            await asyncio.sleep(4)
+                            await asyncio.sleep(CAPTURE_ERROR_RETRY_SECONDS)
                             continue
                         finally:
                             await close_pages_safely(opened_pages)
@@ -1080,6 +1322,10 @@ async def run_automation(
                             page_url=current_url,
                             opened_tabs=len(opened_urls),
                             captured_items=len(captured_items),
+                            with_upc=sum(1 for c_item in captured_items if c_item.get("upc")),
+                            upc_by_domain=upc_hits_by_domain(captured_items),
+                            elapsed_ms=int((asyncio.get_running_loop().time() - capture_started) * 1000),
+                            settle_ms=int(POST_BATCH_SETTLE_SECONDS * 1000),
                         )
 
                         # Marca o lote como processado apenas após captura concluir
@@ -1087,17 +1333,19 @@ async def run_automation(
                             processed_links.add(done_url)
 
                         # Add to global history to never capture again
-                        global_history = state.get("global_captured_urls", [])
+                        captured_history = state.get("global_captured_urls", [])
                         for c_item in captured_items:
                             clean_c_url = c_item.get("url", "").split('#')[0].split('?')[0]
                             if clean_c_url and clean_c_url not in global_history:
-                                global_history.append(clean_c_url)
-                        state["global_captured_urls"] = global_history
+                                global_history.add(clean_c_url)
+                                captured_history.append(clean_c_url)
+                        state["global_captured_urls"] = captured_history
 
                         state["accumulated_items"].extend(captured_items)
                         state["processed_links"] = list(processed_links)
                         state["total_captured_for_supplier"] += len(captured_items)
                         save_state(state)
+                        reap_finished_exports(state)
 
                         if len(state["accumulated_items"]) >= export_threshold:
                             logger.info(f"Threshold atingido ({export_threshold}). Exportando lote...")
@@ -1127,16 +1375,18 @@ async def run_automation(
                         supplier_index=supplier.get("indice"),
                         page_url=current_url,
                         same_page_stuck_count=same_page_stuck_count,
-                        total_links=len(links),
+                        total_links=page_total_links,
+                        new_links=len(links),
                     )
-                    if len(links) <= last_page_total_links:
+                    if page_total_links <= last_page_total_links:
                         same_page_stuck_count += 1
                         if same_page_stuck_count >= 2:
                             logger.info("Foram feitas tentativas de carregar mais itens mas nenhum novo produto surgiu. Fim da paginação.")
                             supplier_ended = True
                     else:
                         same_page_stuck_count = 0
-                    last_page_total_links = len(links)
+                    last_page_total_links = page_total_links
+                    same_page_pass = not supplier_ended
                 elif next_url and next_url != current_url:
                     write_diagnostic(
                         "pagination_next_page",
@@ -1160,18 +1410,29 @@ async def run_automation(
 
             # Fim do processamento do supplier
             logger.info(f"Finalizando Fornecedor INDICE: {supplier['indice']}")
+            cycle_seconds = time.time() - cycle_started_at
+            cycle_captured = state.get("total_captured_for_supplier", 0) - captured_at_cycle_start
+
+            # Fim sem passar pela última listagem (CAPTCHA, paginação inesperada): pré-carrega agora.
+            if SUPPLIER_PREFETCH_ENABLED and supplier_prefetch is None:
+                supplier_prefetch = start_supplier_prefetch(ctx, supplier_queue, supplier, learned_listing_rules)
+
             if captcha_timed_out:
                 logger.warning(
                     f"Fornecedor INDICE {supplier['indice']} foi encerrado por timeout de CAPTCHA "
                     f"({CAPTCHA_MAX_WAIT_SECONDS}s) para evitar travamento da automação."
                 )
-                defer_supplier_in_state(state, supplier["indice"])
+                retry_at = defer_supplier_in_state(state, supplier_queue, supplier, cycle_captured, cycle_seconds)
                 write_diagnostic(
                     "supplier_deferred_captcha_timeout",
                     supplier_index=supplier.get("indice"),
                     timeout_seconds=CAPTCHA_MAX_WAIT_SECONDS,
+                    retry_at=retry_at,
+                    gave_up=retry_at is None,
                 )
             else:
+                supplier_queue.complete(supplier["indice"], cycle_captured, cycle_seconds, supplier.get("url", ""))
+                save_state(state)
                 # Limpa estado de paginação e links, MAS MANTEM accumulated_items (ver state.py)
                 clear_supplier_state()
                 write_diagnostic(
@@ -1180,6 +1441,32 @@ async def run_automation(
                     captured_for_supplier=state.get("total_captured_for_supplier", 0),
                 )
             
+            if supplier_prefetch is not None:
+                next_supplier = supplier_prefetch["supplier"]
+                try:
+                    # Em timeout a task é cancelada e prefetch_supplier_page fecha a aba.
+                    prefetched = await asyncio.wait_for(
+                        supplier_prefetch["task"], timeout=SUPPLIER_PREFETCH_WAIT_SECONDS + 10
+                    )
+                    # clear_supplier_state grava direto no disco: o estado em memória pode estar desatualizado.
+                    fresh_state = load_state()
+                    fresh_state["supplier_prefetch"] = {
+                        "indice": next_supplier["indice"],
+                        "url": next_supplier["url"],
+                        "listing_url": supplier_prefetch["listing_url"],
+                        "page_url": prefetched.url,
+                        "prefetched_at": int(time.time()),
+                    }
+                    save_state(fresh_state)
+                    write_diagnostic(
+                        "supplier_prefetched",
+                        supplier_index=next_supplier.get("indice"),
+                        listing_url=supplier_prefetch["listing_url"],
+                        page_url=prefetched.url,
+                    )
+                except Exception as e:
+                    logger.warning(f"Prefetch do próximo fornecedor descartado: {e}")
+
             await browser.close()
             logger.info("Automação do Fornecedor concluída! Passando para o próximo...")
             write_diagnostic("supplier_cycle_end", supplier_index=supplier.get("indice"))
@@ -1199,7 +1486,8 @@ if __name__ == "__main__":
     parser.add_argument("--headless", action="store_true", help="Rodar browser interno via playrigtht puro (Requer auth externa)")
 
     args = parser.parse_args()
-    
+    flush_on_signals(diagnostics)
+
     import time
     while True:
         try:
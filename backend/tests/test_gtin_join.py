@@ -0,0 +1,34 @@
+"""
+Custo digitado à mão nas capturas (api/services/gtin_join.py).
+
+Rodar a partir de backend/:
+    python -m pytest -q tests
+"""
+import math
+
+import pandas as pd
+import pytest
+
+from api.services.gtin_join import _parse_cost
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.234,50", 1234.50),
+    ("1,234.50", 1234.50),
+    ("12,50", 12.50),
+    ("$10.50", 10.50),
+    ("R$ 1.234.567,89", 1234567.89),
+    ("US$ 2,345,678.90", 2345678.90),
+    ("7", 7.0),
+])
+def test_decimal_separator_is_the_last_one(text, expected):
+    assert _parse_cost(pd.Series([text]))[0] == pytest.approx(expected)
+
+
+def test_blank_and_invalid_become_nan():
+    values = _parse_cost(pd.Series(["", "abc", None], dtype=object))
+    assert all(math.isnan(v) for v in values)
+
+
+def test_numeric_column_is_kept():
+    assert list(_parse_cost(pd.Series([1.5, 20]))) == [1.5, 20.0]
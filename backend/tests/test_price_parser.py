@@ -0,0 +1,112 @@
+"""
+Testes de propriedade do parse de preços da listagem (automation/supplierCrawler.py).
+
+Rodar a partir de backend/:
+    pip install -r requirements-dev.txt
+    python -m pytest -q tests
+"""
+import pytest
+from hypothesis import given, strategies as st
+
+from automation.supplierCrawler import parse_price, parse_price_batch, parse_price_details
+
+CURRENCIES = ["$", "US$", "USD ", "€", "£", "R$ ", ""]
+
+cents = st.integers(min_value=1, max_value=10**9)
+currency = st.sampled_from(CURRENCIES)
+
+
+def fmt_us(value_cents: int, thousands: bool = True) -> str:
+    """1234567 -> "12,345.67" (ou "12345.67" sem separador de milhar)."""
+    whole, frac = divmod(value_cents, 100)
+    whole_text = f"{whole:,}" if thousands else str(whole)
+    return f"{whole_text}.{frac:02d}"
+
+
+def fmt_br(value_cents: int, thousands: bool = True) -> str:
+    """1234567 -> "12.345,67" (ou "12345,67")."""
+    return fmt_us(value_cents, thousands).replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def expected(value_cents: int) -> float:
+    return value_cents / 100
+
+
+@given(cents, currency, st.booleans(), st.sampled_from([fmt_us, fmt_br]))
+def test_formatted_amount_round_trip(value_cents, cur, thousands, fmt):
+    text = f"{cur}{fmt(value_cents, thousands)}"
+    info = parse_price_details(text)
+    assert info["status"] == "ok"
+    assert info["value"] == expected(value_cents)
+    assert info["kind"] == "single"
+
+
+@given(st.integers(min_value=1000, max_value=10**9), currency, st.sampled_from([",", "."]))
+def test_thousands_separator_without_decimals(whole, cur, sep):
+    assert parse_price(f"{cur}{whole:,}".replace(",", sep)) == float(whole)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("R$ 1.299", 1299.0),
+    ("$12.345", 12345.0),
+    ("5,000", 5000.0),
+    ("1.299.000", 1299000.0),
+    ("$12.99", 12.99),
+    ("12,99", 12.99),
+    ("0.125", 0.125),
+])
+def test_dot_and_comma_thousands_are_consistent(text, expected):
+    assert parse_price(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Save $5.00 $19.99", 19.99),
+    ("You save $3.00 Now $9.99", 9.99),
+    ("Savings: $2.50 $7.49", 7.49),
+    ("$5 off $20.00", 20.0),
+])
+def test_savings_amount_is_not_the_price(text, expected):
+    info = parse_price_details(text)
+    assert info["status"] == "ok"
+    assert info["value"] == expected
+    assert info["max"] == expected
+
+
+@given(st.integers(min_value=1, max_value=99), st.sampled_from(["$", "US$", "", "€"]), st.sampled_from([".", ","]))
+def test_leading_decimal_price(value_cents, cur, sep):
+    text = f"{cur}{sep}{value_cents:02d}"
+    info = parse_price_details(text)
+    assert info["status"] == "ok"
+    assert info["value"] == expected(value_cents)
+
+
+@given(cents, cents, st.sampled_from([" - ", " – ", " — ", " to ", "-"]))
+def test_range_uses_lowest_value(a, b, sep):
+    low, high = sorted((a, b))
+    info = parse_price_details(f"${fmt_us(low)}{sep}${fmt_us(high)}")
+    assert info["kind"] == "range"
+    assert info["value"] == expected(low)
+    assert info["max"] == expected(high)
+
+
+@given(cents, cents, st.sampled_from(["Was", "Reg.", "MSRP", "Compare at", "List price:"]))
+def test_was_now_pair_uses_current_price(was, now, label):
+    info = parse_price_details(f"{label} ${fmt_us(was)} Now ${fmt_us(now)}")
+    assert info["status"] == "ok"
+    assert info["value"] == expected(now)
+    assert info["max"] == expected(max(was, now))
+
+
+@given(st.lists(st.one_of(
+    cents.map(lambda c: f"${fmt_us(c)}"),
+    st.integers(min_value=1, max_value=99).map(lambda c: f"$.{c:02d}"),
+    st.sampled_from(["", "Call for price", "Save 20%", "$0.00", "abc"]),
+    st.text(max_size=12),
+), max_size=30))
+def test_batch_matches_single_parse(texts):
+    values, statuses = parse_price_batch(texts)
+    assert len(values) == len(statuses) == len(texts)
+    for text, value, status in zip(texts, values, statuses):
+        info = parse_price_details(text)
+        assert value == info["value"]
+        assert status == info["status"]
@@ -0,0 +1,88 @@
+"""
+Fila de fornecedores (automation/supplierQueue.py) nas ordens "yield" e "age".
+
+Rodar a partir de backend/:
+    python -m pytest -q tests
+"""
+import time
+
+import pytest
+
+from automation import supplierQueue
+from automation.sheets import SupplierIndex
+from automation.supplierQueue import SupplierQueue
+
+SHEET_CSV = "INDICE,LINKS DO FORNECEDORES\n" + "\n".join(
+    f"{i},{'' if i == 37 else f'https://s{i}.example.com/shop'}" for i in range(30, 46)
+)
+
+
+class FakeSheetCache:
+    def __init__(self, csv_text):
+        self.index = SupplierIndex(csv_text)
+
+    def get_index(self, **kwargs):
+        return self.index
+
+    def start_background_refresh(self):
+        pass
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    cache = FakeSheetCache(SHEET_CSV)
+    monkeypatch.setattr(supplierQueue, "get_sheet_cache", lambda: cache)
+    return cache
+
+
+def claim_all(queue, limit=50):
+    claimed = []
+    while len(claimed) < limit:
+        supplier = queue.claim()
+        if supplier is None:
+            break
+        claimed.append(supplier["indice"])
+        queue.complete(supplier["indice"], captured=0, seconds=1.0, url=supplier["url"])
+    return claimed
+
+
+def test_yield_claims_only_inside_range(sheet):
+    state = {"supplier_stats": {
+        # Melhores históricos fora da faixa: não podem ser escolhidos.
+        "31": {"captured": 900, "seconds": 60.0},
+        "44": {"captured": 800, "seconds": 60.0},
+        "40": {"captured": 50, "seconds": 60.0},
+        "38": {"captured": 10, "seconds": 60.0},
+    }}
+    queue = SupplierQueue(state, ordering="yield", first_index="36", last_index="41")
+    claimed = claim_all(queue)
+    assert claimed[0] == "40"
+    assert sorted(claimed, key=int) == ["36", "38", "39", "40", "41"]
+
+
+def test_age_claims_only_inside_range(sheet):
+    now = int(time.time())
+    state = {"supplier_stats": {
+        "30": {"last_crawled_at": 1},
+        "45": {"last_crawled_at": 2},
+        "39": {"last_crawled_at": now - 10},
+        "36": {"last_crawled_at": now - 5},
+    }}
+    queue = SupplierQueue(state, ordering="age", first_index="36", last_index="40")
+    claimed = claim_all(queue)
+    # Nunca varridos primeiro (ordem da planilha), depois os mais antigos.
+    assert claimed == ["38", "40", "39", "36"]
+
+
+def test_peek_next_respects_range(sheet):
+    queue = SupplierQueue({}, ordering="yield", first_index="42", last_index="43")
+    first = queue.claim()
+    assert first["indice"] == "42"
+    assert queue.peek_next(first["indice"])["indice"] == "43"
+    queue.complete("42")
+    queue.complete("43")
+    assert queue.claim() is None
+
+
+def test_unknown_start_index_claims_nothing(sheet):
+    assert SupplierQueue({}, ordering="age", first_index="999").claim() is None
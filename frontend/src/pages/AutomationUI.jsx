@@ -5,6 +5,8 @@ const AutomationUI = () => {
   const [isRunning, setIsRunning] = useState(false);
   const [stateData, setStateData] = useState({});
   const [exportsList, setExportsList] = useState([]);
+  const [exportsTotal, setExportsTotal] = useState(0);
+  const [exportsPage, setExportsPage] = useState(1);
   const [logs, setLogs] = useState([]);
   const [config, setConfig] = useState({
     devtools_url: "http://127.0.0.1:9222",
@@ -26,7 +28,7 @@ const AutomationUI = () => {
         const data = await res.json();
         setIsRunning(data.is_running);
         setStateData(data.state || {});
-        setExportsList(data.exports || []);
+        setExportsTotal(data.exports_total || 0);
       } catch (err) {
         console.error("Failed to fetch automation status", err);
       }
@@ -36,26 +38,38 @@ const AutomationUI = () => {
     return () => clearInterval(intv);
   }, []);
 
-  // Poll logs every 1 second
+  // Exports paginados (a página muda ou surge arquivo novo)
+  const EXPORTS_PER_PAGE = 20;
   useEffect(() => {
-    const fetchLogs = async () => {
+    const fetchExports = async () => {
       try {
         const res = await fetch(
-          `${window.API_URL}/api/automation/logs?lines=100`,
+          `${window.API_URL}/api/automation/exports?page=${exportsPage}&per_page=${EXPORTS_PER_PAGE}`,
         );
         const data = await res.json();
-        // Backend returns lines as a single string with \n
-        if (data.logs) {
-          const lines = data.logs.split("\n").filter((l) => l.trim() !== "");
-          setLogs(lines);
-        }
+        setExportsList(data.items || []);
       } catch (err) {
-        // silently fail on logs if API disconnects temporarily
+        console.error("Failed to fetch exports", err);
       }
     };
-    fetchLogs();
-    const intv = setInterval(fetchLogs, 1000);
-    return () => clearInterval(intv);
+    fetchExports();
+  }, [exportsPage, exportsTotal]);
+
+  // Logs via SSE: o servidor empurra só as linhas novas (reconexão continua do último id)
+  useEffect(() => {
+    const MAX_LOG_LINES = 500;
+    const source = new EventSource(
+      `${window.API_URL}/api/automation/logs/stream?lines=100`,
+    );
+    source.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      const incoming = data.lines.filter((l) => l.trim() !== "");
+      setLogs((prev) =>
+        (data.reset ? incoming : prev.concat(incoming)).slice(-MAX_LOG_LINES),
+      );
+    };
+    // Erros de conexão: o EventSource tenta reconectar sozinho
+    return () => source.close();
   }, []);
 
   // Auto scroll logs to bottom only if user hasn't scrolled up manually
@@ -312,7 +326,7 @@ const AutomationUI = () => {
               <div className="stat-row highlight">
                 <span className="label">Abas Acumuladas Ram Atual:</span>
                 <span className="val big">
-                  {(stateData.accumulated_items || []).length} /{" "}
+                  {stateData.accumulated_count || 0} /{" "}
                   {config.export_threshold}
                 </span>
               </div>
@@ -349,16 +363,41 @@ const AutomationUI = () => {
       <div className="card downloads-panel">
         <h3>Downloads Gerados (Baixar XLSX Template)</h3>
         {exportsList.length > 0 ? (
-          <ul className="download-grid">
-            {exportsList.map((item) => (
-              <li key={item}>
-                <span>{item}</span>
-                <button className="btn-dl" onClick={() => handleDownload(item)}>
-                  📦 Download
+          <>
+            <ul className="download-grid">
+              {exportsList.map((item) => (
+                <li key={item}>
+                  <span>{item}</span>
+                  <button className="btn-dl" onClick={() => handleDownload(item)}>
+                    📦 Download
+                  </button>
+                </li>
+              ))}
+            </ul>
+            {exportsTotal > EXPORTS_PER_PAGE && (
+              <div className="export-pagination">
+                <button
+                  className="btn-dl"
+                  disabled={exportsPage <= 1}
+                  onClick={() => setExportsPage((p) => p - 1)}
+                >
+                  ← Anteriores
                 </button>
-              </li>
-            ))}
-          </ul>
+                <span>
+                  Página {exportsPage} de{" "}
+                  {Math.ceil(exportsTotal / EXPORTS_PER_PAGE)} ({exportsTotal}{" "}
+                  arquivos)
+                </span>
+                <button
+                  className="btn-dl"
+                  disabled={exportsPage * EXPORTS_PER_PAGE >= exportsTotal}
+                  onClick={() => setExportsPage((p) => p + 1)}
+                >
+                  Próximos →
+                </button>
+              </div>
+            )}
+          </>
         ) : (
           <p className="idle-msg">
             As extrações aparecerão aqui depois de cortarem do Lote de
@@ -10,6 +10,13 @@ function ProductsPage() {
   const [data, setData] = useState(null)
   const [error, setError] = useState(null)
 
+  // Limites vão na query string (o backend lê só o arquivo do form)
+  const filterParams = () => new URLSearchParams({
+    min_price: minPrice,
+    max_price: maxPrice,
+    max_reviews: maxReviews
+  }).toString()
+
   const handleUpload = async (e) => {
     e.preventDefault()
     if (!file) return
@@ -18,16 +25,19 @@ function ProductsPage() {
     setError(null)
 
     try {
-      const formData = new FormData()
-      formData.append('file', file)
-      formData.append('min_price', minPrice)
-      formData.append('max_price', maxPrice)
-      formData.append('max_reviews', maxReviews)
-
-      const res = await fetch(`${window.API_URL}/api/products/process-csv`, {
-        method: 'POST',
-        body: formData
-      })
+      let res = null
+      if (data?.upload_id) {
+        // Mesmo arquivo já tipado no servidor: só refiltra
+        res = await fetch(`${window.API_URL}/api/products/process/${data.upload_id}?${filterParams()}`)
+      }
+      if (!res || res.status === 404) {
+        const formData = new FormData()
+        formData.append('file', file)
+        res = await fetch(`${window.API_URL}/api/products/process-csv?${filterParams()}`, {
+          method: 'POST',
+          body: formData
+        })
+      }
 
       if (!res.ok) {
         throw new Error('Erro ao processar arquivo')
@@ -43,19 +53,11 @@ function ProductsPage() {
   }
 
   const handleDownload = async () => {
-    if (!file) return
+    if (!data?.upload_id) return
 
     try {
-      const formData = new FormData()
-      formData.append('file', file)
-      formData.append('min_price', minPrice)
-      formData.append('max_price', maxPrice)
-      formData.append('max_reviews', maxReviews)
-
-      const res = await fetch(`${window.API_URL}/api/products/process-csv`, {
-        method: 'POST',
-        body: formData
-      })
+      // Conjunto filtrado inteiro em CSV, sem reenviar o arquivo
+      const res = await fetch(`${window.API_URL}/api/products/process/${data.upload_id}?${filterParams()}&format=csv`)
 
       if (!res.ok) throw new Error('Erro ao baixar')
 
@@ -123,7 +125,10 @@ function ProductsPage() {
               <input
                 type="file"
                 accept=".csv"
-                onChange={(e) => setFile(e.target.files?.[0])}
+                onChange={(e) => {
+                  setFile(e.target.files?.[0])
+                  setData(null)
+                }}
               />
               {file ? file.name : 'Escolher arquivo CSV'}
             </label>
@@ -20,6 +20,9 @@ function SellersPage() {
   const [maxFbaSellers, setMaxFbaSellers] = useState('')
   const [excludeAmazon, setExcludeAmazon] = useState(false)
   const [onlyWithUpc, setOnlyWithUpc] = useState(false)  // NOVO: filtro para produtos com UPC
+  const [sortOption, setSortOption] = useState('')  // "coluna:direção", ex.: "bsr:asc"
+  const [categoria, setCategoria] = useState('')
+  const [categoryFacets, setCategoryFacets] = useState([])  // [{categoria, count}] para os filtros atuais
   const [availableSellers, setAvailableSellers] = useState([])
 
   const loadProducts = async (page = 1) => {
@@ -56,6 +59,13 @@ function SellersPage() {
       if (onlyWithUpc) {
         url += `&only_with_upc=true`
       }
+      if (categoria) {
+        url += `&categoria=${encodeURIComponent(categoria)}`
+      }
+      if (sortOption) {
+        const [sortBy, sortDir] = sortOption.split(':')
+        url += `&sort_by=${sortBy}&sort_dir=${sortDir}`
+      }
 
       const res = await fetch(url)
 
@@ -89,13 +99,46 @@ function SellersPage() {
     }
   }
 
+  const loadFacets = async () => {
+    if (!cacheId) return
+
+    // Mesmos filtros da listagem, exceto a própria categoria
+    const params = new URLSearchParams()
+    if (sellerFilter) params.set('seller', sellerFilter)
+    if (minPrice) params.set('min_price', minPrice)
+    if (maxPrice) params.set('max_price', maxPrice)
+    if (minBsr) params.set('min_bsr', minBsr)
+    if (maxBsr) params.set('max_bsr', maxBsr)
+    if (maxFbaSellers) params.set('max_fba_sellers', maxFbaSellers)
+    if (excludeAmazon) params.set('exclude_amazon', 'true')
+    if (onlyWithUpc) params.set('only_with_upc', 'true')
+
+    try {
+      const res = await fetch(`${window.API_URL}/api/sellers/facets/${cacheId}?${params.toString()}`)
+      if (res.ok) {
+        const result = await res.json()
+        setCategoryFacets(result.categorias || [])
+      }
+    } catch (err) {
+      console.error('Erro ao carregar categorias:', err)
+    }
+  }
+
   // Recarregar produtos quando os filtros mudarem
   useEffect(() => {
     if (cacheId) {
       loadProducts(1)
     }
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [sellerFilter, minPrice, maxPrice, minBsr, maxBsr, maxFbaSellers, excludeAmazon, onlyWithUpc])
+  }, [sellerFilter, minPrice, maxPrice, minBsr, maxBsr, maxFbaSellers, excludeAmazon, onlyWithUpc, categoria, sortOption])
+
+  // Contagens por categoria acompanham os demais filtros
+  useEffect(() => {
+    if (cacheId) {
+      loadFacets()
+    }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [cacheId, sellerFilter, minPrice, maxPrice, minBsr, maxBsr, maxFbaSellers, excludeAmazon, onlyWithUpc])
 
   const applyFilters = () => {
     setCurrentPage(1)
@@ -111,6 +154,7 @@ function SellersPage() {
     setMaxFbaSellers('')
     setExcludeAmazon(false)
     setOnlyWithUpc(false)
+    setCategoria('')
   }
 
   const handleUpload = async (e) => {
@@ -227,6 +271,13 @@ function SellersPage() {
       if (onlyWithUpc) {
         url += `&only_with_upc=true`
       }
+      if (categoria) {
+        url += `&categoria=${encodeURIComponent(categoria)}`
+      }
+      if (sortOption) {
+        const [sortBy, sortDir] = sortOption.split(':')
+        url += `&sort_by=${sortBy}&sort_dir=${sortDir}`
+      }
 
       const res = await fetch(url)
 
@@ -314,7 +365,7 @@ function SellersPage() {
         {error && <div className="error-message">{error}</div>}
         {data && (
           <div className="success-message">
-            {total} produtos encontrados (todas as categorias)
+            {total} produtos encontrados ({categoria || 'todas as categorias'})
           </div>
         )}
       </div>
@@ -436,11 +487,49 @@ function SellersPage() {
                 </label>
               </div>
 
+              {categoryFacets.length > 0 && (
+                <div className="filter-group">
+                  <label htmlFor="categoria-filter">Categoria</label>
+                  <select
+                    id="categoria-filter"
+                    value={categoria}
+                    onChange={(e) => setCategoria(e.target.value)}
+                    className="filter-input"
+                  >
+                    <option value="">Todas as categorias</option>
+                    {categoryFacets.map((facet) => (
+                      <option key={facet.categoria} value={facet.categoria}>
+                        {facet.categoria} ({facet.count})
+                      </option>
+                    ))}
+                  </select>
+                </div>
+              )}
+
+              <div className="filter-group">
+                <label htmlFor="sort-option">Ordenar por</label>
+                <select
+                  id="sort-option"
+                  value={sortOption}
+                  onChange={(e) => setSortOption(e.target.value)}
+                  className="filter-input"
+                  title="Ordenação feita no servidor (vale também para o CSV filtrado)"
+                >
+                  <option value="">Aleatório (padrão)</option>
+                  <option value="bsr:asc">BSR (menor primeiro)</option>
+                  <option value="bsr:desc">BSR (maior primeiro)</option>
+                  <option value="price:asc">Preço (menor primeiro)</option>
+                  <option value="price:desc">Preço (maior primeiro)</option>
+                  <option value="fba_count:asc">FBA Sellers (menos primeiro)</option>
+                  <option value="fba_count:desc">FBA Sellers (mais primeiro)</option>
+                </select>
+              </div>
+
               <div className="filter-actions">
                 <button
                   onClick={clearFilters}
                   className="btn btn-secondary"
-                  disabled={!sellerFilter && !minPrice && !maxPrice && !minBsr && !maxBsr && !maxFbaSellers && !excludeAmazon && !onlyWithUpc}
+                  disabled={!sellerFilter && !minPrice && !maxPrice && !minBsr && !maxBsr && !maxFbaSellers && !excludeAmazon && !onlyWithUpc && !categoria}
                 >
                   Limpar Filtros
                 </button>
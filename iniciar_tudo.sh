@@ -81,8 +81,8 @@ apply_performance_profile() {
       set_profile_default LOW_MEMORY_COOLDOWN_SECONDS "5"
       set_profile_default MAX_CONSECUTIVE_LOW_MEMORY_HITS "3"
       set_profile_default MIN_DYNAMIC_BATCH_SIZE "4"
-      set_profile_default HIGH_PRICE_PAGE_MIN_PRICED_ITEMS "5"
-      set_profile_default HIGH_PRICE_PAGE_CONSECUTIVE_THRESHOLD "1"
+      set_profile_default PRICE_SORT_MIN_SAMPLES "5"
+      set_profile_default PRICE_CEILING_TAIL_ITEMS "3"
       set_profile_default URL_FAILURE_QUARANTINE_THRESHOLD "3"
       set_profile_default DOMAIN_FAILURE_QUARANTINE_THRESHOLD "7"
       ;;
@@ -103,8 +103,8 @@ apply_performance_profile() {
       set_profile_default LOW_MEMORY_COOLDOWN_SECONDS "10"
       set_profile_default MAX_CONSECUTIVE_LOW_MEMORY_HITS "2"
       set_profile_default MIN_DYNAMIC_BATCH_SIZE "3"
-      set_profile_default HIGH_PRICE_PAGE_MIN_PRICED_ITEMS "6"
-      set_profile_default HIGH_PRICE_PAGE_CONSECUTIVE_THRESHOLD "1"
+      set_profile_default PRICE_SORT_MIN_SAMPLES "6"
+      set_profile_default PRICE_CEILING_TAIL_ITEMS "3"
       set_profile_default URL_FAILURE_QUARANTINE_THRESHOLD "2"
       set_profile_default DOMAIN_FAILURE_QUARANTINE_THRESHOLD "5"
       ;;
@@ -128,8 +128,8 @@ export MIN_DYNAMIC_BATCH_SIZE
 export MEMORY_MIN_AVAILABLE_MB
 export LOW_MEMORY_COOLDOWN_SECONDS
 export MAX_CONSECUTIVE_LOW_MEMORY_HITS
-export HIGH_PRICE_PAGE_MIN_PRICED_ITEMS
-export HIGH_PRICE_PAGE_CONSECUTIVE_THRESHOLD
+export PRICE_SORT_MIN_SAMPLES
+export PRICE_CEILING_TAIL_ITEMS
 export URL_FAILURE_QUARANTINE_THRESHOLD
 export DOMAIN_FAILURE_QUARANTINE_THRESHOLD
 export CAPTURE_MAX_CONCURRENCY